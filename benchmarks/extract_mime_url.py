@@ -0,0 +1,124 @@
+"""
+benchmarks.extract_mime_url
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Parse cost per MB of `EmailClient.extract_mime_url` on synthetic Medium Daily Digest
+messages, compared with the implementation it replaced.
+
+Usage:
+    python -m benchmarks.extract_mime_url --sizes 1 4 16 --repeat 5
+"""
+import argparse
+import email
+import quopri
+import random
+import re
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Callable
+
+from dayong.exts.emails import EmailClient
+
+MB = 1024 * 1024
+
+
+def synthetic_digest(size: int, seed: int = 0) -> bytes:
+    """Build a quoted-printable multipart digest of roughly the specified size.
+
+    Args:
+        size (int): The approximate size of the message in bytes.
+        seed (int, optional): Seed of the random links. Defaults to 0.
+
+    Returns:
+        bytes: The raw message, as fetched from the mail server.
+    """
+    rng = random.Random(seed)
+    rows = []
+    length = 0
+
+    while length < size:
+        user = f"writer{rng.randrange(2000)}"
+        slug = f"a-story-about-{rng.randrange(5000)}-{rng.getrandbits(48):x}"
+        row = (
+            '<tr><td style="padding:0"><a href="https://medium.com/@'
+            f'{user}/{slug}?source=email-digest&amp;sk={rng.getrandbits(64):x}">'
+            f"{slug.replace('-', ' ')}</a> by <a href=\"https://medium.com/@{user}\">"
+            f'{user}</a> <a href="https://medium.com/m/signin">Sign in</a></td></tr>'
+        )
+        rows.append(row)
+        length += len(row)
+
+    html = MIMEText("", "html")
+    html.replace_header("Content-Transfer-Encoding", "quoted-printable")
+    html.set_payload(quopri.encodestring("".join(rows).encode()).decode())
+
+    message = MIMEMultipart("alternative")
+    message["Subject"] = "Medium Daily Digest"
+    message.attach(MIMEText("View this digest in a browser.", "plain"))
+    message.attach(html)
+    return message.as_bytes().replace(b"\n", b"\r\n")
+
+
+def legacy_extract_mime_url(msg: bytes) -> Any:
+    """The implementation `EmailClient.extract_mime_url` replaced."""
+    uris: list[str] = []
+    msg = msg.replace(b"\r\n", b"")
+    # `pragmail.utils.read_message(msg, as_string=True)`
+    body = email.message_from_bytes(msg).as_string()
+
+    for href in re.findall(r'href=3D[\'"]?([^\'">?]+)', body):
+        if href.count("/") > 3 and "@" in href:
+            uri = href.replace("=", "")
+        else:
+            uri = ""
+
+        if uri and uri not in uris:
+            uris.append(uri)
+
+    return uris
+
+
+def best_of(func: Callable[[bytes], Any], msg: bytes, repeat: int) -> float:
+    """Time a function.
+
+    Returns:
+        float: The fastest of the runs, in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(msg)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    """Run the benchmark and print the parse cost per MB."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[4])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--no-legacy", action="store_true", help="skip the replaced implementation"
+    )
+    args = parser.parse_args()
+
+    print(f"{'size':>8} {'urls':>8} {'implementation':>16} {'ms/MB':>10} {'MB/s':>8}")
+    for size in args.sizes:
+        msg = synthetic_digest(int(size * MB))
+        megabytes = len(msg) / MB
+        candidates = [("extract_mime_url", EmailClient.extract_mime_url)]
+        if not args.no_legacy:
+            candidates.append(("legacy", legacy_extract_mime_url))
+
+        for name, func in candidates:
+            urls = len(func(msg))
+            elapsed = best_of(func, msg, args.repeat)
+            print(
+                f"{megabytes:>6.1f}MB {urls:>8} {name:>16} "
+                f"{elapsed * 1000 / megabytes:>10.1f} {megabytes / elapsed:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -7,13 +7,14 @@ Interfaces used within Dayong.
 """
 
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, AsyncIterator, Optional, Sequence
 
 import tanjun
 from sqlmodel import SQLModel
 from sqlmodel.engine.result import ScalarResult
 
 from dayong.core.configs import DayongConfig
+from dayong.delivery import DeliveryMode
 
 
 class Database(ABC):
@@ -30,9 +31,17 @@ class Database(ABC):
                 tanjun.injected(type=DayongConfig).
         """
 
+    @abstractmethod
+    async def disconnect(self) -> None:
+        """Close the database connection and release pooled connections."""
+
     @abstractmethod
     async def create_table(self) -> None:
-        """Create physical tables for all the table models stored in `Any.metadata`."""
+        """Create physical tables for all the table models stored in `Any.metadata`.
+
+        Implementations should only do this once per connection, so calling this
+        again is cheap.
+        """
 
     @abstractmethod
     async def add_row(self, table_model: SQLModel) -> None:
@@ -66,7 +75,8 @@ class Database(ABC):
 
     @abstractmethod
     async def get_all_row(self, table_model: type[SQLModel]) -> ScalarResult[Any]:
-        """Fetch all records in a database table.
+        """Fetch all records in a database table. Use `iter_rows` for tables that
+        can grow large.
 
         Args:
             table_model (type[SQLModel]): Type of the class which corresponds to a
@@ -84,3 +94,230 @@ class Database(ABC):
             table_model (Any): A subclass of SQLModel.
             attribute (str): A Table model attribute.
         """
+
+    @abstractmethod
+    async def upsert_row(
+        self,
+        table_model: SQLModel,
+        index_elements: Sequence[str],
+        only_if: Optional[dict[str, Any]] = None,
+    ) -> Optional[Any]:
+        """Insert a row or, if it conflicts with an existing row, update that row in a
+        single statement.
+
+        Args:
+            table_model (SQLModel): A subclass of SQLModel.
+            index_elements (Sequence[str]): Attributes which make up the unique index
+                used to detect the conflict.
+            only_if (Optional[dict[str, Any]], optional): Only update the existing row
+                if its attributes have these values. Defaults to None.
+
+        Returns:
+            Optional[Any]: The inserted or updated row, or `None` if the existing row
+                didn't match `only_if`.
+        """
+
+    @abstractmethod
+    async def update_returning(
+        self,
+        table_model: type[SQLModel],
+        values: dict[str, Any],
+        where: dict[str, Any],
+    ) -> list[Any]:
+        """Update the rows that match the specified attributes in a single statement.
+
+        Args:
+            table_model (type[SQLModel]): Type of the class which corresponds to a
+                database table.
+            values (dict[str, Any]): The attributes to set.
+            where (dict[str, Any]): The attributes which the rows to update must have.
+
+        Returns:
+            list[Any]: The updated rows.
+        """
+
+    @abstractmethod
+    async def add_rows(self, table_models: Sequence[SQLModel]) -> None:
+        """Add rows of the same table model in bulk.
+
+        Args:
+            table_models (Sequence[SQLModel]): Instances of a subclass of SQLModel.
+        """
+
+    @abstractmethod
+    async def get_rows_in(
+        self, table_model: type[SQLModel], attribute: str, values: Sequence[Any]
+    ) -> ScalarResult[Any]:
+        """Get the rows whose attribute is one of the specified values.
+
+        Args:
+            table_model (type[SQLModel]): Type of the class which corresponds to a
+                database table.
+            attribute (str): A Table model attribute.
+            values (Sequence[Any]): The values to match.
+
+        Returns:
+            ScalarResult[Any]: A `ScalarResult` which contains a scalar value or
+                sequence of scalar values.
+        """
+
+    @abstractmethod
+    async def remove_rows(
+        self, table_model: type[SQLModel], attribute: str, values: Sequence[Any]
+    ) -> int:
+        """Remove the rows whose attribute is one of the specified values.
+
+        Args:
+            table_model (type[SQLModel]): Type of the class which corresponds to a
+                database table.
+            attribute (str): A Table model attribute.
+            values (Sequence[Any]): The values to match.
+
+        Returns:
+            int: The number of removed rows.
+        """
+
+    @abstractmethod
+    async def update_rows(
+        self,
+        table_model: type[SQLModel],
+        attribute: str,
+        values: Sequence[Any],
+        update: dict[str, Any],
+    ) -> int:
+        """Update the rows whose attribute is one of the specified values.
+
+        Args:
+            table_model (type[SQLModel]): Type of the class which corresponds to a
+                database table.
+            attribute (str): A Table model attribute.
+            values (Sequence[Any]): The values to match.
+            update (dict[str, Any]): The attributes to set.
+
+        Returns:
+            int: The number of updated rows.
+        """
+
+    @abstractmethod
+    def iter_rows(
+        self,
+        table_model: type[SQLModel],
+        batch_size: int = 500,
+        order_by: Optional[str] = None,
+        where: Optional[dict[str, Any]] = None,
+    ) -> AsyncIterator[Any]:
+        """Iterate over the rows of a database table, one batch at a time.
+
+        Args:
+            table_model (type[SQLModel]): Type of the class which corresponds to a
+                database table.
+            batch_size (int, optional): The number of rows fetched per query.
+                Defaults to 500.
+            order_by (Optional[str], optional): The attribute to order rows by.
+                Defaults to None, which orders by primary key.
+            where (Optional[dict[str, Any]], optional): The attributes which the rows
+                must have. Defaults to None.
+
+        Returns:
+            AsyncIterator[Any]: An asynchronous iterator of rows.
+        """
+
+    @abstractmethod
+    async def count_rows(
+        self, table_model: type[SQLModel], where: Optional[dict[str, Any]] = None
+    ) -> int:
+        """Count the rows of a database table without fetching them.
+
+        Args:
+            table_model (type[SQLModel]): Type of the class which corresponds to a
+                database table.
+            where (Optional[dict[str, Any]], optional): The attributes which the rows
+                must have. Defaults to None.
+
+        Returns:
+            int: The number of rows.
+        """
+
+    @abstractmethod
+    async def row_exists(
+        self, table_model: type[SQLModel], where: dict[str, Any]
+    ) -> bool:
+        """Check if a row exists without fetching it.
+
+        Args:
+            table_model (type[SQLModel]): Type of the class which corresponds to a
+                database table.
+            where (dict[str, Any]): The attributes which the row must have.
+
+        Returns:
+            bool: True if at least one row matches.
+        """
+
+
+class ContentProvider(ABC):
+    """Abstract base class of a third-party content provider.
+
+    A provider is registered under its alias, which is what the content command and
+    the schedules in the config file refer to it by.
+    """
+
+    alias: str
+    url: str
+    # How content is packed into messages, unless a task sets it.
+    delivery: DeliveryMode = DeliveryMode.DIGEST
+    # The crontab expression content is fetched on, unless the config file sets it.
+    schedule: str = "0 0 * * *"
+    # Seconds fetching and parsing content may take in all, per run.
+    timeout: float = 120.0
+    # Why content can't be fetched, if it can't.
+    unavailable: Optional[str] = None
+
+    async def open(self) -> None:
+        """Prepare the provider for fetching content, e.g. connect to a server."""
+
+    async def close(self) -> None:
+        """Release the resources of the provider."""
+
+    @abstractmethod
+    async def fetch(self) -> Any:
+        """Fetch new content.
+
+        Returns:
+            Any: The content, in a form understood by `parse`.
+        """
+
+    def parse(self, data: Any) -> list[str]:
+        """Get the items to deliver from fetched content.
+
+        Args:
+            data (Any): The content returned by `fetch`.
+
+        Returns:
+            list[str]: The items, e.g. URLs.
+        """
+        content = getattr(data, "content", data)
+        if not content:
+            return []
+
+        return list(content) if isinstance(content, list) else [content]
+
+    async def stream(self) -> AsyncIterator[str]:
+        """Fetch new content and yield the items to deliver as they are parsed.
+
+        Providers that can parse content incrementally override this. By default,
+        the content is fetched and parsed in full first.
+
+        Yields:
+            AsyncIterator[str]: The items, e.g. URLs.
+        """
+        for item in self.parse(await self.fetch()):
+            yield item
+
+    async def commit(self) -> None:
+        """Mark the content fetched by the last run as delivered.
+
+        This is called once the content was delivered to every channel. Providers
+        that only fetch content they haven't fetched before, e.g. by keeping a mark,
+        advance the mark here, so that content whose delivery failed is fetched
+        again.
+        """
@@ -11,9 +11,13 @@ import hikari
 import tanjun
 
 from dayong.abc import Database
+from dayong.cache import CachedDatabase
+from dayong.channels import ChannelIndex
 from dayong.core.configs import DayongConfig, DayongDynamicLoader
 from dayong.core.settings import BASE_DIR
+from dayong.greetings import GreetingCoalescer, GreetingTemplate
 from dayong.operations import DatabaseImpl
+from dayong.tasks.aptasks import ContentScheduler
 
 
 def run() -> None:
@@ -24,7 +28,18 @@ def run() -> None:
         banner="dayong",
         intents=hikari.Intents.ALL,
     )
-    database = DatabaseImpl()
+    # The greeting embed is compiled once instead of on every join.
+    greeting = GreetingTemplate.compile(
+        loaded_config.embeddings["new_member_greetings"]  # type: ignore
+    )
+    greetings = GreetingCoalescer(
+        loaded_config.greetings.window, loaded_config.greetings.max_batch_size
+    )
+    database = CachedDatabase(
+        DatabaseImpl(),
+        loaded_config.database.cache_ttl,
+        loaded_config.database.cache_size,
+    )
     (
         tanjun.Client.from_gateway_bot(
             bot, declare_global_commands=hikari.Snowflake(loaded_config.guild_id)
@@ -33,6 +48,14 @@ def run() -> None:
         .add_prefix(loaded_config.bot_prefix)
         .set_type_dependency(DayongConfig, loaded_config)
         .set_type_dependency(Database, database)
+        .set_type_dependency(ChannelIndex, ChannelIndex())
+        .set_type_dependency(GreetingCoalescer, greetings)
+        .set_type_dependency(GreetingTemplate, greeting)
+        .set_type_dependency(
+            ContentScheduler, ContentScheduler(loaded_config, database)
+        )
         .add_client_callback(tanjun.ClientCallbackNames.STARTING, database.connect)
+        .add_client_callback(tanjun.ClientCallbackNames.CLOSING, database.disconnect)
+        .add_client_callback(tanjun.ClientCallbackNames.CLOSING, greetings.close)
     )
     bot.run()
@@ -0,0 +1,303 @@
+"""
+dayong.cache
+~~~~~~~~~~~~
+
+In-memory caches that sit in front of slower data sources.
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Generic, Hashable, Optional, Sequence, TypeVar
+
+import tanjun
+from sqlmodel import SQLModel
+from sqlmodel.engine.result import ScalarResult
+
+from dayong.abc import Database
+from dayong.core.configs import DayongConfig
+from dayong.operations import PoolStats, scalar_result
+
+_VT = TypeVar("_VT")
+
+
+@dataclass
+class CacheStats:
+    """Counters of a cache's effectiveness."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        """The fraction of lookups that were served from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class LRUCache(Generic[_VT]):
+    """Bounded least-recently-used cache. Entries may have a time-to-live."""
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self.stats = CacheStats()
+        self._data: OrderedDict[Hashable, tuple[Optional[float], _VT]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[_VT]:
+        """Get a value and mark it as recently used.
+
+        Args:
+            key (Hashable): The key of the value.
+
+        Returns:
+            Optional[_VT]: The value, or `None` if it is missing or has expired.
+        """
+        entry = self._data.get(key)
+
+        if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+            del self._data[key]
+            self.stats.size = len(self._data)
+            entry = None
+
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.stats.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: _VT, ttl: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used one if the cache is full.
+
+        Args:
+            key (Hashable): The key of the value.
+            value (_VT): The value to store.
+            ttl (Optional[float], optional): Seconds until the value expires. Defaults
+                to None, which never expires.
+        """
+        expires = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.stats.evictions += 1
+
+        self.stats.size = len(self._data)
+
+    def pop(self, key: Hashable) -> Optional[_VT]:
+        """Remove a value.
+
+        Args:
+            key (Hashable): The key of the value.
+
+        Returns:
+            Optional[_VT]: The removed value, or `None` if it wasn't stored.
+        """
+        entry = self._data.pop(key, None)
+        self.stats.size = len(self._data)
+        return entry[1] if entry is not None else None
+
+    def invalidate(self, prefix: tuple[Any, ...] = ()) -> None:
+        """Remove entries whose tuple keys start with the specified prefix.
+
+        Args:
+            prefix (tuple[Any, ...], optional): The leading items of the keys to
+                remove. Defaults to (), which clears the cache.
+        """
+        if not prefix:
+            self._data.clear()
+        else:
+            for key in [
+                key
+                for key in self._data
+                if isinstance(key, tuple) and key[: len(prefix)] == prefix
+            ]:
+                del self._data[key]
+
+        self.stats.size = len(self._data)
+
+
+class CachedDatabase(Database):
+    """Read-through cache around a `dayong.abc.Database` implementation.
+
+    Only the table models with a configured TTL are cached. A TTL of `None` marks
+    the table model as immutable: its rows are kept until evicted and adding rows
+    doesn't invalidate them. Empty results of immutable table models aren't cached,
+    since a row may be added later.
+
+    Every write to a table bumps the table's generation, and a read that started
+    before a write doesn't fill the cache, so it can't store rows the write made
+    stale. Callers get copies of the cached rows, so that modifying a row doesn't
+    modify the cache.
+    """
+
+    def __init__(
+        self,
+        database: Database,
+        ttl: dict[str, Optional[float]],
+        maxsize: int = 1024,
+    ) -> None:
+        self.database = database
+        self.ttl = ttl
+        self._cache: LRUCache[tuple[Any, ...]] = LRUCache(maxsize)
+        self._generations: dict[str, int] = {}
+
+    @property
+    def stats(self) -> CacheStats:
+        """Hit and miss counters of the cache."""
+        return self._cache.stats
+
+    @property
+    def pool_stats(self) -> Optional[PoolStats]:
+        """The connection pool stats of the wrapped database, if it has any."""
+        return getattr(self.database, "pool_stats", None)
+
+    @staticmethod
+    def _table(table_model: Any) -> str:
+        return str(table_model.__tablename__)
+
+    def _invalidate(self, table_model: Any, added: bool = False) -> None:
+        table = self._table(table_model)
+        if added and table in self.ttl and self.ttl[table] is None:
+            return
+        self._generations[table] = self._generations.get(table, 0) + 1
+        self._cache.invalidate((table,))
+
+    @staticmethod
+    def _copy(rows: Sequence[Any]) -> list[Any]:
+        # `SQLModel.copy` doesn't work on table models in SQLModel 0.0.4.
+        return [type(row)(**row.dict()) for row in rows]
+
+    async def connect(
+        self, config: DayongConfig = tanjun.injected(type=DayongConfig)
+    ) -> None:
+        await self.database.connect(config)
+
+    async def disconnect(self) -> None:
+        self._cache.invalidate()
+        await self.database.disconnect()
+
+    async def create_table(self) -> None:
+        await self.database.create_table()
+
+    async def add_row(self, table_model: SQLModel) -> None:
+        await self.database.add_row(table_model)
+        self._invalidate(table_model, added=True)
+
+    async def remove_row(self, table_model: SQLModel, attribute: str) -> None:
+        try:
+            await self.database.remove_row(table_model, attribute)
+        finally:
+            self._invalidate(table_model)
+
+    async def get_row(self, table_model: SQLModel, attribute: str) -> ScalarResult[Any]:
+        table = self._table(table_model)
+
+        if table not in self.ttl:
+            return await self.database.get_row(table_model, attribute)
+
+        key = (table, attribute, getattr(table_model, attribute))
+        rows = self._cache.get(key)
+
+        if rows is None:
+            generation = self._generations.get(table, 0)
+            rows = tuple((await self.database.get_row(table_model, attribute)).all())
+            # A write during the read may have made the rows stale.
+            if (rows or self.ttl[table] is not None) and generation == (
+                self._generations.get(table, 0)
+            ):
+                self._cache.set(key, rows, self.ttl[table])
+
+        return scalar_result(self._copy(rows))
+
+    async def get_all_row(self, table_model: type[SQLModel]) -> ScalarResult[Any]:
+        return await self.database.get_all_row(table_model)
+
+    async def update_row(self, table_model: SQLModel, attribute: str) -> None:
+        try:
+            await self.database.update_row(table_model, attribute)
+        finally:
+            self._invalidate(table_model)
+
+    async def upsert_row(
+        self,
+        table_model: SQLModel,
+        index_elements: Sequence[str],
+        only_if: Optional[dict[str, Any]] = None,
+    ) -> Optional[Any]:
+        try:
+            return await self.database.upsert_row(table_model, index_elements, only_if)
+        finally:
+            self._invalidate(table_model)
+
+    async def update_returning(
+        self,
+        table_model: type[SQLModel],
+        values: dict[str, Any],
+        where: dict[str, Any],
+    ) -> list[Any]:
+        try:
+            return await self.database.update_returning(table_model, values, where)
+        finally:
+            self._invalidate(table_model)
+
+    async def add_rows(self, table_models: Sequence[SQLModel]) -> None:
+        if not table_models:
+            return
+
+        try:
+            await self.database.add_rows(table_models)
+        finally:
+            self._invalidate(table_models[0], added=True)
+
+    async def get_rows_in(
+        self, table_model: type[SQLModel], attribute: str, values: Sequence[Any]
+    ) -> ScalarResult[Any]:
+        return await self.database.get_rows_in(table_model, attribute, values)
+
+    async def remove_rows(
+        self, table_model: type[SQLModel], attribute: str, values: Sequence[Any]
+    ) -> int:
+        try:
+            return await self.database.remove_rows(table_model, attribute, values)
+        finally:
+            self._invalidate(table_model)
+
+    async def update_rows(
+        self,
+        table_model: type[SQLModel],
+        attribute: str,
+        values: Sequence[Any],
+        update: dict[str, Any],
+    ) -> int:
+        try:
+            return await self.database.update_rows(
+                table_model, attribute, values, update
+            )
+        finally:
+            self._invalidate(table_model)
+
+    def iter_rows(
+        self,
+        table_model: type[SQLModel],
+        batch_size: int = 500,
+        order_by: Optional[str] = None,
+        where: Optional[dict[str, Any]] = None,
+    ) -> AsyncIterator[Any]:
+        return self.database.iter_rows(table_model, batch_size, order_by, where)
+
+    async def count_rows(
+        self, table_model: type[SQLModel], where: Optional[dict[str, Any]] = None
+    ) -> int:
+        return await self.database.count_rows(table_model, where)
+
+    async def row_exists(
+        self, table_model: type[SQLModel], where: dict[str, Any]
+    ) -> bool:
+        return await self.database.row_exists(table_model, where)
@@ -0,0 +1,131 @@
+"""
+dayong.channels
+~~~~~~~~~~~~~~~
+
+In-memory index of guild channels, kept up to date from gateway events, for
+resolving channels without REST calls.
+"""
+from typing import Generic, Optional, TypeVar
+
+_ChannelT = TypeVar("_ChannelT")
+
+
+class ChannelIndex(Generic[_ChannelT]):
+    """Index of channels by ID and by guild and name."""
+
+    def __init__(self) -> None:
+        self._channels: dict[int, tuple[int, str, _ChannelT]] = {}
+        # The IDs of the channels of each guild by name, in the order they were
+        # added. A name resolves to the first of its channels.
+        self._names: dict[int, dict[str, dict[int, None]]] = {}
+        self._searches: dict[tuple[int, str], Optional[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._channels)
+
+    def __contains__(self, guild_id: object) -> bool:
+        return guild_id in self._names
+
+    def put(
+        self, guild_id: int, channel_id: int, name: str, channel: _ChannelT
+    ) -> None:
+        """Add a channel, or replace it if it was renamed or otherwise updated.
+
+        Args:
+            guild_id (int): The ID of the guild the channel belongs to.
+            channel_id (int): The ID of the channel.
+            name (str): The name of the channel.
+            channel (_ChannelT): The channel object.
+        """
+        self.remove(channel_id)
+        self._channels[channel_id] = (guild_id, name, channel)
+        self._names.setdefault(guild_id, {}).setdefault(name, {})[channel_id] = None
+        self._forget_searches(guild_id)
+
+    def remove(self, channel_id: int) -> None:
+        """Remove a channel.
+
+        Args:
+            channel_id (int): The ID of the channel.
+        """
+        entry = self._channels.pop(channel_id, None)
+
+        if entry is None:
+            return
+
+        guild_id, name, _ = entry
+        names = self._names.get(guild_id, {})
+        channel_ids = names.get(name, {})
+        channel_ids.pop(channel_id, None)
+        # Another channel may have the same name, in which case it takes over.
+        if not channel_ids:
+            names.pop(name, None)
+
+        self._forget_searches(guild_id)
+
+    def remove_guild(self, guild_id: int) -> None:
+        """Remove every channel of a guild.
+
+        Args:
+            guild_id (int): The ID of the guild.
+        """
+        for channel_ids in self._names.pop(guild_id, {}).values():
+            for channel_id in channel_ids:
+                del self._channels[channel_id]
+
+        self._forget_searches(guild_id)
+
+    def get(self, channel_id: int) -> Optional[_ChannelT]:
+        """Get a channel by ID.
+
+        Args:
+            channel_id (int): The ID of the channel.
+
+        Returns:
+            Optional[_ChannelT]: The channel, if it is indexed.
+        """
+        entry = self._channels.get(channel_id)
+        return entry[2] if entry else None
+
+    def get_by_name(self, guild_id: int, name: str) -> Optional[_ChannelT]:
+        """Get a guild channel by its exact name.
+
+        Args:
+            guild_id (int): The ID of the guild.
+            name (str): The name of the channel.
+
+        Returns:
+            Optional[_ChannelT]: The channel, if it is indexed.
+        """
+        channel_ids = self._names.get(guild_id, {}).get(name)
+        return self.get(next(iter(channel_ids))) if channel_ids else None
+
+    def search(self, guild_id: int, term: str) -> Optional[_ChannelT]:
+        """Get the first guild channel whose name contains a search term. Results are
+        remembered until a channel of the guild changes.
+
+        Args:
+            guild_id (int): The ID of the guild.
+            term (str): The text to look for in channel names.
+
+        Returns:
+            Optional[_ChannelT]: The channel, if one matches.
+        """
+        key = (guild_id, term)
+
+        if key not in self._searches:
+            self._searches[key] = next(
+                (
+                    next(iter(channel_ids))
+                    for name, channel_ids in self._names.get(guild_id, {}).items()
+                    if term in name
+                ),
+                None,
+            )
+
+        channel_id = self._searches[key]
+        return self.get(channel_id) if channel_id is not None else None
+
+    def _forget_searches(self, guild_id: int) -> None:
+        for key in [key for key in self._searches if key[0] == guild_id]:
+            del self._searches[key]
@@ -4,83 +4,176 @@ dayong.components.event_component
 
 Organization of events and event listeners.
 """
-from typing import Optional, Sequence
+from typing import Iterable, Optional
 
 import hikari
 import tanjun
 
-from dayong.core.configs import DayongConfig
+from dayong.channels import ChannelIndex
+from dayong.greetings import GreetingCoalescer, GreetingTemplate
 
 component = tanjun.Component()
 
 
-async def get_channel(
-    channels: Sequence[hikari.GuildChannel],
+def index_channels(
+    index: ChannelIndex[hikari.TextableGuildChannel],
+    guild_id: hikari.Snowflake,
+    channels: Iterable[hikari.GuildChannel],
+) -> None:
+    """Add the text channels of a guild to the channel index.
+
+    Args:
+        index (ChannelIndex[hikari.TextableGuildChannel]): The channel index.
+        guild_id (hikari.Snowflake): The ID of the guild.
+        channels (Iterable[hikari.GuildChannel]): Channels of the guild.
+    """
+    for channel in channels:
+        if isinstance(channel, hikari.TextableGuildChannel) and channel.name:
+            index.put(guild_id, channel.id, channel.name, channel)
+
+
+def get_channel(
+    app: hikari.RESTAware,
+    index: ChannelIndex[hikari.TextableGuildChannel],
+    guild_id: hikari.Snowflake,
     channel_name: str,
-) -> tuple[str, Optional[hikari.GuildChannel]]:
-    """Search for channels use the first channel that matches the specified channel
-    name.
+) -> Optional[hikari.TextableGuildChannel]:
+    """Get the first text channel whose name contains the specified channel name.
+
+    The channel index is used, and filled from the hikari cache if the guild isn't
+    indexed yet. No REST calls are made.
 
     Args:
-        channels (Sequence[hikari.GuildChannel]): An instance of `hikari.GuildChannel`.
+        app (hikari.RESTAware): The application the event was received by.
+        index (ChannelIndex[hikari.TextableGuildChannel]): The channel index.
+        guild_id (hikari.Snowflake): The ID of the guild.
         channel_name (str): The name of the target channel.
 
     Returns:
-        list[str]: A list of channel names that matched the specified channel name.
+        Optional[hikari.TextableGuildChannel]: The matching channel, if any.
     """
-    target_channel = ("", None)
+    if guild_id not in index and isinstance(app, hikari.CacheAware):
+        index_channels(
+            index,
+            guild_id,
+            app.cache.get_guild_channels_view_for_guild(guild_id).values(),
+        )
 
-    for channel in channels:
-        if channel.name is not None and channel_name in channel.name:
-            target_channel = (channel.name, channel)
-            break
+    return index.search(guild_id, channel_name)
+
+
+@component.with_listener(hikari.GuildAvailableEvent)
+@component.with_listener(hikari.GuildJoinEvent)
+async def index_guild(
+    event: hikari.GuildAvailableEvent,
+    index: ChannelIndex[hikari.TextableGuildChannel] = tanjun.injected(
+        type=ChannelIndex
+    ),
+) -> None:
+    """Index the channels of a guild once it becomes available.
+
+    Args:
+        event (hikari.GuildAvailableEvent): Instance of `hikari.GuildAvailableEvent`
+            or `hikari.GuildJoinEvent`.
+        index (ChannelIndex[hikari.TextableGuildChannel]): The channel index. This is
+            a registered type dependency and is injected by the client.
+    """
+    index.remove_guild(event.guild_id)
+    index_channels(index, event.guild_id, event.channels.values())
+
+
+@component.with_listener(hikari.GuildLeaveEvent)
+async def forget_guild(
+    event: hikari.GuildLeaveEvent,
+    index: ChannelIndex[hikari.TextableGuildChannel] = tanjun.injected(
+        type=ChannelIndex
+    ),
+) -> None:
+    """Remove the channels of a guild the bot has left from the index.
 
-    return target_channel
+    Args:
+        event (hikari.GuildLeaveEvent): Instance of `hikari.GuildLeaveEvent`.
+        index (ChannelIndex[hikari.TextableGuildChannel]): The channel index. This is
+            a registered type dependency and is injected by the client.
+    """
+    index.remove_guild(event.guild_id)
+
+
+@component.with_listener(hikari.GuildChannelCreateEvent)
+@component.with_listener(hikari.GuildChannelUpdateEvent)
+async def index_channel(
+    event: hikari.GuildChannelCreateEvent,
+    index: ChannelIndex[hikari.TextableGuildChannel] = tanjun.injected(
+        type=ChannelIndex
+    ),
+) -> None:
+    """Add a created, renamed, or otherwise updated channel to the index.
+
+    Args:
+        event (hikari.GuildChannelCreateEvent): Instance of
+            `hikari.GuildChannelCreateEvent` or `hikari.GuildChannelUpdateEvent`.
+        index (ChannelIndex[hikari.TextableGuildChannel]): The channel index. This is
+            a registered type dependency and is injected by the client.
+    """
+    index.remove(event.channel.id)
+    index_channels(index, event.guild_id, (event.channel,))
+
+
+@component.with_listener(hikari.GuildChannelDeleteEvent)
+async def forget_channel(
+    event: hikari.GuildChannelDeleteEvent,
+    index: ChannelIndex[hikari.TextableGuildChannel] = tanjun.injected(
+        type=ChannelIndex
+    ),
+) -> None:
+    """Remove a deleted channel from the index.
+
+    Args:
+        event (hikari.GuildChannelDeleteEvent): Instance of
+            `hikari.GuildChannelDeleteEvent`.
+        index (ChannelIndex[hikari.TextableGuildChannel]): The channel index. This is
+            a registered type dependency and is injected by the client.
+    """
+    index.remove(event.channel.id)
 
 
 @component.with_listener(hikari.MemberCreateEvent)
 async def greet_new_member(
     event: hikari.MemberCreateEvent,
-    config: DayongConfig = tanjun.injected(type=DayongConfig),
+    template: GreetingTemplate = tanjun.injected(type=GreetingTemplate),
+    coalescer: GreetingCoalescer = tanjun.injected(type=GreetingCoalescer),
+    index: ChannelIndex[hikari.TextableGuildChannel] = tanjun.injected(
+        type=ChannelIndex
+    ),
 ) -> None:
     """Welcome new guild members. This will send a message greetings to a welcome
-    channel.
+    channel. Members who join within a short window are welcomed together.
 
     Args:
         event (hikari.MemberCreateEvent): Instance of `hikari.MemberCreateEvent`. This
             is a registered type dependency and is injected by the client.
-        config (DayongConfig, optional): An instance of
-            `dayong.core.configs.DayongConfig`. This is registered type dependency and
-            is injected by the client. Defaults to tanjun.injected(type=DayongConfig).
+        template (GreetingTemplate): The greeting embed compiled from the config file.
+            This is a registered type dependency and is injected by the client.
+        coalescer (GreetingCoalescer): Groups members who join close together. This
+            is a registered type dependency and is injected by the client.
+        index (ChannelIndex[hikari.TextableGuildChannel]): The channel index. This is
+            a registered type dependency and is injected by the client.
     """
-    embeddings = config.embeddings["new_member_greetings"]
-    channels = await event.app.rest.fetch_guild_channels(event.guild_id)
-    wc_channel, wc_object = await get_channel(channels, "welcome")
-
-    if wc_channel and wc_object:
-        wc_txtable = await event.app.rest.fetch_channel(wc_object.id)
-    else:
-        wc_txtable = None
-
-    if isinstance(wc_txtable, hikari.TextableChannel) and isinstance(embeddings, dict):
-        embed = hikari.Embed(
-            description=embeddings["description"].format(
-                hikari.OwnGuild.name,
-                event.member.id,
-                embeddings["readme_channel_id"],
-            ),
-            color=embeddings["color"],
-        )
+    wc_channel = get_channel(event.app, index, event.guild_id, "welcome")
+
+    if wc_channel is None:
+        return
 
-        for info in range(len(embeddings["greetings_field"])):
-            inner_dict = embeddings["greetings_field"][info]
-            embed.add_field(
-                name=inner_dict["name"],
-                value=inner_dict["value"],
-                inline=True,
-            )
+    guild = event.get_guild()
+    guild_name = guild.name if guild else ""
+    rest = event.app.rest
+
+    async def send(member_ids: list[int]) -> None:
+        await rest.create_message(
+            wc_channel.id, template.render(guild_name, member_ids)
+        )
 
-        await wc_txtable.send(embed)
+    coalescer.add(wc_channel.id, event.member.id, send)
 
 
 @tanjun.as_loader
@@ -55,7 +55,6 @@ async def anon_command(
     channel = await ctx.fetch_channel()
     try:
         if isinstance(ctx.member, hikari.InteractionMember):
-            await database.create_table()
             message_id = await randomize_id(ctx.member.username)
             await database.add_row(
                 AnonMessage(
@@ -4,13 +4,19 @@ dayong.components.task_components
 
 Scheduled tasks that run in the background.
 """
+from contextlib import suppress
+from typing import Optional
+
 import hikari
 import tanjun
-from sqlalchemy.exc import NoResultFound, ProgrammingError
+from sqlalchemy.exc import IntegrityError, NoResultFound, ProgrammingError
 
 from dayong.abc import Database
-from dayong.core.settings import CONTENT_PROVIDER
+from dayong.channels import ChannelIndex
+from dayong.delivery import DeliveryMode
+from dayong.exts.providers import PROVIDERS
 from dayong.models import ScheduledTask
+from dayong.tasks.aptasks import ContentScheduler
 
 RESPONSE_INTVL = 30
 RESPONSE_MESSG = {False: "Sorry, I got nothing for today 😔"}
@@ -18,46 +24,76 @@ RESPONSE_MESSG = {False: "Sorry, I got nothing for today 😔"}
 component = tanjun.Component()
 
 
-async def start_task(context: tanjun.abc.Context, source: str, db: Database):
+async def start_task(
+    context: tanjun.abc.Context,
+    source: str,
+    db: Database,
+    delivery: Optional[DeliveryMode] = None,
+):
     """Start a scheduled task.
 
     Args:
         context (tanjun.abc.Context): Slash command specific context.
         source (str): Alias of the third-party content provider.
         db (Database): An instance of `dayong.operations.Database`.
+        delivery (Optional[DeliveryMode], optional): How content is packed into
+            messages. Defaults to None, which is the provider's delivery mode.
 
     Raises:
         NotImplementedError: Raised if alias does not exist.
         ValueError: Raised if context failed to get the name of its channel.
-        PermissionError: Raised if task is already scheduled.
+        PermissionError: Raised if task is already scheduled in the channel.
     """
-    if source not in CONTENT_PROVIDER.keys():
+    if source not in PROVIDERS:
         raise NotImplementedError
 
+    if delivery is None:
+        delivery = PROVIDERS[source].delivery
+
     channel = context.get_channel()
 
     if channel is None:
         raise ValueError
 
     task_model = ScheduledTask(
-        channel_name=channel.name if channel.name else "", task_name=source, run=True
+        guild_id=str(context.guild_id) if context.guild_id else None,
+        channel_id=str(channel.id),
+        channel_name=channel.name if channel.name else "",
+        task_name=source,
+        run=True,
+        delivery=delivery.value,
     )
 
-    await db.create_table()
+    # Which channels run a task is decided by the unique index on `task_name` and
+    # `channel_id` alone, in single statements, so concurrent starts can't both
+    # succeed in one channel and never block each other in different channels.
+
+    # A task of this channel that was scheduled before channel IDs were stored is
+    # given the channel's ID, so that it is resumed instead of duplicated. The index
+    # rejects this if the channel already has a task of its own.
+    with suppress(IntegrityError):
+        await db.update_returning(
+            ScheduledTask,
+            {"guild_id": task_model.guild_id, "channel_id": task_model.channel_id},
+            {
+                "task_name": source,
+                "channel_name": task_model.channel_name,
+                "channel_id": None,
+            },
+        )
 
-    try:
-        result = await db.get_row(task_model, "task_name")
-        if bool(result.one().run) is True:
-            raise PermissionError
-        else:
-            await db.update_row(task_model, "task_name")
-            return
-    except NoResultFound:
-        await db.add_row(task_model)
+    # Insert the task, or resume it if it was stopped. Nothing is returned if the task
+    # is already running in this channel.
+    task = await db.upsert_row(
+        task_model, ("task_name", "channel_id"), only_if={"run": False}
+    )
+
+    if task is None:
+        raise PermissionError
 
 
 async def stop_task(context: tanjun.abc.Context, source: str, db: Database):
-    """Stop a scheduled task.
+    """Stop a scheduled task in the channel of the context.
 
     Args:
         context (tanjun.abc.Context): Slash command specific context.
@@ -66,25 +102,31 @@ async def stop_task(context: tanjun.abc.Context, source: str, db: Database):
 
     Raises:
         ValueError: Raised if context failed to get the name of its channel.
+        NoResultFound: Raised if the task isn't running in the channel.
     """
     channel = context.get_channel()
 
     if channel is None:
         raise ValueError
 
-    task_model = ScheduledTask(
-        channel_name=channel.name if channel.name else "",
-        task_name=source,
-        run=False,
-    )
+    # The row is kept so that starting the task again is a single upsert. Tasks
+    # scheduled before channel IDs were stored are matched by channel name.
+    where = {"task_name": source, "channel_id": str(channel.id), "run": True}
+    if await db.update_returning(ScheduledTask, {"run": False}, where):
+        return
 
-    # We can also update the row here, but for simplicity, it's best to just perform a
-    # delete query.
-    await db.remove_row(task_model, "task_name")
+    where.update(channel_id=None, channel_name=channel.name or "")
+    if not await db.update_returning(ScheduledTask, {"run": False}, where):
+        raise NoResultFound
 
 
 @component.with_command
 @tanjun.with_author_permission_check(128)
+@tanjun.with_str_slash_option(
+    "delivery",
+    '"digest", "embed", or "drip" (one message per item)',
+    default="",
+)
 @tanjun.with_str_slash_option("action", '"start" or "stop"')
 @tanjun.with_str_slash_option("source", "e.g. medium or dev")
 @tanjun.as_slash_command(
@@ -94,6 +136,7 @@ async def share_content(
     ctx: tanjun.abc.SlashContext,
     source: str,
     action: str,
+    delivery: str,
     db: Database = tanjun.injected(type=Database),
 ) -> None:
     """Fetch content on email subscription, from a service, or API.
@@ -105,6 +148,8 @@ async def share_content(
         ctx (tanjun.abc.Context): Interface of a context.
         source (str): Alias of the third-party content provider.
         action (str): Start or stop the content retrival task.
+        delivery (str): How content is packed into messages. See
+            `dayong.delivery.DeliveryMode`. Empty for the provider's delivery mode.
         db (Database): An instance of `dayong.operations.Database`.
             Defaults to tanjun.injected(type=Database).
     """
@@ -112,14 +157,22 @@ async def share_content(
 
     if action == "start":
         try:
-            await start_task(ctx, source, db)
+            mode = DeliveryMode(delivery.lower()) if delivery else None
+        except ValueError:
+            await ctx.respond(
+                f"This doesn't seem to be a valid delivery mode: `{delivery}` 🤔"
+            )
+            return
+
+        try:
+            await start_task(ctx, source, db, mode)
             await ctx.respond(
                 f"Will comeback here to deliver content from `{source}` 📰"
             )
         except PermissionError:
             await ctx.respond("Already doing that 👌")
         except NotImplementedError:
-            description = [f"`{provider}`" for provider in CONTENT_PROVIDER]
+            description = [f"`{provider}`" for provider in PROVIDERS]
             await ctx.respond(f"Oops! `{source}` isn't available.")
             await ctx.respond(
                 hikari.Embed(
@@ -140,6 +193,39 @@ async def share_content(
         )
 
 
+@component.with_client_callback(tanjun.ClientCallbackNames.STARTED)
+async def start_scheduler(
+    client: tanjun.abc.Client = tanjun.injected(type=tanjun.abc.Client),
+    scheduler: ContentScheduler = tanjun.injected(type=ContentScheduler),
+    index: ChannelIndex[hikari.TextableGuildChannel] = tanjun.injected(
+        type=ChannelIndex
+    ),
+) -> None:
+    """Start delivering scheduled content once the bot is connected.
+
+    Args:
+        client (tanjun.abc.Client): The client this component is bound to.
+        scheduler (ContentScheduler): The content scheduler. This is a registered
+            type dependency and is injected by the client.
+        index (ChannelIndex[hikari.TextableGuildChannel]): The channel index. This is
+            a registered type dependency and is injected by the client.
+    """
+    await scheduler.start(client.rest, client.cache, index)
+
+
+@component.with_client_callback(tanjun.ClientCallbackNames.CLOSING)
+async def stop_scheduler(
+    scheduler: ContentScheduler = tanjun.injected(type=ContentScheduler),
+) -> None:
+    """Stop delivering scheduled content when the bot is closing.
+
+    Args:
+        scheduler (ContentScheduler): The content scheduler. This is a registered
+            type dependency and is injected by the client.
+    """
+    await scheduler.stop()
+
+
 @tanjun.as_loader
 def load_examples(client: tanjun.abc.Client) -> None:
     """The loader for this component.
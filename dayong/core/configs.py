@@ -11,17 +11,120 @@ from typing import Any, Optional, Union
 
 from pydantic import BaseModel
 
-from dayong.core.settings import CONFIG_FILE
+from dayong.core.settings import CONFIG_FILE, HTTP_CACHE_FILE
 from dayong.utils import format_db_url
 
 
+class DatabaseOptions(BaseModel):
+    """Connection pool options for the database engine."""
+
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_pre_ping: bool = True
+    pool_recycle: int = 1800
+    pool_timeout: float = 30.0
+    statement_cache_size: int = 100
+    bulk_chunk_size: int = 1000
+    write_behind: bool = False
+    write_behind_batch_size: int = 100
+    write_behind_interval: float = 1.0
+    cache_size: int = 1024
+    # Seconds until cached rows of a table expire, keyed by table name. `None`
+    # caches rows until they are evicted.
+    cache_ttl: dict[str, Optional[float]] = {
+        "anon_messages": None,
+        "scheduledtask": 300.0,
+    }
+
+
+class GreetingOptions(BaseModel):
+    """Options for welcoming new guild members."""
+
+    # Members who join within this many seconds are greeted in a single message.
+    window: float = 5.0
+    max_batch_size: int = 25
+
+
+class HTTPCacheOptions(BaseModel):
+    """Options for the cache of responses from content providers."""
+
+    path: str = HTTP_CACHE_FILE
+    # Responses kept in memory. Every response is also stored on disk.
+    size: int = 128
+    # Bodies larger than this many bytes are only stored on disk.
+    max_body_size: int = 262144
+
+
+class LedgerOptions(BaseModel):
+    """Options for the record of delivered content."""
+
+    # Content is delivered again to a channel once this many days have passed.
+    retention_days: float = 30.0
+
+
+class PipelineOptions(BaseModel):
+    """Options for the stages content flows through on its way to a channel."""
+
+    # Items buffered between two stages.
+    queue_size: int = 64
+    # Seconds to wait for more items before sending a message that isn't full.
+    linger: float = 1.0
+
+
+class ProviderOptions(BaseModel):
+    """Options for fetching content from API providers."""
+
+    # Requests in flight at once, across every provider.
+    concurrency: int = 4
+    timeout: float = 10.0
+    pages: int = 1
+    per_page: int = 30
+    # Fetch pages of each tag. An empty list fetches pages of any tag.
+    tags: list[str] = []
+    # Import paths of more provider classes, e.g. "package.module:Provider".
+    extra: list[str] = []
+
+
+class ScheduleOptions(BaseModel):
+    """Options for the schedules of content jobs."""
+
+    # Crontab expressions, by content provider alias. Providers that aren't listed
+    # run on their default schedule.
+    jobs: dict[str, str] = {}
+    timezone: str = "UTC"
+    # A run missed by at most this many seconds, e.g. while the bot was restarting,
+    # is caught up on when the bot starts. Later runs are skipped.
+    misfire_grace_time: float = 21600.0
+    # Seconds between the catch-up runs of different jobs.
+    catch_up_interval: float = 30.0
+
+
+class TaskOptions(BaseModel):
+    """Options for background tasks, such as content deliveries."""
+
+    # Tasks running at once, across every group.
+    concurrency: int = 8
+    # Tasks running at once in a group, by group name.
+    group_limits: dict[str, int] = {}
+    # Seconds a task may run before it is cancelled.
+    timeout: Optional[float] = 600.0
+
+
 class ConfigFile(BaseModel):
     """Configuration model."""
 
     bot_prefix: str
+    database: DatabaseOptions = DatabaseOptions()
     embeddings: dict[str, Union[str, dict[str, Any]]]
+    greetings: GreetingOptions = GreetingOptions()
     guild_id: int
+    http_cache: HTTPCacheOptions = HTTPCacheOptions()
     imap_domain_name: str
+    ledger: LedgerOptions = LedgerOptions()
+    pipeline: PipelineOptions = PipelineOptions()
+    providers: ProviderOptions = ProviderOptions()
+    schedule: ScheduleOptions = ScheduleOptions()
+    tasks: TaskOptions = TaskOptions()
 
 
 class EnvironVariables(BaseModel):
@@ -48,12 +151,20 @@ class DayongConfig(EnvironVariables, ConfigFile):
         return cls(
             bot_prefix=kwargs["bot_prefix"],
             bot_token=kwargs["bot_token"],
+            database=kwargs.get("database", {}),
             database_uri=kwargs["database_uri"],
             embeddings=kwargs["embeddings"],
+            greetings=kwargs.get("greetings", {}),
             email=email if email else None,
             email_password=email_password if email_password else None,
             guild_id=kwargs["guild_id"],
+            http_cache=kwargs.get("http_cache", {}),
             imap_domain_name=kwargs["imap_domain_name"],
+            ledger=kwargs.get("ledger", {}),
+            pipeline=kwargs.get("pipeline", {}),
+            providers=kwargs.get("providers", {}),
+            schedule=kwargs.get("schedule", {}),
+            tasks=kwargs.get("tasks", {}),
         )
 
 
@@ -83,9 +194,17 @@ class DayongConfigLoader:
             config = dict(json.load(cfp))
 
         self.bot_prefix = config["bot_prefix"]
+        self.database = config.get("database", {})
         self.guild_id = config["guild_id"]
         self.embeddings = config["embeddings"]
+        self.greetings = config.get("greetings", {})
+        self.http_cache = config.get("http_cache", {})
         self.imap_domain_name = config["imap_domain_name"]
+        self.ledger = config.get("ledger", {})
+        self.pipeline = config.get("pipeline", {})
+        self.providers = config.get("providers", {})
+        self.schedule = config.get("schedule", {})
+        self.tasks = config.get("tasks", {})
 
 
 class DayongDynamicLoader:
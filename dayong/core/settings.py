@@ -26,9 +26,4 @@ install(theme="monokai")
 BASE_DIR = Path(__file__).resolve().parent.parent
 ROOT_DIR = BASE_DIR.parent
 CONFIG_FILE = os.path.join(ROOT_DIR, "config.json")
-
-# Available 3rd party content providers.
-CONTENT_PROVIDER = {
-    "medium": "https://medium.com",
-    "dev": "https://dev.to",
-}
+HTTP_CACHE_FILE = os.path.join(ROOT_DIR, ".cache", "http.sqlite3")
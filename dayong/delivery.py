@@ -0,0 +1,301 @@
+"""
+dayong.delivery
+~~~~~~~~~~~~~~~
+
+Packing of third-party content into as few Discord messages as possible.
+"""
+import asyncio
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, Optional, Union
+
+# Discord's limits on the contents of a single message.
+MAX_CONTENT_LENGTH = 2000
+MAX_EMBEDS = 10
+MAX_EMBED_FIELDS = 25
+MAX_FIELD_VALUE_LENGTH = 1024
+# The total length of every embed in a message.
+MAX_EMBEDS_LENGTH = 6000
+
+
+class DeliveryMode(str, Enum):
+    """How the content of a scheduled task is delivered."""
+
+    # One message per item.
+    DRIP = "drip"
+    # As many items per message as fit in its text.
+    DIGEST = "digest"
+    # As many items per message as fit in its embeds, one field per item.
+    EMBED = "embed"
+
+
+@dataclass
+class Batch:
+    """The items that are sent together in a single message.
+
+    Attributes:
+        content (Optional[str]): The text of the message.
+        embeds (list[list[tuple[str, str]]]): The name and value of the fields of
+            each embed in the message.
+        items (list[str]): The items that end in the message. An item that is split
+            across messages belongs to the last of them.
+    """
+
+    content: Optional[str] = None
+    embeds: list[list[tuple[str, str]]] = field(default_factory=list)
+    items: list[str] = field(default_factory=list)
+
+    @property
+    def size(self) -> int:
+        """The number of items in the message."""
+        return len(self.items)
+
+
+def _split(item: str, limit: int) -> Iterator[str]:
+    end = limit
+    for start in range(0, len(item), limit):
+        yield item[start:end]
+        end += limit
+
+
+class TextPacker:
+    """Pack items into messages one at a time, one item per line.
+
+    Args:
+        limit (int, optional): The maximum length of a message. Defaults to
+            `MAX_CONTENT_LENGTH`.
+    """
+
+    def __init__(self, limit: int = MAX_CONTENT_LENGTH) -> None:
+        self.limit = limit
+        self._lines: list[str] = []
+        self._items: list[str] = []
+        self._length = 0
+
+    @property
+    def pending(self) -> int:
+        """The number of items packed into the message that isn't full yet."""
+        return len(self._items)
+
+    def add(self, item: str) -> Iterator[Batch]:
+        """Pack an item.
+
+        Args:
+            item (str): The item to deliver.
+
+        Yields:
+            Iterator[Batch]: The messages that are full. An item that is longer than
+                the limit is split across messages.
+        """
+        line = str(item)
+        if self._lines and self._length + 1 + len(line) > self.limit:
+            yield from self.flush()
+
+        if len(line) > self.limit:
+            *parts, line = _split(line, self.limit)
+            for part in parts:
+                yield Batch(content=part)
+
+        self._length += len(line) + (1 if self._lines else 0)
+        self._lines.append(line)
+        self._items.append(item)
+
+    def flush(self) -> Iterator[Batch]:
+        """Finish the message that isn't full yet.
+
+        Yields:
+            Iterator[Batch]: The message, if it has any items.
+        """
+        if self._lines:
+            yield Batch(content="\n".join(self._lines), items=self._items)
+            self._lines, self._items, self._length = [], [], 0
+
+
+class DripPacker(TextPacker):
+    """Pack every item into a message of its own."""
+
+    def add(self, item: str) -> Iterator[Batch]:
+        yield from super().add(item)
+        yield from self.flush()
+
+
+class EmbedPacker:
+    """Pack items one at a time into the fields of as few embeds and messages as
+    possible.
+
+    Field names count towards the length of an embed, so each field is named after the
+    position of its item.
+    """
+
+    def __init__(self) -> None:
+        self._batch = Batch()
+        self._length = 0
+        self._number = 0
+
+    @property
+    def pending(self) -> int:
+        """The number of items packed into the message that isn't full yet."""
+        return self._batch.size
+
+    def add(self, item: str) -> Iterator[Batch]:
+        """Pack an item.
+
+        Args:
+            item (str): The item to deliver.
+
+        Yields:
+            Iterator[Batch]: The messages that are full. An item that is longer than a
+                field value is split across fields.
+        """
+        self._number += 1
+        name = str(self._number)
+        for part in _split(str(item), MAX_FIELD_VALUE_LENGTH):
+            if self._length + len(name) + len(part) > MAX_EMBEDS_LENGTH:
+                yield self._batch
+                self._batch, self._length = Batch(), 0
+
+            if (
+                not self._batch.embeds
+                or len(self._batch.embeds[-1]) >= MAX_EMBED_FIELDS
+            ):
+                if len(self._batch.embeds) >= MAX_EMBEDS:
+                    yield self._batch
+                    self._batch, self._length = Batch(), 0
+                self._batch.embeds.append([])
+
+            self._batch.embeds[-1].append((name, part))
+            self._length += len(name) + len(part)
+
+        self._batch.items.append(item)
+
+    def flush(self) -> Iterator[Batch]:
+        """Finish the message that isn't full yet.
+
+        Yields:
+            Iterator[Batch]: The message, if it has any items.
+        """
+        if self._batch.embeds:
+            yield self._batch
+            self._batch, self._length = Batch(), 0
+
+
+Packer = Union[TextPacker, EmbedPacker]
+
+
+def packer(mode: DeliveryMode) -> Packer:
+    """Create a packer for a delivery mode.
+
+    Args:
+        mode (DeliveryMode): How the items are delivered.
+
+    Returns:
+        Packer: A packer that packs items into messages one at a time.
+    """
+    if mode is DeliveryMode.DIGEST:
+        return TextPacker()
+    if mode is DeliveryMode.EMBED:
+        return EmbedPacker()
+    return DripPacker()
+
+
+def _pack(items: Iterable[str], packer_: Packer) -> Iterator[Batch]:
+    for item in items:
+        yield from packer_.add(item)
+    yield from packer_.flush()
+
+
+def pack_text(items: Iterable[str], limit: int = MAX_CONTENT_LENGTH) -> Iterator[Batch]:
+    """Pack items into messages, one item per line.
+
+    Args:
+        items (Iterable[str]): The items to deliver.
+        limit (int, optional): The maximum length of a message. Defaults to
+            `MAX_CONTENT_LENGTH`.
+
+    Yields:
+        Iterator[Batch]: The messages to send, in order. An item that is longer than
+            the limit is split across messages.
+    """
+    yield from _pack(items, TextPacker(limit))
+
+
+def pack_embeds(items: Iterable[str]) -> Iterator[Batch]:
+    """Pack items into the fields of as few embeds and messages as possible.
+
+    Args:
+        items (Iterable[str]): The items to deliver.
+
+    Yields:
+        Iterator[Batch]: The messages to send, in order. An item that is longer than a
+            field value is split across fields.
+    """
+    yield from _pack(items, EmbedPacker())
+
+
+def pack(items: Iterable[str], mode: DeliveryMode) -> Iterator[Batch]:
+    """Pack items into messages according to a delivery mode.
+
+    Args:
+        items (Iterable[str]): The items to deliver.
+        mode (DeliveryMode): How the items are delivered.
+
+    Yields:
+        Iterator[Batch]: The messages to send, in order.
+    """
+    yield from _pack(items, packer(mode))
+
+
+async def pack_stream(
+    items: AsyncIterable[str], mode: DeliveryMode, linger: float = 1.0
+) -> AsyncIterator[Batch]:
+    """Pack items into messages as they arrive.
+
+    A message is sent once it is full, or once no item has arrived for `linger`
+    seconds, so that items don't wait on a slow source. If the source raises, the
+    pending items are packed before the exception is raised.
+
+    Args:
+        items (AsyncIterable[str]): The items to deliver.
+        mode (DeliveryMode): How the items are delivered.
+        linger (float, optional): Seconds to wait for more items before sending a
+            message that isn't full. Defaults to 1.0.
+
+    Yields:
+        AsyncIterator[Batch]: The messages to send, in order.
+    """
+    packer_ = packer(mode)
+    iterator = items.__aiter__()
+    # The next item is awaited across timeouts instead of being cancelled.
+    upcoming: Optional["asyncio.Future[str]"] = None
+
+    try:
+        while True:
+            if upcoming is None:
+                upcoming = asyncio.ensure_future(iterator.__anext__())
+
+            timeout = linger if packer_.pending else None
+            done, _ = await asyncio.wait({upcoming}, timeout=timeout)
+            if not done:
+                for batch in packer_.flush():
+                    yield batch
+                continue
+
+            future, upcoming = upcoming, None
+            try:
+                item = future.result()
+            except StopAsyncIteration:
+                break
+            except Exception:
+                # The items before the error are still delivered.
+                for batch in packer_.flush():
+                    yield batch
+                raise
+
+            for batch in packer_.add(item):
+                yield batch
+
+        for batch in packer_.flush():
+            yield batch
+    finally:
+        if upcoming is not None:
+            upcoming.cancel()
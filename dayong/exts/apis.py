@@ -4,60 +4,357 @@ dayong.exts.apis
 
 Module in charge of retrieving content from API endpoints.
 """
+import asyncio
 import json
-import urllib.request
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Optional, Sequence
+from urllib.parse import quote
 
 import aiohttp
+from loguru import logger
 
-from dayong.core.settings import CONTENT_PROVIDER
-from dayong.exts.contents import ThirdPartyContent
+from dayong.exts.contents import ThirdPartyContent, iter_json_array
+from dayong.exts.httpcache import CachedResponse, ResponseCache, expiry, storable
+
+DEVTO_URL = "https://dev.to"
 
 
 class RESTClient:
-    """Represents a client for interacting with REST APIs."""
+    """Represents a client for interacting with REST APIs.
+
+    Args:
+        cache (Optional[ResponseCache], optional): Cache of responses used to make
+            conditional requests. Defaults to None, which fetches every response in
+            full.
+        concurrency (int, optional): The maximum number of requests in flight.
+            Defaults to 4.
+        timeout (float, optional): Seconds until a request times out. A streamed
+            response times out if connecting, or any read of its body, takes longer.
+            Defaults to 10.0.
+    """
 
     _headers = {"User-Agent": "Mozilla/5.0"}
-    _request = urllib.request.Request("http://127.0.0.1", headers=_headers)
-    _session: Optional[aiohttp.ClientSession] = None
+    _chunk_size = 16384
+
+    def __init__(
+        self,
+        cache: Optional[ResponseCache] = None,
+        concurrency: int = 4,
+        timeout: float = 10.0,
+    ) -> None:
+        self._cache = cache
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._inflight: dict[str, "asyncio.Future[bytes]"] = {}
+        self._semaphore = asyncio.Semaphore(max(concurrency, 1))
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        # A streamed body is read as fast as it is consumed, so only the connection
+        # and each read are timed, not the whole response.
+        self._stream_timeout = aiohttp.ClientTimeout(
+            sock_connect=timeout, sock_read=timeout
+        )
 
     async def create_session(self):
         """Create client session."""
         if not self._session:
-            self._session = aiohttp.ClientSession()
+            self._session = aiohttp.ClientSession(headers=self._headers)
+
+    async def close(self) -> None:
+        """Close the client session and the response cache."""
+        if self._session:
+            await self._session.close()
+            self._session = None
+        if self._cache:
+            self._cache.close()
+
+    async def fetch(self, url: str) -> bytes:
+        """Fetch the body of a URL.
+
+        A fresh cached response is returned without a request. A stale one is
+        revalidated with a conditional request. Concurrent fetches of the same URL
+        share a single request.
+
+        Args:
+            url (str): The URL to fetch.
+
+        Returns:
+            bytes: The response body.
+
+        Raises:
+            aiohttp.ClientResponseError: Raised if the server responds with an error.
+        """
+        inflight = self._inflight.get(url)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future: "asyncio.Future[bytes]" = asyncio.get_running_loop().create_future()
+        self._inflight[url] = future
+        try:
+            body = await self._fetch(url)
+            future.set_result(body)
+            return body
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as err:
+            future.set_exception(err)
+            # Only the callers waiting on the future need the exception.
+            future.exception()
+            raise
+        finally:
+            del self._inflight[url]
+
+    async def _fetch(self, url: str) -> bytes:
+        cached = await self._cache.get(url) if self._cache else None
+
+        if cached is not None and cached.fresh:
+            return cached.body
+
+        await self.create_session()
+        assert isinstance(self._session, aiohttp.ClientSession)
+        headers = cached.conditional_headers() if cached is not None else {}
+
+        async with self._semaphore, self._session.get(
+            url, headers=headers, timeout=self._timeout
+        ) as resp:
+            if resp.status == 304 and cached is not None:
+                cached = cached.revalidated(resp.headers)
+                if self._cache:
+                    await self._cache.set(cached)
+                return cached.body
+
+            resp.raise_for_status()
+            body = await resp.read()
+
+            if self._cache and storable(resp.status, resp.headers):
+                await self._cache.set(
+                    CachedResponse(
+                        url,
+                        body,
+                        resp.headers.get("ETag"),
+                        resp.headers.get("Last-Modified"),
+                        expiry(resp.headers),
+                    )
+                )
+
+        return body
+
+    async def stream(self, url: str) -> AsyncIterator[bytes]:
+        """Fetch the body of a URL in chunks.
+
+        Like `fetch`, a fresh cached response is served without a request and a
+        stale one is revalidated. Otherwise the body is read from the response as
+        it is consumed, and copied into the cache once it has been read in full.
+
+        Args:
+            url (str): The URL to fetch.
+
+        Yields:
+            AsyncIterator[bytes]: The response body, in chunks.
+
+        Raises:
+            aiohttp.ClientResponseError: Raised if the server responds with an error.
+        """
+        cached = await self._cache.get(url) if self._cache else None
+
+        if cached is None or not cached.fresh:
+            await self.create_session()
+            assert isinstance(self._session, aiohttp.ClientSession)
+            headers = cached.conditional_headers() if cached is not None else {}
+
+            async with self._semaphore, self._session.get(
+                url, headers=headers, timeout=self._stream_timeout
+            ) as resp:
+                if resp.status == 304 and cached is not None:
+                    cached = cached.revalidated(resp.headers)
+                    if self._cache:
+                        await self._cache.set(cached)
+                else:
+                    resp.raise_for_status()
+                    store = self._cache is not None and storable(
+                        resp.status, resp.headers
+                    )
+                    chunks: list[bytes] = []
+
+                    async for chunk in resp.content.iter_chunked(self._chunk_size):
+                        if store:
+                            chunks.append(chunk)
+                        yield chunk
+
+                    if self._cache and store:
+                        await self._cache.set(
+                            CachedResponse(
+                                url,
+                                b"".join(chunks),
+                                resp.headers.get("ETag"),
+                                resp.headers.get("Last-Modified"),
+                                expiry(resp.headers),
+                            )
+                        )
+                    return
+
+        body = memoryview(cached.body)
+        for start in range(0, len(body), self._chunk_size):
+            end = start + self._chunk_size
+            yield bytes(body[start:end])
+
+    async def get_fields(self, url: str, field: Any) -> list[Any]:
+        """Fetch a JSON array and keep one field of each of its items.
+
+        Args:
+            url (str): The URL of the API endpoint.
+            field (Any): The key of the field to keep.
+
+        Returns:
+            list[Any]: The field of each item that has it, in order.
+        """
+        return [
+            item[field]
+            async for item in iter_json_array(self.stream(url))
+            if isinstance(item, dict) and field in item
+        ]
 
     async def get_content(self, data: Any, *args: Any) -> "ThirdPartyContent":
         """Parse and return fetched content.
 
         Args:
-            data (Any): Response data from mail server.
+            data (Any): The URL of the API endpoint.
 
         Returns:
             ThirdPartyContent: Representation of content from third-party
                 service/content provider.
         """
-        await self.create_session()
-        assert isinstance(self._session, aiohttp.ClientSession)
-        resp = await self._session.get(data)
-        data = await resp.text()
-        return await ThirdPartyContent.parse(json.loads(data), args[0])
+        if args and args[0]:
+            return await ThirdPartyContent.parse(await self.get_fields(data, args[0]))
 
-    async def get_devto_article(self, sort_by_date: bool = False) -> ThirdPartyContent:
-        """Retrieve URLs of dev.to articles.
+        body = await self.fetch(data)
+        return await ThirdPartyContent.parse(json.loads(body))
+
+    async def get_paginated(
+        self, urls: Sequence[str], field: Any
+    ) -> "ThirdPartyContent":
+        """Fetch pages concurrently and merge one field of their items.
+
+        A page that fails or times out is logged and skipped.
 
         Args:
-            sort_by_date (bool, optional): Whether to order articles by descending
-                publish date. Defaults to False.
+            urls (Sequence[str]): The URL of each page.
+            field (Any): The key of the field to keep.
 
         Returns:
-            ThirdPartyContent: List of article URLs.
+            ThirdPartyContent: The unique fields, in page order.
         """
+        pages = await asyncio.gather(
+            *(self.get_fields(url, field) for url in urls), return_exceptions=True
+        )
+        fields: dict[Any, None] = {}
+
+        for url, page in zip(urls, pages):
+            if isinstance(page, BaseException):
+                logger.warning(f"failed to fetch {url}: {page!r}")
+                continue
+            fields.update(dict.fromkeys(page))
+
+        return await ThirdPartyContent.parse(list(fields))
+
+    async def iter_paginated(
+        self, urls: Sequence[str], field: Any, maxsize: int = 64
+    ) -> AsyncIterator[Any]:
+        """Fetch pages concurrently and yield one field of their items as soon as
+        they are parsed.
+
+        A page that fails or times out is logged and skipped. Pages stop being read
+        while `maxsize` fields are waiting to be consumed.
+
+        Args:
+            urls (Sequence[str]): The URL of each page.
+            field (Any): The key of the field to keep.
+            maxsize (int, optional): The number of fields buffered. Defaults to 64.
+
+        Yields:
+            AsyncIterator[Any]: The fields, in the order they are parsed. Fields may
+                repeat across pages.
+        """
+        end = object()
+        queue: "asyncio.Queue[Any]" = asyncio.Queue(max(maxsize, 1))
+
+        async def read(url: str) -> None:
+            try:
+                async for item in iter_json_array(self.stream(url)):
+                    if isinstance(item, dict) and field in item:
+                        await queue.put(item[field])
+            except Exception as err:  # pylint: disable=W0703
+                logger.warning(f"failed to fetch {url}: {err!r}")
 
-        request = self._request
+            await queue.put(end)
 
+        readers = [asyncio.create_task(read(url)) for url in urls]
+        remaining = len(readers)
+        try:
+            while remaining:
+                item = await queue.get()
+                if item is end:
+                    remaining -= 1
+                else:
+                    yield item
+        finally:
+            for reader in readers:
+                reader.cancel()
+            await asyncio.gather(*readers, return_exceptions=True)
+
+    @staticmethod
+    def devto_urls(
+        sort_by_date: bool = False,
+        tags: Sequence[str] = (),
+        pages: int = 1,
+        per_page: int = 30,
+    ) -> list[str]:
+        """Get the URLs of pages of dev.to articles.
+
+        Args:
+            sort_by_date (bool, optional): Whether to order articles by descending
+                publish date. Defaults to False.
+            tags (Sequence[str], optional): Only retrieve articles with one of these
+                tags. Defaults to (), which retrieves articles with any tag.
+            pages (int, optional): The number of pages to retrieve per tag. Defaults
+                to 1.
+            per_page (int, optional): The number of articles per page. Defaults to
+                30.
+
+        Returns:
+            list[str]: The URL of each page.
+        """
         if sort_by_date:
-            request.full_url = f"""{CONTENT_PROVIDER["dev"]}/api/articles/latest/"""
+            endpoint = f"{DEVTO_URL}/api/articles/latest/"
         else:
-            request.full_url = f"""{CONTENT_PROVIDER["dev"]}/api/articles/"""
+            endpoint = f"{DEVTO_URL}/api/articles/"
+
+        return [
+            f"{endpoint}?page={page}&per_page={per_page}"
+            + (f"&tag={quote(tag)}" if tag else "")
+            for tag in (tags or ("",))
+            for page in range(1, pages + 1)
+        ]
 
-        return await self.get_content(request.full_url, "canonical_url")
+    async def get_devto_article(
+        self,
+        sort_by_date: bool = False,
+        tags: Sequence[str] = (),
+        pages: int = 1,
+        per_page: int = 30,
+    ) -> ThirdPartyContent:
+        """Retrieve URLs of dev.to articles.
+
+        Args:
+            sort_by_date (bool, optional): Whether to order articles by descending
+                publish date. Defaults to False.
+            tags (Sequence[str], optional): Only retrieve articles with one of these
+                tags. Defaults to (), which retrieves articles with any tag.
+            pages (int, optional): The number of pages to retrieve per tag. Defaults
+                to 1.
+            per_page (int, optional): The number of articles per page. Defaults to
+                30.
+
+        Returns:
+            ThirdPartyContent: List of article URLs.
+        """
+        urls = self.devto_urls(sort_by_date, tags, pages, per_page)
+        return await self.get_paginated(urls, "canonical_url")
@@ -5,7 +5,73 @@ dayong.exts.contents
 
 Handlers for third-party content.
 """
-from typing import Any, Optional
+import codecs
+import json
+from typing import Any, AsyncIterable, AsyncIterator, Optional
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",]"
+
+
+async def iter_json_array(chunks: AsyncIterable[bytes]) -> AsyncIterator[Any]:
+    """Decode the items of a JSON array as its bytes arrive.
+
+    Only the undecoded part of the document and the item being decoded are held in
+    memory, instead of the whole document and every decoded item.
+
+    Args:
+        chunks (AsyncIterable[bytes]): The UTF-8 encoded document, in chunks.
+
+    Yields:
+        AsyncIterator[Any]: The items of the array, in order.
+
+    Raises:
+        ValueError: Raised if the document isn't a JSON array.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    started = False
+
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+
+        while True:
+            buffer = buffer.lstrip(_WHITESPACE)
+            if not buffer:
+                break
+
+            if not started:
+                if buffer[0] != "[":
+                    raise ValueError("expected a JSON array")
+                buffer = buffer[1:]
+                started = True
+                continue
+
+            if buffer[0] == ",":
+                buffer = buffer[1:]
+                continue
+
+            if buffer[0] == "]":
+                return
+
+            try:
+                item, end = _DECODER.raw_decode(buffer)
+            except json.JSONDecodeError:
+                # The item continues in the next chunk.
+                break
+
+            # A number, e.g. "-0." or "-0.5", may continue in the next chunk. It is
+            # complete once a delimiter follows it.
+            if not isinstance(item, (dict, list, str)) and (
+                end == len(buffer) or buffer[end] not in _DELIMITERS
+            ):
+                break
+
+            buffer = buffer[end:]
+            yield item
+
+    raise ValueError("unterminated JSON array")
 
 
 class ThirdPartyContent:
@@ -1,33 +1,72 @@
 # pylint: disable=W0231
 """
-dayong.tasks.emails
-~~~~~~~~~~~~~~~~~~~
+dayong.exts.emails
+~~~~~~~~~~~~~~~~~~
 
 Module in charge of retrieving content on email subscription.
 """
-import asyncio
+import base64
+import binascii
+import email
 import re
 from dataclasses import dataclass
-from typing import Any, Optional, Union
+from email.policy import default as default_policy
+from typing import Any, Awaitable, Callable, Optional
 
 from loguru import logger
-from pragmail import Client, utils
 
+from dayong.abc import Database
 from dayong.exts.contents import ThirdPartyContent
+from dayong.exts.imap import (
+    IMAPClient,
+    IMAPError,
+    MailboxWatcher,
+    find_part,
+    quote,
+)
+from dayong.models import MailboxState
+
+MEDIUM_DIGEST_SUBJECT = "Medium Daily Digest"
+
+# The URL of a link, up to its query string or fragment.
+HREF_PATTERN = re.compile(rb"""href=["']?(https?://[^"'\s<>?#]+)""", re.IGNORECASE)
+
+
+def _section(fetched: dict[str, Any]) -> Optional[bytes]:
+    # The data of the first BODY[<section>] item of a fetched message. Servers don't
+    # all echo the section specifier the same way it was requested.
+    return next(
+        (value for key, value in fetched.items() if key.startswith("BODY[")), None
+    )
 
 
 @dataclass
 class EmailClient:
-    """Represents a client for retrieving email subscriptions."""
+    """Represents a client for retrieving email subscriptions.
+
+    The connection to the mail server is opened on first use and kept open. Messages
+    are processed incrementally: the UID of the last processed message is stored in
+    the database, if one is given, and only messages with greater UIDs are fetched.
+    Fetched messages count as processed once `commit` is called.
+    """
 
     host: str
     email: str
     password: str
-    max_retries: int = 5
+    database: Optional[Database] = None
+    mailbox: str = "INBOX"
+    timeout: float = 60.0
 
     def __post_init__(self) -> None:
-        self._client: Optional[Client] = None
-        self.connect_to_server()
+        self._client: Optional[IMAPClient] = None
+        self._uid_validity = 0
+        self._last_uid: Optional[int] = None
+        # The UID of the last fetched message, until it is committed.
+        self._fetched_uid: Optional[int] = None
+
+    @property
+    def _state_key(self) -> str:
+        return f"{self.email}/{self.mailbox}"
 
     @staticmethod
     def extract_mime_url(msg: bytes) -> Any:
@@ -37,100 +76,243 @@ class EmailClient:
             msg (bytes): Message retrieved from email server.
 
         Returns:
-            Any: List of url strings.
+            Any: List of url strings, without duplicates, in the order they appear.
         """
-        uris: list[str] = []
-        msg = msg.replace(b"\r\n", b"")
-        body = utils.read_message(msg, as_string=True)
+        # Digests are quoted-printable HTML. Decoding the whole message, headers
+        # included, leaves its links intact and also joins the ones that soft line
+        # breaks split.
+        return EmailClient.extract_urls(binascii.a2b_qp(msg))
 
-        if not isinstance(body, str):
-            body = str(body)
+    @staticmethod
+    def extract_urls(html: bytes) -> list[str]:
+        """Extract article URLs from decoded HTML.
+
+        Args:
+            html (bytes): The HTML part of a message, decoded.
 
-        # Extract URLs. Only include link to articles written by Medium users.
-        # Path to user profiles includes an "@" symbol and have greater than three
-        # slashes.
-        for href in re.findall(r'href=3D[\'"]?([^\'">?]+)', body):
-            if href.count("/") > 3 and "@" in href:
-                uri = href.replace("=", "")
-            else:
-                uri = ""
+        Returns:
+            list[str]: List of url strings, without duplicates, in the order they
+                appear.
+        """
+        uris: dict[str, None] = {}
 
-            # Add url and avoid duplicates.
-            if uri and uri not in uris:
-                uris.append(uri)
+        # Only include link to articles written by Medium users. Path to user
+        # profiles includes an "@" symbol and have greater than three slashes.
+        for match in HREF_PATTERN.finditer(html):
+            href = match.group(1)
+            if href.count(b"/") > 3 and b"@" in href:
+                uris[href.decode(errors="replace")] = None
 
-        return uris
+        return list(uris)
 
     @staticmethod
-    async def parse_message_data(
-        message: Union[list[Any], list[Union[bytes, tuple[bytes, bytes]]]]
-    ) -> Any:
-        """Parse the message data and extract message body.
+    def decode_part(data: bytes, encoding: str) -> bytes:
+        """Decode a part of a message.
 
         Args:
-            message (Union[list[Any], list[Union[bytes, tuple[bytes, bytes]]]]): The
-                message object retrieved from the email server.
-
-        Raises:
-            TypeError: Raised if message data is not a tuple.
+            data (bytes): The part, as sent by the server.
+            encoding (str): The content transfer encoding of the part.
 
         Returns:
-            Any: The message body.
+            bytes: The decoded part.
         """
-        message_data = message[0]
-
-        if isinstance(message_data, tuple):
-            message_body = message_data[1]
-        else:
-            raise TypeError(f"{type(message_data)}, {message_data=}")
-
-        return message_body
+        if encoding == "quoted-printable":
+            return binascii.a2b_qp(data)
+        if encoding == "base64":
+            return base64.b64decode(data)
+        return data
 
     @staticmethod
-    async def get_content(data: Any) -> ThirdPartyContent:
+    async def get_content(message: bytes) -> ThirdPartyContent:
         """Parse and return fetched content.
 
         Args:
-            data (Any): Response data from mail server.
+            message (bytes): Message retrieved from email server.
 
         Returns:
             ThirdPartyContent: Representation of content from third-party
                 service/content provider.
         """
-        message_body = await EmailClient.parse_message_data(data)
-        return await ThirdPartyContent.parse(EmailClient.extract_mime_url(message_body))
+        return await ThirdPartyContent.parse(EmailClient.extract_mime_url(message))
+
+    async def _open(self) -> tuple[IMAPClient, int]:
+        # A new connection with the mailbox selected, and the UIDVALIDITY of the
+        # mailbox.
+        client = IMAPClient(self.host, timeout=self.timeout)
+        await client.connect()
+        try:
+            await client.login(self.email, self.password)
+            uid_validity = await client.select(self.mailbox) or 0
+        except IMAPError:
+            await client.close()
+            raise
+
+        return client, uid_validity
+
+    async def _open_watch(self) -> IMAPClient:
+        # The watcher idles on a connection of its own, which it closes itself.
+        client, _ = await self._open()
+        return client
+
+    async def connect(self) -> IMAPClient:
+        """Connect to the mail server, replacing the current connection.
+
+        Returns:
+            IMAPClient: The connection, with the inbox selected.
+        """
+        await self.close()
+        client, uid_validity = await self._open()
+
+        if uid_validity != self._uid_validity or self._last_uid is None:
+            try:
+                self._last_uid = await self._load_last_uid(uid_validity)
+            except Exception:
+                await client.close()
+                raise
+            self._uid_validity = uid_validity
+            self._fetched_uid = None
 
-    @logger.catch
-    def connect_to_server(self) -> None:
-        """Connect to the mail server."""
-        if self._client:
-            self._client.logout()
+        self._client = client
+        return client
 
-        self._client = Client(self.host)
-        self._client.login(self.email, self.password)
-        self._client.select("INBOX")
+    async def _load_last_uid(self, uid_validity: int) -> Optional[int]:
+        if self.database is None:
+            return None
+
+        result = await self.database.get_row(
+            MailboxState(mailbox=self._state_key, uid_validity=0, last_uid=0),
+            "mailbox",
+        )
+        state = result.first()
+
+        # UIDs assigned under another UIDVALIDITY don't identify the same messages.
+        if state is None or state.uid_validity != uid_validity:
+            return None
+        return state.last_uid
+
+    async def _save_last_uid(self, uid: int) -> None:
+        self._last_uid = uid
+        if self.database is not None:
+            await self.database.upsert_row(
+                MailboxState(
+                    mailbox=self._state_key,
+                    uid_validity=self._uid_validity,
+                    last_uid=uid,
+                ),
+                ("mailbox",),
+            )
+
+    async def close(self) -> None:
+        """Log out and close the connection."""
+        client, self._client = self._client, None
+        if client is not None:
+            await client.logout()
+
+    async def _run(self, fetch: Callable[[IMAPClient], Awaitable[Any]]) -> Any:
+        client = self._client
+        if client is None or not client.connected:
+            client = await self.connect()
+
+        try:
+            return await fetch(client)
+        except IMAPError as err:
+            if client.connected:
+                raise
+            logger.info(f"reconnecting to {self.host}: {err}")
+            return await fetch(await self.connect())
+
+    async def _get_digest(self, client: IMAPClient) -> Optional[ThirdPartyContent]:
+        if self._last_uid is None:
+            # Without a mark, only the latest digest is considered.
+            uids = await client.uid_search("SUBJECT", quote(MEDIUM_DIGEST_SUBJECT))
+            del uids[:-1]
+        else:
+            # "n:*" always matches the message with the greatest UID, even if it is
+            # less than n.
+            uids = [
+                uid
+                for uid in await client.uid_search(
+                    "UID",
+                    f"{self._last_uid + 1}:*",
+                    "SUBJECT",
+                    quote(MEDIUM_DIGEST_SUBJECT),
+                )
+                if uid > self._last_uid
+            ]
+
+        if not uids:
+            return None
+
+        # Headers and structure first, so that only the HTML part of the newest
+        # digest is downloaded.
+        messages = await client.uid_fetch(
+            ",".join(map(str, uids)),
+            "(BODY.PEEK[HEADER.FIELDS (SUBJECT)] BODYSTRUCTURE)",
+        )
+        content = None
+
+        for uid in reversed(uids):
+            fetched = messages.get(uid, {})
+            header = email.message_from_bytes(
+                _section(fetched) or b"", policy=default_policy
+            )
+            part = find_part(fetched.get("BODYSTRUCTURE") or [], "text/html")
+
+            if MEDIUM_DIGEST_SUBJECT not in str(header["Subject"]) or part is None:
+                continue
+
+            section, encoding = part
+            fetched = await client.uid_fetch(str(uid), f"(BODY.PEEK[{section}])")
+            data = _section(fetched.get(uid, {}))
+            if data is None:
+                raise IMAPError(f"part {section} of message {uid} not found")
+
+            html = self.decode_part(data, encoding)
+            content = await ThirdPartyContent.parse(self.extract_urls(html))
+            break
+
+        self._fetched_uid = uids[-1]
+        return content
+
+    async def commit(self) -> None:
+        """Mark the messages fetched so far as processed, so they aren't fetched
+        again.
+        """
+        if self._fetched_uid is not None and (
+            self._last_uid is None or self._fetched_uid > self._last_uid
+        ):
+            await self._save_last_uid(self._fetched_uid)
+        self._fetched_uid = None
 
     async def get_medium_daily_digest(self) -> ThirdPartyContent:
-        """Retrieve relevant content URLs from the latest Medium Daily Digest message.
+        """Retrieve relevant content URLs from the newest Medium Daily Digest message
+        that hasn't been processed yet. The message isn't marked as processed until
+        `commit` is called.
 
         Raises:
-            ValueError: Raised if the email server returned an error response.
+            IMAPError: Raised if the email server returned an error response.
 
         Returns:
-            list[str]: List of url strings.
+            ThirdPartyContent: List of url strings. Empty if there is no new digest.
         """
-        assert self._client
-        loop = asyncio.get_running_loop()
-        response, message = await loop.run_in_executor(
-            None, self._client.latest_message, "Medium Daily Digest"
-        )
+        content = await self._run(self._get_digest)
+        return content if content is not None else await ThirdPartyContent.parse([])
+
+    def watch(
+        self, on_new_message: Callable[[], Awaitable[None]], keepalive: float = 600
+    ) -> MailboxWatcher:
+        """Watch the inbox for new messages over a connection of its own, so that
+        fetching content doesn't interrupt the watch or the other way around.
 
-        if response != "OK":
-            if self.max_retries > 0:
-                self.max_retries -= 1
-                await loop.run_in_executor(None, self.connect_to_server)
-                await loop.run_in_executor(None, self.get_medium_daily_digest)
-            else:
-                raise ValueError(f"{repr(self._client)} returned {response=}")
+        Args:
+            on_new_message (Callable[[], Awaitable[None]]): Called when messages
+                arrive, and after every reconnect.
+            keepalive (float, optional): Seconds between restarting IDLE. Defaults
+                to 600.
 
-        return await self.get_content(message)
+        Returns:
+            MailboxWatcher: The watcher, already started.
+        """
+        watcher = MailboxWatcher(self._open_watch, on_new_message, keepalive)
+        watcher.start()
+        return watcher
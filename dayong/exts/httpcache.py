@@ -0,0 +1,243 @@
+"""
+dayong.exts.httpcache
+~~~~~~~~~~~~~~~~~~~~~
+
+HTTP response cache that supports conditional requests and persists responses to
+disk, so unchanged feeds aren't downloaded again after a restart.
+"""
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Mapping, Optional
+
+from dayong.cache import CacheStats, LRUCache
+from dayong.utils import run_in_executor
+
+# Bodies up to this size in bytes are kept in memory as well as on disk.
+DEFAULT_MAX_BODY_SIZE = 262144
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """A response stored in the cache.
+
+    Attributes:
+        url (str): The requested URL.
+        body (bytes): The response body.
+        etag (Optional[str]): The `ETag` header of the response.
+        last_modified (Optional[str]): The `Last-Modified` header of the response.
+        expires_at (float): The UNIX timestamp after which the response has to be
+            revalidated.
+    """
+
+    url: str
+    body: bytes
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    expires_at: float = 0.0
+
+    @property
+    def fresh(self) -> bool:
+        """Whether the response can be used without revalidating it."""
+        return self.expires_at > time.time()
+
+    def conditional_headers(self) -> dict[str, str]:
+        """Build the headers that ask the server to reply 304 if unchanged."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def revalidated(self, headers: Mapping[str, str]) -> "CachedResponse":
+        """Update the response with the headers of a 304 response.
+
+        Args:
+            headers (Mapping[str, str]): The headers of the 304 response.
+
+        Returns:
+            CachedResponse: The updated response.
+        """
+        return replace(
+            self,
+            etag=headers.get("ETag", self.etag),
+            last_modified=headers.get("Last-Modified", self.last_modified),
+            expires_at=expiry(headers),
+        )
+
+
+def parse_cache_control(value: str) -> dict[str, Optional[str]]:
+    """Parse a `Cache-Control` header.
+
+    Args:
+        value (str): The header value, e.g. "public, max-age=300".
+
+    Returns:
+        dict[str, Optional[str]]: The lowercase directives and their arguments.
+    """
+    directives: dict[str, Optional[str]] = {}
+    for directive in value.split(","):
+        name, _, argument = directive.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') if argument else None
+    return directives
+
+
+def expiry(headers: Mapping[str, str]) -> float:
+    """Compute when a response becomes stale.
+
+    Args:
+        headers (Mapping[str, str]): The response headers.
+
+    Returns:
+        float: A UNIX timestamp. Responses without a `max-age`, or with `no-cache`,
+            are stale right away and revalidated on every request.
+    """
+    directives = parse_cache_control(headers.get("Cache-Control", ""))
+    if "no-cache" in directives:
+        return 0.0
+
+    max_age = directives.get("s-maxage") or directives.get("max-age")
+    try:
+        age = float(headers.get("Age", 0))
+        return time.time() + max(float(max_age or 0) - age, 0.0)
+    except ValueError:
+        return 0.0
+
+
+def storable(status: int, headers: Mapping[str, str]) -> bool:
+    """Check whether a response may be cached.
+
+    Args:
+        status (int): The response status.
+        headers (Mapping[str, str]): The response headers.
+
+    Returns:
+        bool: True if the response can be stored.
+    """
+    return status == 200 and "no-store" not in parse_cache_control(
+        headers.get("Cache-Control", "")
+    )
+
+
+class ResponseStore:
+    """On-disk SQLite store of cached responses. Queries run in an executor."""
+
+    def __init__(self, path: str) -> None:
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "url TEXT PRIMARY KEY, body BLOB NOT NULL, etag TEXT, "
+                "last_modified TEXT, expires_at REAL NOT NULL)"
+            )
+
+    @run_in_executor
+    def load(self, url: str) -> Optional[CachedResponse]:
+        """Load the stored response of a URL.
+
+        Args:
+            url (str): The requested URL.
+
+        Returns:
+            Optional[CachedResponse]: The response, or `None` if it isn't stored.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, body, etag, last_modified, expires_at FROM responses "
+                "WHERE url = ?",
+                (url,),
+            ).fetchone()
+        return CachedResponse(*row) if row is not None else None
+
+    @run_in_executor
+    def save(self, response: CachedResponse) -> None:
+        """Store a response, replacing the previous response of its URL.
+
+        Args:
+            response (CachedResponse): The response to store.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (
+                    response.url,
+                    response.body,
+                    response.etag,
+                    response.last_modified,
+                    response.expires_at,
+                ),
+            )
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """Two-tier response cache: an in-memory LRU cache in front of a
+    `ResponseStore`.
+
+    Args:
+        path (str): The path of the on-disk store.
+        maxsize (int, optional): The number of responses kept in memory. Defaults to
+            128.
+        max_body_size (int, optional): The size in bytes of the largest body kept in
+            memory. Larger responses are only stored on disk. Defaults to
+            `DEFAULT_MAX_BODY_SIZE`.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        maxsize: int = 128,
+        max_body_size: int = DEFAULT_MAX_BODY_SIZE,
+    ) -> None:
+        self.max_body_size = max_body_size
+        self._memory: LRUCache[CachedResponse] = LRUCache(maxsize)
+        self._store = ResponseStore(path)
+
+    @property
+    def stats(self) -> CacheStats:
+        """Hit and miss counters of the in-memory tier."""
+        return self._memory.stats
+
+    async def get(self, url: str) -> Optional[CachedResponse]:
+        """Get the cached response of a URL, fresh or not.
+
+        Args:
+            url (str): The requested URL.
+
+        Returns:
+            Optional[CachedResponse]: The response, or `None` if it isn't cached.
+        """
+        response = self._memory.get(url)
+        if response is None:
+            response = await self._store.load(url)
+            if response is not None and len(response.body) <= self.max_body_size:
+                self._memory.set(url, response)
+        return response
+
+    async def set(self, response: CachedResponse) -> None:
+        """Cache a response in memory and on disk.
+
+        Args:
+            response (CachedResponse): The response to cache.
+        """
+        if len(response.body) <= self.max_body_size:
+            self._memory.set(response.url, response)
+        else:
+            self._memory.pop(response.url)
+        await self._store.save(response)
+
+    def close(self) -> None:
+        """Close the on-disk store."""
+        self._store.close()
@@ -0,0 +1,568 @@
+"""
+dayong.exts.imap
+~~~~~~~~~~~~~~~~
+
+Minimal asyncio IMAP4rev1 client with support for IDLE (RFC 2177).
+
+Only the commands Dayong needs are implemented. Every command runs on the event loop,
+so no thread is blocked while the server responds.
+"""
+import asyncio
+import contextlib
+import random
+import re
+import ssl
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+from loguru import logger
+
+IMAP4_SSL_PORT = 993
+
+# A line that ends with a literal, e.g. "* 1 FETCH (BODY[] {1024}".
+_LITERAL = re.compile(rb"\{(\d+)\}$")
+_UNTAGGED_NUMBER = re.compile(rb"^\* (\d+) (\w+)")
+_UIDVALIDITY = re.compile(rb"\[UIDVALIDITY (\d+)\]", re.IGNORECASE)
+
+
+class IMAPError(Exception):
+    """Raised if the server rejects a command or the connection is lost."""
+
+
+@dataclass
+class Response:
+    """A line sent by the server.
+
+    Attributes:
+        line (bytes): The line without its CRLF. Literals are left as `{size}`
+            placeholders.
+        literals (list[bytes]): The literals sent with the line, in order.
+    """
+
+    line: bytes
+    literals: list[bytes] = field(default_factory=list)
+
+    @property
+    def untagged(self) -> bool:
+        """Whether this is an untagged response."""
+        return self.line.startswith(b"* ")
+
+    def number(self, kind: bytes) -> Optional[int]:
+        """Get the number of a numeric untagged response, e.g. `* 12 EXISTS`.
+
+        Args:
+            kind (bytes): The name of the response, e.g. b"EXISTS".
+
+        Returns:
+            Optional[int]: The number, or `None` if this is another response.
+        """
+        match = _UNTAGGED_NUMBER.match(self.line)
+        if match is None or match.group(2).upper() != kind:
+            return None
+        return int(match.group(1))
+
+
+def parse_list(data: bytes, literals: Optional[list[bytes]] = None) -> list[Any]:
+    """Parse the parenthesized lists of a response, e.g. a FETCH response.
+
+    Args:
+        data (bytes): The response line.
+        literals (Optional[list[bytes]], optional): The literals of the line, which
+            replace their `{size}` placeholders. Defaults to None.
+
+    Returns:
+        list[Any]: The items of the line. Atoms and strings are bytes, NIL is
+            `None`, and lists are lists. Section specifiers stay part of their atom,
+            e.g. b"BODY[HEADER.FIELDS (SUBJECT)]".
+    """
+    remaining = iter(literals or ())
+    # Latin-1 maps every byte to one character, so the line can be indexed by
+    # character and encoded back losslessly.
+    text = data.decode("latin-1")
+    stack: list[list[Any]] = [[]]
+    i = 0
+
+    while i < len(text):
+        char = text[i]
+        if char == " ":
+            i += 1
+        elif char == "(":
+            stack.append([])
+            i += 1
+        elif char == ")":
+            item = stack.pop()
+            stack[-1].append(item)
+            i += 1
+        elif char == '"':
+            value = []
+            i += 1
+            while text[i] != '"':
+                if text[i] == "\\":
+                    i += 1
+                value.append(text[i])
+                i += 1
+            stack[-1].append("".join(value).encode("latin-1"))
+            i += 1
+        elif char == "{":
+            stack[-1].append(next(remaining))
+            i = text.index("}", i) + 1
+        else:
+            start, depth = i, 0
+            while i < len(text) and (depth or text[i] not in " ()"):
+                if text[i] == "[":
+                    depth += 1
+                elif text[i] == "]":
+                    depth -= 1
+                i += 1
+            atom = text[start:i].encode("latin-1")
+            stack[-1].append(None if atom.upper() == b"NIL" else atom)
+
+    return stack[0]
+
+
+def parse_fetch(response: Response) -> Optional[dict[str, Any]]:
+    """Parse the data items of a FETCH response.
+
+    Args:
+        response (Response): A response, e.g.
+            `* 3 FETCH (UID 12 BODY[1] {1024}`.
+
+    Returns:
+        Optional[dict[str, Any]]: The data items keyed by their uppercase name, e.g.
+            "UID" or "BODY[1]". `None` if the response isn't a FETCH response.
+    """
+    if response.number(b"FETCH") is None:
+        return None
+
+    items = parse_list(response.line, response.literals)[-1]
+    return {
+        bytes(items[index]).decode().upper(): items[index + 1]
+        for index in range(0, len(items) - 1, 2)
+    }
+
+
+def find_part(
+    structure: list[Any], mime_type: str, section: str = ""
+) -> Optional[tuple[str, str]]:
+    """Find a part of a message in its BODYSTRUCTURE.
+
+    Args:
+        structure (list[Any]): The parsed BODYSTRUCTURE.
+        mime_type (str): The MIME type of the part, e.g. "text/html".
+        section (str, optional): The section of the structure. Defaults to "",
+            which is the whole message.
+
+    Returns:
+        Optional[tuple[str, str]]: The section specifier of the part, e.g. "1.2",
+            and its transfer encoding. `None` if the message has no such part.
+    """
+    if structure and isinstance(structure[0], list):
+        parts = [part for part in structure if isinstance(part, list)]
+        for number, part in enumerate(parts, 1):
+            found = find_part(part, mime_type, f"{section}.{number}".lstrip("."))
+            if found is not None:
+                return found
+        return None
+
+    if len(structure) < 6 or not structure[0] or not structure[1]:
+        return None
+
+    if f"{structure[0].decode()}/{structure[1].decode()}".lower() != mime_type:
+        return None
+
+    encoding = structure[5].decode().lower() if structure[5] else "7bit"
+    return section or "1", encoding
+
+
+def quote(value: str) -> str:
+    """Quote a string argument of a command.
+
+    Args:
+        value (str): The argument.
+
+    Returns:
+        str: The argument as an IMAP quoted string.
+    """
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class IMAPClient:
+    """asyncio IMAP client over a single connection.
+
+    Commands are serialized. A command issued while the connection idles ends the
+    IDLE first.
+
+    Args:
+        host (str): The host name of the mail server.
+        port (int, optional): The port of the mail server. Defaults to
+            `IMAP4_SSL_PORT`.
+        timeout (float, optional): Seconds to wait for a response to a command.
+            Defaults to 60.0.
+    """
+
+    def __init__(
+        self, host: str, port: int = IMAP4_SSL_PORT, timeout: float = 60.0
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.capabilities: set[str] = set()
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+        self._interrupt = asyncio.Event()
+        self._tag = 0
+
+    @property
+    def connected(self) -> bool:
+        """Whether the connection is open."""
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def connect(self) -> None:
+        """Open the connection and read the server greeting.
+
+        Raises:
+            IMAPError: Raised if the server refuses the connection.
+        """
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                self.host, self.port, ssl=ssl.create_default_context()
+            ),
+            self.timeout,
+        )
+        greeting = await asyncio.wait_for(self._read_response(), self.timeout)
+
+        if not greeting.line.startswith((b"* OK", b"* PREAUTH")):
+            await self.close()
+            raise IMAPError(f"server refused connection: {greeting.line!r}")
+
+    async def close(self) -> None:
+        """Close the connection without logging out."""
+        writer, self._reader, self._writer = self._writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (OSError, ssl.SSLError):
+                pass
+
+    async def _read_response(self, line: Optional[bytes] = None) -> Response:
+        assert self._reader is not None
+        if line is None:
+            line = await self._reader.readuntil(b"\r\n")
+
+        response = Response(b"")
+        while True:
+            line = line[:-2]
+            response.line += line
+            match = _LITERAL.search(line)
+            if match is None:
+                return response
+
+            response.literals.append(
+                await self._reader.readexactly(int(match.group(1)))
+            )
+            line = await self._reader.readuntil(b"\r\n")
+
+    def _send(self, line: str) -> None:
+        if not self.connected:
+            raise IMAPError("not connected")
+        assert self._writer is not None
+        self._writer.write(line.encode() + b"\r\n")
+
+    def _next_tag(self) -> bytes:
+        self._tag += 1
+        return b"D%04d" % self._tag
+
+    async def _complete(self, tag: bytes, command: str) -> list[Response]:
+        untagged: list[Response] = []
+
+        while True:
+            response = await self._read_response()
+            if not response.line.startswith(tag + b" "):
+                untagged.append(response)
+                continue
+
+            start = len(tag) + 1
+            status, _, text = response.line[start:].partition(b" ")
+            if status.upper() != b"OK":
+                raise IMAPError(f"{command} failed: {status.decode()} {text!r}")
+            return untagged
+
+    async def command(self, name: str, *args: str) -> list[Response]:
+        """Run a command.
+
+        Args:
+            name (str): The name of the command, e.g. "SELECT".
+            *args (str): The arguments of the command. Strings have to be quoted
+                with `quote`.
+
+        Returns:
+            list[Response]: The untagged responses sent before the command
+                completed.
+
+        Raises:
+            IMAPError: Raised if the command fails or times out. The connection is
+                closed if it times out, since its state is then unknown.
+        """
+        self._interrupt.set()
+        async with self._lock:
+            self._interrupt.clear()
+            tag = self._next_tag()
+            self._send(" ".join((tag.decode(), name, *args)))
+            try:
+                return await asyncio.wait_for(self._complete(tag, name), self.timeout)
+            except asyncio.TimeoutError as err:
+                await self.close()
+                raise IMAPError(f"{name} timed out") from err
+            except (asyncio.IncompleteReadError, ConnectionError) as err:
+                await self.close()
+                raise IMAPError(f"connection lost during {name}") from err
+
+    async def login(self, user: str, password: str) -> None:
+        """Authenticate and read the capabilities of the server.
+
+        Args:
+            user (str): The user name, usually the email address.
+            password (str): The password.
+        """
+        await self.command("LOGIN", quote(user), quote(password))
+        for response in await self.command("CAPABILITY"):
+            if response.line.upper().startswith(b"* CAPABILITY "):
+                self.capabilities = set(response.line.decode().upper().split()[2:])
+
+    async def select(self, mailbox: str = "INBOX") -> Optional[int]:
+        """Select a mailbox.
+
+        Args:
+            mailbox (str, optional): The name of the mailbox. Defaults to "INBOX".
+
+        Returns:
+            Optional[int]: The UIDVALIDITY of the mailbox. UIDs of its messages are
+                only comparable while it stays the same.
+        """
+        for response in await self.command("SELECT", quote(mailbox)):
+            match = _UIDVALIDITY.search(response.line)
+            if match is not None:
+                return int(match.group(1))
+        return None
+
+    async def uid_search(self, *criteria: str) -> list[int]:
+        """Search the selected mailbox.
+
+        Args:
+            *criteria (str): The search criteria, e.g. "UID", "13:*".
+
+        Returns:
+            list[int]: The UIDs of the matching messages, in ascending order.
+        """
+        uids: list[int] = []
+        for response in await self.command("UID SEARCH", *criteria):
+            if response.line.upper().startswith(b"* SEARCH"):
+                uids.extend(int(uid) for uid in response.line.split()[2:])
+        return sorted(uids)
+
+    async def uid_fetch(self, uids: str, items: str) -> dict[int, dict[str, Any]]:
+        """Fetch data items of messages.
+
+        Args:
+            uids (str): A UID set, e.g. "12" or "12,14".
+            items (str): The data items, e.g. "(BODY.PEEK[HEADER] BODYSTRUCTURE)".
+
+        Returns:
+            dict[int, dict[str, Any]]: The data items of each message, keyed by UID.
+                See `parse_fetch`.
+        """
+        messages: dict[int, dict[str, Any]] = {}
+        for response in await self.command("UID FETCH", uids, items):
+            fetched = parse_fetch(response)
+            if fetched is not None and fetched.get("UID") is not None:
+                messages[int(fetched["UID"])] = fetched
+        return messages
+
+    async def noop(self) -> list[Response]:
+        """Keep the connection alive and poll for changes to the mailbox.
+
+        Returns:
+            list[Response]: The untagged responses, e.g. `* 13 EXISTS`.
+        """
+        return await self.command("NOOP")
+
+    async def logout(self) -> None:
+        """Log out and close the connection."""
+        try:
+            if self.connected:
+                await self.command("LOGOUT")
+        except IMAPError:
+            pass
+        finally:
+            await self.close()
+
+    async def idle(self, timeout: float) -> list[Response]:
+        """Wait for the server to report changes to the selected mailbox.
+
+        IDLE ends when the server sends a response, when the timeout elapses, or when
+        another command is issued.
+
+        Args:
+            timeout (float): Seconds to idle for. RFC 2177 recommends restarting
+                IDLE at least every 29 minutes.
+
+        Returns:
+            list[Response]: The untagged responses sent while idling.
+
+        Raises:
+            IMAPError: Raised if the server doesn't support IDLE or the connection
+                is lost.
+        """
+        if "IDLE" not in self.capabilities:
+            raise IMAPError("server doesn't support IDLE")
+
+        async with self._lock:
+            assert self._reader is not None
+            tag = self._next_tag()
+            self._send(f"{tag.decode()} IDLE")
+            events: list[Response] = []
+
+            try:
+                while True:
+                    response = await asyncio.wait_for(
+                        self._read_response(), self.timeout
+                    )
+                    if response.line.startswith(b"+"):
+                        break
+                    if not response.untagged:
+                        raise IMAPError(f"IDLE failed: {response.line!r}")
+                    events.append(response)
+
+                events.extend(await self._wait_idle(timeout))
+                self._send("DONE")
+                events.extend(
+                    await asyncio.wait_for(self._complete(tag, "IDLE"), self.timeout)
+                )
+            except asyncio.TimeoutError as err:
+                await self.close()
+                raise IMAPError("IDLE timed out") from err
+            except (asyncio.IncompleteReadError, ConnectionError) as err:
+                await self.close()
+                raise IMAPError("connection lost during IDLE") from err
+            except asyncio.CancelledError:
+                # The server is still idling, so the connection can't be reused.
+                await self.close()
+                raise
+
+            return events
+
+    async def _wait_idle(self, timeout: float) -> list[Response]:
+        assert self._reader is not None
+        read = asyncio.ensure_future(self._reader.readuntil(b"\r\n"))
+        interrupt = asyncio.ensure_future(self._interrupt.wait())
+
+        try:
+            done, _ = await asyncio.wait(
+                (read, interrupt), timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            # Cancelling a pending read leaves the stream untouched. The read has to
+            # finish cancelling before the stream can be read again.
+            for pending in (read, interrupt):
+                if not pending.done():
+                    pending.cancel()
+                    with contextlib.suppress(asyncio.CancelledError):
+                        await pending
+
+        if read in done:
+            return [await self._read_response(read.result())]
+        return []
+
+
+class MailboxWatcher:
+    """Keeps an IMAP connection open and reports new messages in a mailbox.
+
+    The connection idles if the server supports IDLE and polls with NOOP otherwise.
+    Lost connections are reopened with exponential backoff.
+
+    Args:
+        connect (Callable[[], Awaitable[IMAPClient]]): Opens, authenticates, and
+            selects the mailbox on a new connection. The connection belongs to the
+            watcher, which closes it when it is lost or the watcher stops.
+        on_new_message (Callable[[], Awaitable[None]]): Called whenever the mailbox
+            reports new messages, and once after every (re)connect to catch up.
+        keepalive (float, optional): Seconds between restarting IDLE, or between
+            polls. Defaults to 600.
+        max_backoff (float, optional): Maximum seconds to wait before reconnecting.
+            Defaults to 300.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Awaitable[IMAPClient]],
+        on_new_message: Callable[[], Awaitable[None]],
+        keepalive: float = 600,
+        max_backoff: float = 300,
+    ) -> None:
+        self._connect = connect
+        self._on_new_message = on_new_message
+        self.keepalive = keepalive
+        self.max_backoff = max_backoff
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> None:
+        """Start watching in the background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop watching."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        backoff = 1.0
+
+        while True:
+            client: Optional[IMAPClient] = None
+            delay = backoff * (1 + random.random() / 2)
+            try:
+                client = await self._connect()
+                backoff = 1.0
+                await self._notify()
+                await self._watch(client)
+            except (IMAPError, OSError, asyncio.TimeoutError) as err:
+                logger.warning(
+                    f"IMAP connection lost ({err!r}), retrying in {delay:.0f}s"
+                )
+            except Exception:  # pylint: disable=W0703
+                # E.g. the database query of the connect callback failed. The
+                # watcher must outlive it.
+                logger.exception(f"mailbox watcher failed, retrying in {delay:.0f}s")
+            finally:
+                if client is not None:
+                    await client.close()
+
+            await asyncio.sleep(delay)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def _watch(self, client: IMAPClient) -> None:
+        while True:
+            if "IDLE" in client.capabilities:
+                events = await client.idle(self.keepalive)
+            else:
+                await asyncio.sleep(self.keepalive)
+                events = await client.noop()
+
+            if any(response.number(b"EXISTS") is not None for response in events):
+                await self._notify()
+
+    async def _notify(self) -> None:
+        try:
+            await self._on_new_message()
+        except IMAPError:
+            raise
+        except Exception:  # pylint: disable=W0703
+            logger.exception("failed to handle new messages")
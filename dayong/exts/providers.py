@@ -0,0 +1,203 @@
+"""
+dayong.exts.providers
+~~~~~~~~~~~~~~~~~~~~~
+
+Registry of third-party content providers, and the built-in providers.
+
+Other packages add providers through the `dayong.providers` entry point group, and
+the config file through import paths listed in `providers.extra`.
+"""
+import importlib
+from dataclasses import dataclass
+from importlib.metadata import entry_points
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Optional
+
+from loguru import logger
+
+from dayong.abc import ContentProvider, Database
+from dayong.core.configs import DayongConfig
+from dayong.exts.apis import DEVTO_URL, RESTClient
+from dayong.exts.emails import EmailClient
+from dayong.exts.imap import MailboxWatcher
+
+ENTRY_POINT_GROUP = "dayong.providers"
+
+# Provider classes by alias.
+PROVIDERS: dict[str, type[ContentProvider]] = {}
+
+
+@dataclass
+class ProviderContext:
+    """What providers are created with.
+
+    Args:
+        config (DayongConfig): An instance of `dayong.core.configs.DayongConfig`.
+        database (Database): The database shared with the bot's components.
+        api (RESTClient): The client for fetching content from web APIs.
+        notify (Callable[[str], Awaitable[None]]): Called with the alias of a
+            provider to deliver its content right away, e.g. when new content is
+            pushed to the provider.
+    """
+
+    config: DayongConfig
+    database: Database
+    api: RESTClient
+    notify: Callable[[str], Awaitable[None]]
+
+
+def register(provider: type[ContentProvider]) -> type[ContentProvider]:
+    """Register a provider class under its alias. Can be used as a decorator.
+
+    Args:
+        provider (type[ContentProvider]): The provider class.
+
+    Returns:
+        type[ContentProvider]: The provider class.
+    """
+    PROVIDERS[provider.alias] = provider
+    return provider
+
+
+def import_provider(path: str) -> type[ContentProvider]:
+    """Import a provider class.
+
+    Args:
+        path (str): The import path of the class, e.g. "package.module:Provider".
+
+    Raises:
+        TypeError: Raised if the object isn't a provider class.
+
+    Returns:
+        type[ContentProvider]: The provider class.
+    """
+    module_name, _, name = path.partition(":")
+    provider = getattr(importlib.import_module(module_name), name)
+
+    if not (isinstance(provider, type) and issubclass(provider, ContentProvider)):
+        raise TypeError(f"{path} is not a content provider")
+
+    return provider
+
+
+def load_providers(paths: Iterable[str] = ()) -> dict[str, type[ContentProvider]]:
+    """Register the providers of installed packages and the providers at the given
+    import paths. A provider that fails to load is skipped.
+
+    Args:
+        paths (Iterable[str], optional): Import paths of provider classes. Defaults
+            to ().
+
+    Returns:
+        dict[str, type[ContentProvider]]: Every registered provider class by alias.
+    """
+    points = entry_points()
+    # `EntryPoints.select` was added in Python 3.10.
+    if hasattr(points, "select"):
+        group = points.select(group=ENTRY_POINT_GROUP)  # type: ignore
+    else:
+        group = points.get(ENTRY_POINT_GROUP, ())
+
+    for point in group:
+        try:
+            register(point.load())
+        except Exception:  # pylint: disable=W0703
+            logger.exception(f"can't load content provider {point.name}")
+
+    for path in paths:
+        try:
+            register(import_provider(path))
+        except (ImportError, AttributeError, TypeError) as err:
+            logger.error(f"can't load content provider {path}: {err}")
+
+    return PROVIDERS
+
+
+@register
+class DevToProvider(ContentProvider):
+    """Articles from dev.to.
+
+    Args:
+        context (ProviderContext): What providers are created with.
+    """
+
+    alias = "dev"
+    url = DEVTO_URL
+
+    def __init__(self, context: ProviderContext) -> None:
+        self.context = context
+
+    async def fetch(self) -> Any:
+        options = self.context.config.providers
+        return await self.context.api.get_devto_article(
+            tags=options.tags, pages=options.pages, per_page=options.per_page
+        )
+
+    async def stream(self) -> AsyncIterator[str]:
+        options = self.context.config.providers
+        urls = self.context.api.devto_urls(
+            tags=options.tags, pages=options.pages, per_page=options.per_page
+        )
+        async for url in self.context.api.iter_paginated(urls, "canonical_url"):
+            yield url
+
+
+@register
+class MediumProvider(ContentProvider):
+    """Articles from the Medium Daily Digest sent to the bot's email address.
+
+    Args:
+        context (ProviderContext): What providers are created with.
+    """
+
+    alias = "medium"
+    url = "https://medium.com"
+    schedule = "0 12 * * *"
+
+    def __init__(self, context: ProviderContext) -> None:
+        self.context = context
+        self.email: Optional[EmailClient] = None
+        self.watcher: Optional[MailboxWatcher] = None
+
+    async def open(self) -> None:
+        config = self.context.config
+
+        if config.email is None or config.email_password is None:
+            self.unavailable = (
+                "Can't retrieve content on email subscription. To do so, please "
+                "provide your email credentials and redeploy the bot."
+            )
+            logger.info(self.unavailable)
+            return
+
+        self.email = EmailClient(
+            config.imap_domain_name,
+            config.email,
+            config.email_password,
+            self.context.database,
+        )
+        # Deliver a new digest as soon as it arrives. The scheduled job remains as a
+        # fallback.
+        self.watcher = self.email.watch(self.on_new_message)
+
+    async def on_new_message(self) -> None:
+        """Deliver the new digest."""
+        await self.context.notify(self.alias)
+
+    async def close(self) -> None:
+        if self.watcher is not None:
+            await self.watcher.stop()
+            self.watcher = None
+
+        if self.email is not None:
+            await self.email.close()
+            self.email = None
+
+    async def fetch(self) -> Any:
+        if self.email is None:
+            raise RuntimeError("the provider isn't open")
+
+        return await self.email.get_medium_daily_digest()
+
+    async def commit(self) -> None:
+        if self.email is not None:
+            await self.email.commit()
@@ -0,0 +1,195 @@
+"""
+dayong.greetings
+~~~~~~~~~~~~~~~~
+
+Greeting messages for new guild members. The embed template is compiled once and
+joins that land close together are welcomed in a single message.
+"""
+import asyncio
+from dataclasses import dataclass
+from itertools import groupby
+from string import Formatter
+from typing import Any, Awaitable, Callable, Hashable, Optional, Sequence, Union
+
+import hikari
+from loguru import logger
+
+# Positions of the arguments of the greeting description. See `config.json`.
+GUILD_NAME, MEMBER_ID, README_CHANNEL_ID = range(3)
+MENTION_PREFIXES = ("<@!", "<@")
+
+
+@dataclass(frozen=True)
+class GreetingTemplate:
+    """Precompiled greeting embed.
+
+    The description is split into literal text and the slots for the guild name and
+    the new members, so rendering it is a join.
+    """
+
+    description: tuple[Union[str, int], ...]
+    color: Any
+    fields: tuple[tuple[str, str], ...]
+    mention_members: bool = True
+
+    @classmethod
+    def compile(cls, embeddings: dict[str, Any]) -> "GreetingTemplate":
+        """Compile the `new_member_greetings` embed from the config file.
+
+        Args:
+            embeddings (dict[str, Any]): The `new_member_greetings` embed settings.
+
+        Returns:
+            GreetingTemplate: The compiled template.
+        """
+        tokens: list[Union[str, int]] = []
+        mention_members = closing_mention = False
+        position = 0
+
+        for literal, field, _, _ in Formatter().parse(embeddings["description"]):
+            if closing_mention and literal.startswith(">"):
+                literal = literal[1:]
+            closing_mention = False
+
+            if field is None:
+                tokens.append(literal)
+                continue
+
+            slot = int(field) if field else position
+            position += 1
+
+            if slot == README_CHANNEL_ID:
+                tokens.extend((literal, str(embeddings["readme_channel_id"])))
+                continue
+
+            # The member slot is usually wrapped in a mention, e.g. "<@!{}>". Take
+            # the wrapper out so every member of a batch gets their own mention.
+            if slot == MEMBER_ID:
+                prefix = next(
+                    (prefix for prefix in MENTION_PREFIXES if literal.endswith(prefix)),
+                    "",
+                )
+                if prefix:
+                    literal = literal[: -len(prefix)]
+                    mention_members = closing_mention = True
+
+            tokens.extend((literal, slot))
+
+        # Merge adjacent literals.
+        description: list[Union[str, int]] = []
+        for is_literal, group in groupby(
+            tokens, key=lambda token: isinstance(token, str)
+        ):
+            if is_literal:
+                description.append("".join(map(str, group)))
+            else:
+                description.extend(group)
+
+        fields = embeddings.get("greetings_field", {})
+        if isinstance(fields, dict):
+            fields = fields.values()
+
+        return cls(
+            description=tuple(description),
+            color=embeddings["color"],
+            fields=tuple((field["name"], field["value"]) for field in fields),
+            mention_members=mention_members,
+        )
+
+    def render(self, guild_name: str, member_ids: Sequence[int]) -> hikari.Embed:
+        """Build the greeting embed for one or more new members.
+
+        Args:
+            guild_name (str): The name of the guild.
+            member_ids (Sequence[int]): The IDs of the new members.
+
+        Returns:
+            hikari.Embed: The greeting embed.
+        """
+        members = (
+            ", ".join(f"<@!{member_id}>" for member_id in member_ids)
+            if self.mention_members
+            else ", ".join(str(member_id) for member_id in member_ids)
+        )
+        slots = {GUILD_NAME: guild_name, MEMBER_ID: members}
+        embed = hikari.Embed(
+            description="".join(
+                part if isinstance(part, str) else slots[part]
+                for part in self.description
+            ),
+            color=self.color,
+        )
+
+        for name, value in self.fields:
+            embed.add_field(name=name, value=value, inline=True)
+
+        return embed
+
+
+class GreetingCoalescer:
+    """Group members who join within a short window, so they are welcomed in one
+    message instead of one message each.
+    """
+
+    def __init__(self, window: float, max_batch_size: int) -> None:
+        self.window = window
+        self.max_batch_size = max(max_batch_size, 1)
+        self._batches: dict[Hashable, list[int]] = {}
+        self._senders: dict[Hashable, Callable[[list[int]], Awaitable[None]]] = {}
+        self._timers: dict[Hashable, asyncio.TimerHandle] = {}
+        self._sending: set["asyncio.Task[None]"] = set()
+
+    def add(
+        self,
+        key: Hashable,
+        member_id: int,
+        send: Callable[[list[int]], Awaitable[None]],
+    ) -> None:
+        """Queue a new member to be greeted.
+
+        Args:
+            key (Hashable): Identifies the batch, e.g. the ID of the welcome channel.
+            member_id (int): The ID of the new member.
+            send (Callable[[list[int]], Awaitable[None]]): Sends the greeting for a
+                batch of member IDs. The callable of the first member in a batch is
+                the one used.
+        """
+        batch = self._batches.setdefault(key, [])
+        batch.append(member_id)
+        self._senders.setdefault(key, send)
+
+        if len(batch) >= self.max_batch_size:
+            self._flush(key)
+        elif key not in self._timers:
+            loop = asyncio.get_running_loop()
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+
+    async def close(self) -> None:
+        """Send every pending greeting and wait for them to be sent."""
+        for key in list(self._batches):
+            self._flush(key)
+
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+
+    def _flush(self, key: Hashable) -> None:
+        timer: Optional[asyncio.TimerHandle] = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        batch = self._batches.pop(key, [])
+        send = self._senders.pop(key, None)
+
+        if not batch or send is None:
+            return
+
+        task = asyncio.get_running_loop().create_task(self._send(send, batch))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    @staticmethod
+    async def _send(send: Callable[[list[int]], Awaitable[None]], batch: list[int]):
+        try:
+            await send(batch)
+        except Exception:  # pylint: disable=W0703
+            logger.exception(f"failed to greet {len(batch)} new members")
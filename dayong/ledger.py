@@ -0,0 +1,189 @@
+"""
+dayong.ledger
+~~~~~~~~~~~~~
+
+Record of the content delivered to each channel, so that content isn't delivered to
+the same channel twice.
+"""
+import hashlib
+from datetime import datetime, timedelta
+from typing import AsyncIterable, AsyncIterator, Iterable, Sequence
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from loguru import logger
+
+from dayong.abc import Database
+from dayong.models import DeliveredContent
+
+# Query parameters that only track where a visitor came from, besides `utm_*`.
+# Medium adds `source` and `sk` to the links in its digests.
+TRACKING_PARAMS = frozenset(("fbclid", "gclid", "mc_cid", "mc_eid", "source", "sk"))
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """Normalize a URL so that links to the same content compare equal.
+
+    The scheme and host are lowercased, default ports and fragments are removed, and
+    tracking parameters are dropped from the query, which is sorted.
+
+    Args:
+        url (str): The URL to normalize.
+
+    Returns:
+        str: The normalized URL.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port is not None and DEFAULT_PORTS.get(scheme) != port:
+        host = f"{host}:{port}"
+
+    query = urlencode(
+        sorted(
+            (name, value)
+            for name, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not name.lower().startswith("utm_")
+            and name.lower() not in TRACKING_PARAMS
+        )
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def content_key(channel_id: int, url: str) -> int:
+    """Compute the ledger key of content delivered to a channel.
+
+    Args:
+        channel_id (int): The ID of the channel.
+        url (str): The URL of the content.
+
+    Returns:
+        int: A signed 64-bit hash of the channel ID and the normalized URL.
+    """
+    digest = hashlib.blake2b(
+        f"{channel_id}\n{normalize_url(url)}".encode(), digest_size=8
+    ).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+class DeliveryLedger:
+    """In-memory index of delivered content, backed by the `deliveredcontent`
+    table.
+
+    Checks are answered from memory in O(1). Entries older than the retention period
+    are removed from memory and the database, so the content may be delivered again.
+
+    Args:
+        database (Database): The database that stores the ledger.
+        retention (float, optional): Days to remember delivered content for.
+            Defaults to 30.
+    """
+
+    def __init__(self, database: Database, retention: float = 30) -> None:
+        self.database = database
+        self.retention = timedelta(days=retention)
+        # Maps keys to the UNIX timestamp of their delivery.
+        self._delivered: dict[int, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._delivered)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._delivered
+
+    async def load(self) -> None:
+        """Load the ledger from the database and remove expired entries."""
+        self._delivered = {
+            row.key: row.delivered_at.timestamp()
+            async for row in self.database.iter_rows(DeliveredContent)
+        }
+        await self.prune()
+        logger.info(f"loaded {len(self)} delivered content entries")
+
+    async def prune(self) -> int:
+        """Remove entries older than the retention period.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        cutoff = (datetime.utcnow() - self.retention).timestamp()
+        expired = [key for key, ts in self._delivered.items() if ts < cutoff]
+
+        if expired:
+            await self.database.remove_rows(DeliveredContent, "key", expired)
+            for key in expired:
+                del self._delivered[key]
+
+        return len(expired)
+
+    def undelivered(self, channel_id: int, urls: Iterable[str]) -> list[str]:
+        """Filter out content that has been delivered to a channel.
+
+        Args:
+            channel_id (int): The ID of the channel.
+            urls (Iterable[str]): The URLs of the content.
+
+        Returns:
+            list[str]: The URLs that haven't been delivered, without duplicates, in
+                order.
+        """
+        pending: dict[int, str] = {}
+        for url in urls:
+            key = content_key(channel_id, url)
+            if key not in self._delivered and key not in pending:
+                pending[key] = url
+        return list(pending.values())
+
+    async def filter(
+        self, channel_id: int, urls: AsyncIterable[str]
+    ) -> AsyncIterator[str]:
+        """Filter out content that has been delivered to a channel as it arrives.
+
+        Args:
+            channel_id (int): The ID of the channel.
+            urls (AsyncIterable[str]): The URLs of the content.
+
+        Yields:
+            AsyncIterator[str]: The URLs that haven't been delivered, without
+                duplicates, in order.
+        """
+        # Only the keys of the URLs seen so far are kept, not the URLs.
+        seen: set[int] = set()
+        async for url in urls:
+            key = content_key(channel_id, url)
+            if key not in self._delivered and key not in seen:
+                seen.add(key)
+                yield url
+
+    async def record(self, channel_id: int, urls: Sequence[str]) -> None:
+        """Record content as delivered to a channel.
+
+        Args:
+            channel_id (int): The ID of the channel.
+            urls (Sequence[str]): The URLs of the delivered content.
+        """
+        now = datetime.utcnow()
+        keys = {content_key(channel_id, url) for url in urls} - self._delivered.keys()
+
+        if not keys:
+            return
+
+        # Claim the keys before the insert so that concurrent deliveries don't
+        # insert them twice.
+        for key in keys:
+            self._delivered[key] = now.timestamp()
+
+        try:
+            await self.database.add_rows(
+                [DeliveredContent(key=key, delivered_at=now) for key in keys]
+            )
+        except Exception:
+            for key in keys:
+                del self._delivered[key]
+            raise
@@ -5,15 +5,25 @@ dayong.models
 A model maps to a single database table. It contains fields and behaviors of the data
 stored in the database.
 """
+from datetime import datetime
 from typing import Optional
 
+from sqlalchemy import BigInteger, Column, Index
 from sqlmodel import Field, SQLModel
 
+# Increment whenever a table model changes and add the statements that upgrade
+# existing databases to `dayong.schema.MIGRATIONS`.
+SCHEMA_VERSION = 8
+
+
+# SQLModel indexes every column unless told otherwise, so `index=False` is set
+# explicitly on columns that are never filtered on.
+
 
 class Message(SQLModel):
     """Base model class for message table models."""
 
-    id: Optional[int] = Field(default=None, primary_key=True)
+    id: Optional[int] = Field(default=None, primary_key=True, index=False)
 
 
 class AnonMessage(Message, table=True):
@@ -22,17 +32,76 @@ class AnonMessage(Message, table=True):
     # pyright cannot recognize the type of SQLModel.__tablename__
     # See: https://github.com/tiangolo/sqlmodel/issues/98
     __tablename__ = "anon_messages"  # type: ignore
-    message_id: str
-    user_id: str
-    username: str
-    nickname: str
-    message: str
+    message_id: str = Field(index=True, sa_column_kwargs={"unique": True})
+    user_id: str = Field(index=False)
+    username: str = Field(index=False)
+    nickname: str = Field(index=False)
+    message: str = Field(index=False)
 
 
 class ScheduledTask(SQLModel, table=True):
     """Table model for scheduled tasks."""
 
-    id: Optional[int] = Field(default=None, primary_key=True)
-    channel_name: str
-    task_name: str
-    run: Optional[bool] = Field(default=True)
+    # A task subscribes a channel to a content provider, and a provider may have
+    # subscribers in any number of channels and guilds. The index also covers lookups
+    # by `task_name` alone since it is the leading column.
+    __table_args__ = (
+        Index(
+            "ix_scheduledtask_task_name_channel_id",
+            "task_name",
+            "channel_id",
+            unique=True,
+        ),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True, index=False)
+    guild_id: Optional[str] = Field(default=None, index=False)
+    channel_id: Optional[str] = Field(default=None, index=False)
+    channel_name: str = Field(index=False)
+    task_name: str = Field(index=False)
+    run: Optional[bool] = Field(default=True, index=False)
+    # One of `dayong.delivery.DeliveryMode`.
+    delivery: str = Field(default="digest", index=False)
+
+
+class DeliveredContent(SQLModel, table=True):
+    """Table model for content that has been delivered to a channel."""
+
+    # A 64-bit hash of the channel ID and the normalized URL of the content. See
+    # `dayong.ledger.content_key`.
+    key: int = Field(
+        sa_column=Column(BigInteger, primary_key=True, autoincrement=False)
+    )
+    delivered_at: datetime = Field(default_factory=datetime.utcnow, index=False)
+
+
+class MailboxState(SQLModel, table=True):
+    """Table model for the messages of a mailbox that have been processed."""
+
+    # The user and mailbox name, e.g. "user@example.com/INBOX".
+    mailbox: str = Field(primary_key=True, index=False)
+    uid_validity: int = Field(sa_column=Column(BigInteger, nullable=False))
+    # Messages with a greater UID haven't been processed.
+    last_uid: int = Field(sa_column=Column(BigInteger, nullable=False))
+
+
+class JobSchedule(SQLModel, table=True):
+    """Table model for the schedules of background jobs."""
+
+    name: str = Field(primary_key=True, index=False)
+    # A crontab expression, e.g. "0 0 * * *".
+    cron: str = Field(index=False)
+    # Times are in UTC.
+    next_run_at: datetime = Field(index=False)
+    last_run_at: Optional[datetime] = Field(default=None, index=False)
+
+
+class SchemaVersion(SQLModel, table=True):
+    """Table model for the schema versions applied to the database."""
+
+    __tablename__ = "schema_version"  # type: ignore
+    version: int = Field(
+        primary_key=True, index=False, sa_column_kwargs={"autoincrement": False}
+    )
+    checksum: str = Field(index=False)
+    applied_at: datetime = Field(default_factory=datetime.utcnow, index=False)
@@ -4,25 +4,266 @@ dayong.operations
 
 Data model operations which include retrieval and update commands.
 """
-from typing import Any
+import asyncio
+import time
+from contextlib import asynccontextmanager, suppress
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, ClassVar, Optional, Sequence
 
 import tanjun
+from loguru import logger
+from sqlalchemy import and_, delete, exists, func, insert, text, true, tuple_
+from sqlalchemy import update as sa_update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.engine.result import IteratorResult, SimpleResultMetaData
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlmodel import SQLModel, select
 from sqlmodel.engine.result import ScalarResult
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from dayong.abc import Database
-from dayong.core.configs import DayongConfig, DayongDynamicLoader
+from dayong.core.configs import DatabaseOptions, DayongConfig, DayongDynamicLoader
+from dayong.models import AnonMessage
+from dayong.schema import ensure_schema
+from dayong.utils import chunked
+
+# Table models whose rows are never modified after being added, and can therefore be
+# inserted in batches when write-behind is enabled.
+WRITE_BEHIND_MODELS: tuple[type[SQLModel], ...] = (AnonMessage,)
+
+
+def scalar_result(rows: Sequence[Any]) -> ScalarResult[Any]:
+    """Wrap rows that are already in memory in a `ScalarResult`.
+
+    Args:
+        rows (Sequence[Any]): Table model instances.
+
+    Returns:
+        ScalarResult[Any]: A `ScalarResult` that yields the specified rows.
+    """
+    result = IteratorResult(
+        SimpleResultMetaData(["row"]), iter([(row,) for row in rows])
+    )
+    return result.scalars()  # type: ignore
+
+
+@dataclass
+class PoolStats:
+    """Snapshot of the connection pool shared by every `DatabaseImpl` in the
+    process.
+    """
+
+    size: int = 0
+    checked_out: int = 0
+    idle: int = 0
+    overflow: int = 0
+    acquired: int = 0
+    wait_time: float = 0.0
+    max_wait_time: float = 0.0
+
+    @property
+    def avg_wait_time(self) -> float:
+        """Average time, in seconds, spent waiting for a pooled connection."""
+        return self.wait_time / self.acquired if self.acquired else 0.0
+
+
+class WriteBehindQueue:
+    """Buffer rows of a table model and insert them in batches, either when the
+    buffer is full or when the flush interval elapses.
+
+    Rows stay in the buffer until their batch is committed, so they can still be
+    looked up in the meantime.
+    """
+
+    def __init__(
+        self,
+        insert_rows: Callable[[list[SQLModel]], Awaitable[None]],
+        batch_size: int,
+        interval: float,
+    ) -> None:
+        self._insert_rows = insert_rows
+        self._batch_size = max(batch_size, 1)
+        self._interval = interval
+        self._rows: list[SQLModel] = []
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def start(self) -> None:
+        """Start flushing the buffer in the background."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def put(self, row: SQLModel) -> None:
+        """Add a row to the buffer.
+
+        Args:
+            row (SQLModel): An instance of a table model.
+        """
+        self._rows.append(row)
+        if len(self._rows) >= self._batch_size:
+            self._full.set()
+
+    def find_all(self) -> list[SQLModel]:
+        """Get every row that hasn't been inserted yet.
+
+        Returns:
+            list[SQLModel]: The buffered rows, oldest first.
+        """
+        return list(self._rows)
+
+    def find(self, attribute: str, value: Any) -> list[SQLModel]:
+        """Search the buffer for rows that haven't been inserted yet.
+
+        Args:
+            attribute (str): A Table model attribute.
+            value (Any): The value of the attribute to match.
+
+        Returns:
+            list[SQLModel]: The matching rows.
+        """
+        return [row for row in self._rows if getattr(row, attribute) == value]
+
+    async def flush(self) -> None:
+        """Insert every buffered row. A batch that fails is kept and retried on the
+        next flush, unless it violates a constraint, in which case its rows are
+        inserted one by one and the rows that still fail are dropped.
+        """
+        async with self._flush_lock:
+            while self._rows:
+                batch = self._rows[: self._batch_size]
+                try:
+                    await self._insert_rows(batch)
+                except IntegrityError:
+                    await self._insert_each(batch)
+                    continue
+
+                # New rows are only ever appended, so the committed batch is still at
+                # the front of the buffer.
+                del self._rows[: len(batch)]
+
+    async def _insert_each(self, batch: list[SQLModel]) -> None:
+        # A row that violates a constraint would fail every retry and hold up the
+        # rows behind it.
+        for row in batch:
+            try:
+                await self._insert_rows([row])
+            except IntegrityError as err:
+                logger.error(
+                    f"dropped write-behind {type(row).__name__} row: {err.orig}"
+                )
+
+            del self._rows[0]
+
+    async def close(self) -> None:
+        """Stop the background task and insert what is left in the buffer."""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._full.wait(), self._interval)
+
+            self._full.clear()
+
+            try:
+                await self.flush()
+            except Exception as err:  # pylint: disable=W0703
+                logger.error(f"write-behind flush of {len(self)} rows failed: {err}")
 
 
 class DatabaseImpl(Database):
     """Implementaion of a database connection for transacting and interacting with
     database tables —those that derive from SQLModel.
+
+    The engine and its connection pool are created once per process and database
+    URI, so every instance of this class shares the same warm connections. The
+    engine is disposed when the last instance holding it disconnects.
     """
 
+    _engines: ClassVar[dict[str, AsyncEngine]] = {}
+    _engine_lock: ClassVar[asyncio.Lock]
+    _bootstrapped: ClassVar[set[AsyncEngine]] = set()
+    # The number of connected instances holding each engine.
+    _holders: ClassVar[dict[AsyncEngine, int]] = {}
     _conn: AsyncEngine
 
+    def __init__(self) -> None:
+        self._wait_stats = PoolStats()
+        self._chunk_size = DatabaseOptions().bulk_chunk_size
+        self._write_behind: dict[type[SQLModel], WriteBehindQueue] = {}
+
+    @property
+    def pool_stats(self) -> PoolStats:
+        """Current state of the connection pool along with the time spent waiting
+        for connections to be checked out.
+
+        Returns:
+            PoolStats: A snapshot of the connection pool.
+        """
+        stats = PoolStats(
+            acquired=self._wait_stats.acquired,
+            wait_time=self._wait_stats.wait_time,
+            max_wait_time=self._wait_stats.max_wait_time,
+        )
+
+        if not hasattr(self, "_conn"):
+            return stats
+
+        pool = self._conn.sync_engine.pool
+        # Not every pool implementation keeps track of its connections (e.g. the
+        # `NullPool` used by SQLite), hence the attribute checks.
+        for attr, method in (
+            ("size", "size"),
+            ("checked_out", "checkedout"),
+            ("idle", "checkedin"),
+            ("overflow", "overflow"),
+        ):
+            if hasattr(pool, method):
+                setattr(stats, attr, getattr(pool, method)())
+
+        return stats
+
+    @staticmethod
+    def _create_engine(database_uri: str, options: DatabaseOptions) -> AsyncEngine:
+        """Create an async engine and its connection pool.
+
+        Args:
+            database_uri (str): The URI of the database.
+            options (DatabaseOptions): Connection pool options.
+
+        Returns:
+            AsyncEngine: The engine which owns the connection pool.
+        """
+        url = make_url(database_uri)
+        kwargs: dict[str, Any] = {"pool_pre_ping": options.pool_pre_ping}
+
+        if url.get_backend_name() != "sqlite":
+            kwargs |= {
+                "pool_size": options.pool_size,
+                "max_overflow": options.max_overflow,
+                "pool_recycle": options.pool_recycle,
+                "pool_timeout": options.pool_timeout,
+            }
+
+        if url.get_driver_name() == "asyncpg":
+            url = url.update_query_dict(
+                {"prepared_statement_cache_size": str(options.statement_cache_size)}
+            )
+
+        return create_async_engine(url, **kwargs)
+
     @staticmethod
     async def update(instance: Any, update: Any) -> Any:
         """Overwrite value of class attribute.
@@ -38,27 +279,184 @@ class DatabaseImpl(Database):
             setattr(instance, key, value)
         return instance
 
+    @asynccontextmanager
+    async def _session(self) -> AsyncIterator[AsyncSession]:
+        """Check out a pooled connection and bind a session to it.
+
+        Yields:
+            AsyncSession: A session bound to the checked out connection.
+        """
+        started = time.perf_counter()
+        async with self._conn.connect() as conn:
+            waited = time.perf_counter() - started
+            self._wait_stats.acquired += 1
+            self._wait_stats.wait_time += waited
+            self._wait_stats.max_wait_time = max(self._wait_stats.max_wait_time, waited)
+
+            # Rows are handed back to callers after the session closes, so they must
+            # not be expired on commit.
+            async with AsyncSession(conn, expire_on_commit=False) as session:
+                yield session
+
+    async def _warm_pool(self, connections: int) -> None:
+        """Open connections ahead of time so the first requests don't pay for the
+        connection handshake.
+
+        Args:
+            connections (int): The number of connections to open.
+        """
+
+        async def ping() -> None:
+            async with self._conn.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+
+        await asyncio.gather(*(ping() for _ in range(max(connections, 1))))
+
     async def connect(
         self, config: DayongConfig = tanjun.injected(type=DayongConfig)
     ) -> None:
-        self._conn = create_async_engine(
-            config.database_uri
-            if config.database_uri
-            else DayongDynamicLoader().load().database_uri
-        )
+        if not config.database_uri:
+            config = DayongDynamicLoader().load()
+
+        if not hasattr(DatabaseImpl, "_engine_lock"):
+            DatabaseImpl._engine_lock = asyncio.Lock()
+
+        async with DatabaseImpl._engine_lock:
+            created = config.database_uri not in self._engines
+
+            if created:
+                self._engines[config.database_uri] = self._create_engine(
+                    config.database_uri, config.database
+                )
+
+            engine = self._engines[config.database_uri]
+            if getattr(self, "_conn", None) is not engine:
+                self._holders[engine] = self._holders.get(engine, 0) + 1
+            self._conn = engine
+            self._chunk_size = config.database.bulk_chunk_size
+
+            if created:
+                await self._warm_pool(config.database.pool_size)
+
+        await self.create_table()
+
+        if config.database.write_behind and not self._write_behind:
+            for model in WRITE_BEHIND_MODELS:
+                queue = WriteBehindQueue(
+                    self._insert_rows,
+                    config.database.write_behind_batch_size,
+                    config.database.write_behind_interval,
+                )
+                queue.start()
+                self._write_behind[model] = queue
+
+    async def disconnect(self) -> None:
+        if not hasattr(self, "_conn"):
+            return
+
+        # Rows that are still buffered must make it to the database before the pool
+        # is closed.
+        try:
+            for model, queue in self._write_behind.items():
+                try:
+                    await queue.close()
+                except Exception:  # pylint: disable=W0703
+                    logger.exception(
+                        f"lost {len(queue)} buffered {model.__name__} rows on "
+                        "disconnect"
+                    )
+        finally:
+            self._write_behind.clear()
+            await self._release()
+
+    async def _release(self) -> None:
+        """Stop holding the shared engine, and dispose it if no other instance holds
+        it.
+        """
+        engine = self._conn
+        del self._conn
+
+        async with DatabaseImpl._engine_lock:
+            self._holders[engine] = self._holders.get(engine, 1) - 1
+            if self._holders[engine] > 0:
+                return
+
+            del self._holders[engine]
+            for uri, shared in list(self._engines.items()):
+                if shared is engine:
+                    del self._engines[uri]
+
+            self._bootstrapped.discard(engine)
+            await engine.dispose()
 
     async def create_table(self) -> None:
-        async with self._conn.begin() as conn:
-            await conn.run_sync(SQLModel.metadata.create_all)
+        # The schema is bootstrapped once per engine, every call after that is a
+        # set lookup.
+        if self._conn in self._bootstrapped:
+            return
+
+        async with DatabaseImpl._engine_lock:
+            if self._conn in self._bootstrapped:
+                return
+
+            async with self._conn.begin() as conn:
+                await conn.run_sync(ensure_schema)
+
+            self._bootstrapped.add(self._conn)
+
+    @staticmethod
+    def _row_values(table_model: SQLModel) -> dict[str, Any]:
+        """Get the column values of a row, leaving out a primary key that has yet to
+        be generated.
+
+        Args:
+            table_model (SQLModel): A subclass of SQLModel.
+
+        Returns:
+            dict[str, Any]: The column values keyed by column name.
+        """
+        return {
+            column.name: getattr(table_model, column.name)
+            for column in table_model.__table__.columns  # type: ignore
+            if not (column.primary_key and getattr(table_model, column.name) is None)
+        }
+
+    async def _insert_rows(self, rows: list[SQLModel]) -> None:
+        """Insert rows of the same table model with a single multi-row statement.
+
+        Args:
+            rows (list[SQLModel]): Instances of a table model.
+        """
+        table = type(rows[0]).__table__  # type: ignore
+        values = [self._row_values(row) for row in rows]
+
+        async with self._session() as session:
+            await session.execute(insert(table).values(values))
+            await session.commit()
+
+    async def _flush_pending(self, model: type[SQLModel]) -> None:
+        """Insert buffered rows of a table model before it is read in bulk or
+        modified.
+
+        Args:
+            model (type[SQLModel]): Type of the table model.
+        """
+        if model in self._write_behind:
+            await self._write_behind[model].flush()
 
     async def add_row(self, table_model: SQLModel) -> None:
-        async with AsyncSession(self._conn) as session:
+        if type(table_model) in self._write_behind:
+            await self._write_behind[type(table_model)].put(table_model)
+            return
+
+        async with self._session() as session:
             session.add(table_model)
             await session.commit()
 
     async def remove_row(self, table_model: SQLModel, attribute: str) -> None:
         model = type(table_model)
-        async with AsyncSession(self._conn) as session:
+        await self._flush_pending(model)
+        async with self._session() as session:
             # Temp ignore incompatible type passed to `exec()`. See:
             # https://github.com/tiangolo/sqlmodel/issues/54
             # https://github.com/tiangolo/sqlmodel/pull/58
@@ -72,7 +470,15 @@ class DatabaseImpl(Database):
 
     async def get_row(self, table_model: SQLModel, attribute: str) -> ScalarResult[Any]:
         model = type(table_model)
-        async with AsyncSession(self._conn) as session:
+
+        if model in self._write_behind:
+            pending = self._write_behind[model].find(
+                attribute, getattr(table_model, attribute)
+            )
+            if pending:
+                return scalar_result(pending)
+
+        async with self._session() as session:
             # Temp ignore incompatible type passed to `exec()`. See:
             # https://github.com/tiangolo/sqlmodel/issues/54
             # https://github.com/tiangolo/sqlmodel/pull/58
@@ -84,14 +490,17 @@ class DatabaseImpl(Database):
         return row
 
     async def get_all_row(self, table_model: type[SQLModel]) -> ScalarResult[Any]:
-        async with AsyncSession(self._conn) as session:
-            return await session.exec(select(table_model))  # type: ignore
+        await self._flush_pending(table_model)
+        async with self._session() as session:
+            rows = (await session.exec(select(table_model))).all()  # type: ignore
+        return scalar_result(rows)
 
     async def update_row(self, table_model: SQLModel, attribute: str) -> None:
         model = type(table_model)
         table = table_model.__dict__
+        await self._flush_pending(model)
 
-        async with AsyncSession(self._conn) as session:
+        async with self._session() as session:
             row: ScalarResult[Any] = await session.exec(
                 select(model).where(
                     getattr(model, attribute) == getattr(table_model, attribute)
@@ -102,3 +511,210 @@ class DatabaseImpl(Database):
             session.add(task)
             await session.commit()
             await session.refresh(task)
+
+    async def upsert_row(
+        self,
+        table_model: SQLModel,
+        index_elements: Sequence[str],
+        only_if: Optional[dict[str, Any]] = None,
+    ) -> Optional[Any]:
+        model = type(table_model)
+        table = model.__table__  # type: ignore
+        values = self._row_values(table_model)
+        stmt = pg_insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(index_elements),
+            set_={
+                key: stmt.excluded[key] for key in values if key not in index_elements
+            },
+            where=and_(*(table.c[key] == value for key, value in only_if.items()))
+            if only_if
+            else None,
+        ).returning(*table.c)
+
+        await self._flush_pending(model)
+        async with self._session() as session:
+            row = (await session.execute(stmt)).first()
+            await session.commit()
+
+        return model(**row._mapping) if row is not None else None
+
+    async def update_returning(
+        self,
+        table_model: type[SQLModel],
+        values: dict[str, Any],
+        where: dict[str, Any],
+    ) -> list[Any]:
+        table = table_model.__table__  # type: ignore
+        stmt = (
+            sa_update(table)
+            .where(and_(*(table.c[key] == value for key, value in where.items())))
+            .values(**values)
+            .returning(*table.c)
+        )
+
+        await self._flush_pending(table_model)
+        async with self._session() as session:
+            rows = (await session.execute(stmt)).all()
+            await session.commit()
+
+        return [table_model(**row._mapping) for row in rows]
+
+    async def add_rows(self, table_models: Sequence[SQLModel]) -> None:
+        if not table_models:
+            return
+
+        table = type(table_models[0]).__table__  # type: ignore
+
+        async with self._session() as session:
+            for chunk in chunked(table_models, self._chunk_size):
+                await session.execute(
+                    insert(table), [self._row_values(row) for row in chunk]
+                )
+            await session.commit()
+
+    async def get_rows_in(
+        self, table_model: type[SQLModel], attribute: str, values: Sequence[Any]
+    ) -> ScalarResult[Any]:
+        rows: list[Any] = []
+        column = getattr(table_model, attribute)
+
+        if table_model in self._write_behind:
+            keys = set(values)
+            rows.extend(
+                row
+                for row in self._write_behind[table_model].find_all()
+                if getattr(row, attribute) in keys
+            )
+
+        async with self._session() as session:
+            for chunk in chunked(values, self._chunk_size):
+                result = await session.exec(
+                    select(table_model).where(column.in_(chunk))  # type: ignore
+                )
+                rows.extend(result.all())
+
+        return scalar_result(rows)
+
+    async def remove_rows(
+        self, table_model: type[SQLModel], attribute: str, values: Sequence[Any]
+    ) -> int:
+        table = table_model.__table__  # type: ignore
+        removed = 0
+
+        await self._flush_pending(table_model)
+        async with self._session() as session:
+            for chunk in chunked(values, self._chunk_size):
+                result = await session.execute(
+                    delete(table).where(table.c[attribute].in_(chunk))
+                )
+                removed += result.rowcount
+            await session.commit()
+
+        return removed
+
+    async def update_rows(
+        self,
+        table_model: type[SQLModel],
+        attribute: str,
+        values: Sequence[Any],
+        update: dict[str, Any],
+    ) -> int:
+        table = table_model.__table__  # type: ignore
+        updated = 0
+
+        await self._flush_pending(table_model)
+        async with self._session() as session:
+            for chunk in chunked(values, self._chunk_size):
+                result = await session.execute(
+                    sa_update(table)
+                    .where(table.c[attribute].in_(chunk))
+                    .values(**update)
+                )
+                updated += result.rowcount
+            await session.commit()
+
+        return updated
+
+    @staticmethod
+    def _where(table_model: type[SQLModel], where: Optional[dict[str, Any]]) -> Any:
+        """Build a clause that matches rows with the specified attributes.
+
+        Args:
+            table_model (type[SQLModel]): Type of the table model.
+            where (Optional[dict[str, Any]]): The attributes which the rows must have.
+
+        Returns:
+            Any: A SQL expression.
+        """
+        if not where:
+            return true()
+        return and_(
+            *(getattr(table_model, key) == value for key, value in where.items())
+        )
+
+    async def iter_rows(
+        self,
+        table_model: type[SQLModel],
+        batch_size: int = 500,
+        order_by: Optional[str] = None,
+        where: Optional[dict[str, Any]] = None,
+    ) -> AsyncIterator[Any]:
+        # Keyset pagination: each batch continues after the last row of the previous
+        # one, so the cost of a batch doesn't grow with its offset and no connection
+        # is held while the caller processes rows. The primary key breaks ties when
+        # ordering by a column which isn't unique.
+        table = table_model.__table__  # type: ignore
+        keys = [column.name for column in table.primary_key.columns]
+        if order_by is not None and order_by not in keys:
+            keys.insert(0, order_by)
+        columns = [getattr(table_model, key) for key in keys]
+        last: Optional[tuple[Any, ...]] = None
+
+        await self._flush_pending(table_model)
+
+        while True:
+            stmt = select(table_model).where(self._where(table_model, where))
+            if last is not None:
+                stmt = stmt.where(tuple_(*columns) > tuple_(*last))
+
+            async with self._session() as session:
+                result = await session.exec(
+                    stmt.order_by(*columns).limit(batch_size)  # type: ignore
+                )
+                rows = result.all()
+
+            for row in rows:
+                yield row
+
+            if len(rows) < batch_size:
+                return
+
+            last = tuple(getattr(rows[-1], key) for key in keys)
+
+    async def count_rows(
+        self, table_model: type[SQLModel], where: Optional[dict[str, Any]] = None
+    ) -> int:
+        await self._flush_pending(table_model)
+        async with self._session() as session:
+            result = await session.execute(
+                select(func.count())
+                .select_from(table_model)
+                .where(self._where(table_model, where))
+            )
+            return int(result.scalar_one())
+
+    async def row_exists(
+        self, table_model: type[SQLModel], where: dict[str, Any]
+    ) -> bool:
+        if table_model in self._write_behind and any(
+            all(getattr(row, key) == value for key, value in where.items())
+            for row in self._write_behind[table_model].find_all()
+        ):
+            return True
+
+        async with self._session() as session:
+            result = await session.execute(
+                select(exists().where(self._where(table_model, where)))
+            )
+            return bool(result.scalar_one())
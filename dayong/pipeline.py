@@ -0,0 +1,331 @@
+"""
+dayong.pipeline
+~~~~~~~~~~~~~~~
+
+Asynchronous stages connected by bounded queues. A stage runs ahead of the stage
+that consumes it by at most the size of its queue, so a slow stage slows down the
+stages in front of it instead of letting items pile up in memory.
+
+A broadcast feeds the items of one stage to several consumers, each through its own
+bounded queue.
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, AsyncIterator, Generic, Optional, TypeVar
+
+from loguru import logger
+
+DEFAULT_QUEUE_SIZE = 64
+
+_T = TypeVar("_T")
+# Marks the end of a stage's items.
+_END: Any = object()
+
+
+@dataclass
+class StageStats:
+    """Throughput of a stage, in seconds of the event loop's clock."""
+
+    name: str
+    items: int = 0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # Time spent waiting for the next stage to take items.
+    blocked: float = 0.0
+
+    @property
+    def elapsed(self) -> float:
+        """Time from the stage's first request for an item to its end."""
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+
+        return self.finished_at - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        """Items per second."""
+        return self.items / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name}: {self.items} items in {self.elapsed:.2f}s "
+            f"({self.throughput:.1f}/s, blocked {self.blocked:.2f}s)"
+        )
+
+
+class Stage(AsyncIterator[_T], Generic[_T]):
+    """Run an asynchronous iterable in a task and buffer its items in a bounded
+    queue. The task starts when the first item is requested.
+
+    An exception raised by the iterable is raised to the consumer once the items
+    before it have been consumed.
+
+    Args:
+        name (str): The name of the stage in its stats.
+        source (AsyncIterable[_T]): The items of the stage.
+        maxsize (int, optional): The number of items buffered. Defaults to
+            `DEFAULT_QUEUE_SIZE`.
+        timeout (Optional[float], optional): Seconds the source may take to produce
+            all of its items, not counting the time spent waiting for the consumer to
+            take them. Defaults to None, which is no timeout.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        source: AsyncIterable[_T],
+        maxsize: int = DEFAULT_QUEUE_SIZE,
+        timeout: Optional[float] = None,
+    ) -> None:
+        self.stats = StageStats(name)
+        self._source = source
+        self._timeout = timeout
+        self._queue: "asyncio.Queue[Any]" = asyncio.Queue(max(maxsize, 1))
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._error: Optional[BaseException] = None
+
+    def __aiter__(self) -> "Stage[_T]":
+        return self
+
+    async def __anext__(self) -> _T:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+        item = await self._queue.get()
+        if item is _END:
+            # Keep the end marker for later calls. There is room since one item was
+            # just taken.
+            self._queue.put_nowait(_END)
+            if self._error is not None:
+                raise self._error
+            raise StopAsyncIteration
+
+        return item
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.stats.started_at = loop.time()
+        iterator = self._source.__aiter__()
+        # What is left of the timeout. A source that trickles items can't outlast it.
+        remaining = self._timeout
+
+        try:
+            while True:
+                start = loop.time()
+                try:
+                    item = await asyncio.wait_for(iterator.__anext__(), remaining)
+                except StopAsyncIteration:
+                    break
+
+                if remaining is not None:
+                    remaining = max(remaining - (loop.time() - start), 0.0)
+
+                self.stats.items += 1
+                if self._queue.full():
+                    start = loop.time()
+                    try:
+                        await self._queue.put(item)
+                    finally:
+                        self.stats.blocked += loop.time() - start
+                else:
+                    self._queue.put_nowait(item)
+        except Exception as err:  # pylint: disable=W0703
+            self._error = err
+        finally:
+            self.stats.finished_at = loop.time()
+
+        await self._queue.put(_END)
+
+    async def aclose(self) -> None:
+        """Stop the stage and the source, if it can be closed."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+        close = getattr(self._source, "aclose", None)
+        if close is not None:
+            await close()
+
+
+class Subscription(AsyncIterator[_T], Generic[_T]):
+    """The items of a broadcast received by one consumer. See `Broadcast`."""
+
+    def __init__(self, broadcast: "Broadcast[_T]", maxsize: int) -> None:
+        self.items = 0
+        self._broadcast = broadcast
+        self._queue: "asyncio.Queue[Any]" = asyncio.Queue(max(maxsize, 1))
+        self._closed = False
+
+    def __aiter__(self) -> "Subscription[_T]":
+        return self
+
+    @property
+    def error(self) -> Optional[BaseException]:
+        """The exception raised by the source of the broadcast, if any."""
+        return self._broadcast.error
+
+    async def __anext__(self) -> _T:
+        if self._closed:
+            raise StopAsyncIteration
+
+        self._broadcast.start()
+        item = await self._queue.get()
+        if item is _END:
+            self._closed = True
+            self._broadcast.detach(self)
+            if self._broadcast.error is not None:
+                raise self._broadcast.error
+            raise StopAsyncIteration
+
+        self.items += 1
+        return item
+
+    async def put(self, item: Any) -> None:
+        """Queue an item, unless the subscription is closed.
+
+        Args:
+            item (Any): The item.
+        """
+        if not self._closed:
+            await self._queue.put(item)
+
+    async def aclose(self) -> None:
+        """Stop receiving items. The broadcast no longer waits for this consumer."""
+        self._closed = True
+        self._broadcast.detach(self)
+        # Wake the broadcast if it is waiting for room in the queue.
+        while not self._queue.empty():
+            self._queue.get_nowait()
+
+
+class Broadcast(Generic[_T]):
+    """Feed every item of an asynchronous iterable to each of its subscriptions.
+
+    The source is read once, in a task that starts when the first item is requested
+    from any subscription. The next item is read once every subscription has room for
+    the current one, so the source runs ahead of the slowest consumer by at most the
+    size of its queue. A consumer that stops early must close its subscription, after
+    which the others carry on without it. The source is no longer read once every
+    subscription is closed.
+
+    An exception raised by the source is raised to every consumer once the items
+    before it have been consumed.
+
+    Args:
+        source (AsyncIterable[_T]): The items to broadcast.
+        maxsize (int, optional): The number of items buffered by each subscription.
+            Defaults to `DEFAULT_QUEUE_SIZE`.
+    """
+
+    def __init__(
+        self, source: AsyncIterable[_T], maxsize: int = DEFAULT_QUEUE_SIZE
+    ) -> None:
+        self.maxsize = maxsize
+        self.error: Optional[BaseException] = None
+        self._source = source
+        self._subscriptions: list[Subscription[_T]] = []
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def subscribe(self) -> Subscription[_T]:
+        """Add a consumer.
+
+        Raises:
+            RuntimeError: Raised if the broadcast has started, since the consumer
+                would miss the items before it.
+
+        Returns:
+            Subscription[_T]: The items received by the consumer.
+        """
+        if self._task is not None:
+            raise RuntimeError("the broadcast has started")
+
+        subscription = Subscription(self, self.maxsize)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def start(self) -> None:
+        """Start reading the source, if it isn't read yet."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def detach(self, subscription: Subscription[_T]) -> None:
+        """Stop feeding a subscription.
+
+        Args:
+            subscription (Subscription[_T]): The subscription.
+        """
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+
+    async def _run(self) -> None:
+        try:
+            async for item in self._source:
+                if not self._subscriptions:
+                    break
+
+                await asyncio.gather(
+                    *(subscription.put(item) for subscription in self._subscriptions)
+                )
+        except Exception as err:  # pylint: disable=W0703
+            self.error = err
+
+        for subscription in list(self._subscriptions):
+            await subscription.put(_END)
+
+    async def aclose(self) -> None:
+        """Stop reading the source and close it, if it can be closed."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+        close = getattr(self._source, "aclose", None)
+        if close is not None:
+            await close()
+
+
+class Pipeline:
+    """Stages chained by their queues. The last stage is consumed by the owner of
+    the pipeline.
+
+    Args:
+        maxsize (int, optional): The number of items buffered by each stage.
+            Defaults to `DEFAULT_QUEUE_SIZE`.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_QUEUE_SIZE) -> None:
+        self.maxsize = maxsize
+        self.stages: list[Stage[Any]] = []
+
+    def stage(
+        self, name: str, source: AsyncIterable[_T], timeout: Optional[float] = None
+    ) -> Stage[_T]:
+        """Add a stage.
+
+        Args:
+            name (str): The name of the stage in its stats.
+            source (AsyncIterable[_T]): The items of the stage. This is usually an
+                asynchronous generator that consumes the previous stage.
+            timeout (Optional[float], optional): Seconds the source may take to
+                produce all of its items. Defaults to None, which is no timeout.
+
+        Returns:
+            Stage[_T]: The stage, to be consumed by the next one.
+        """
+        stage = Stage(name, source, self.maxsize, timeout)
+        self.stages.append(stage)
+        return stage
+
+    async def close(self) -> None:
+        """Stop every stage, from the last one to the first."""
+        for stage in reversed(self.stages):
+            await stage.aclose()
+
+    @property
+    def stats(self) -> list[StageStats]:
+        """The stats of each stage, in order."""
+        return [stage.stats for stage in self.stages]
+
+    def report(self) -> None:
+        """Log the throughput of each stage."""
+        for stats in self.stats:
+            logger.info(str(stats))
@@ -0,0 +1,177 @@
+"""
+dayong.ratelimit
+~~~~~~~~~~~~~~~~
+
+Non-blocking rate limiting for requests made to Discord.
+"""
+import asyncio
+import time
+from typing import Hashable, Optional
+
+# Discord allows 5 messages per 5 seconds in a channel.
+DEFAULT_LIMIT = 5
+DEFAULT_PERIOD = 5.0
+
+
+class TokenBucket:
+    """Token bucket that refills continuously. Waiting for a token suspends the
+    caller instead of blocking the event loop.
+    """
+
+    def __init__(self, limit: int = DEFAULT_LIMIT, period: float = DEFAULT_PERIOD):
+        self.limit = max(limit, 1)
+        self.period = period
+        self.tokens = float(self.limit)
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @property
+    def rate(self) -> float:
+        """Tokens regained per second."""
+        return self.limit / self.period if self.period > 0 else float("inf")
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.limit, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self) -> float:
+        """Seconds until a token is available.
+
+        Returns:
+            float: 0 if a token can be taken right away.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        blocked = max(self.blocked_until - now, 0.0)
+        missing = max(1 - self.tokens, 0.0) / self.rate
+        return max(blocked, missing)
+
+    async def acquire(self) -> float:
+        """Take a token, waiting for one if the bucket is empty. Callers are served
+        in the order they arrive.
+
+        Returns:
+            float: The seconds spent waiting.
+        """
+        waited = 0.0
+        async with self._lock:
+            while (delay := self.delay()) > 0:
+                await asyncio.sleep(delay)
+                waited += delay
+            self.tokens -= 1
+        return waited
+
+    def update(
+        self,
+        limit: Optional[int],
+        remaining: Optional[int],
+        reset_after: float,
+        period: Optional[float] = None,
+    ) -> None:
+        """Synchronize the bucket with the state reported by the server.
+
+        Args:
+            limit (Optional[int]): Requests allowed per period.
+            remaining (Optional[int]): Requests left in the current period.
+            reset_after (float): Seconds until the period resets.
+            period (Optional[float], optional): The length of the period, if known.
+                Defaults to None, in which case it is inferred from `reset_after`.
+        """
+        self._refill(time.monotonic())
+
+        if limit is not None and limit > 0:
+            self.limit = limit
+            if period is not None and period > 0:
+                self.period = period
+            elif remaining is not None and remaining < limit and reset_after > 0:
+                # `limit - remaining` requests were made during the elapsed part of
+                # the period.
+                self.period = max(self.period, reset_after)
+
+        if remaining is not None:
+            self.tokens = min(self.tokens, float(remaining))
+            if remaining <= 0:
+                self.block(reset_after)
+
+    def block(self, retry_after: float) -> None:
+        """Stop handing out tokens for a while, e.g. after a 429 response.
+
+        Args:
+            retry_after (float): Seconds to wait before the next request.
+        """
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+
+class RateLimiter:
+    """Rate limiter with a token bucket per route and key (e.g. channel ID), plus a
+    global block for when Discord reports a global rate limit. One instance is meant
+    to be shared by every task that makes requests.
+    """
+
+    def __init__(self, limit: int = DEFAULT_LIMIT, period: float = DEFAULT_PERIOD):
+        self.limit = limit
+        self.period = period
+        self._buckets: dict[tuple[str, Hashable], TokenBucket] = {}
+        self._global = TokenBucket(1, 0.0)
+
+    def bucket(self, route: str, key: Hashable = None) -> TokenBucket:
+        """Get the token bucket of a route and key.
+
+        Args:
+            route (str): The route, e.g. "POST /channels/{channel_id}/messages".
+            key (Hashable, optional): Identifies the bucket within the route, e.g. the
+                channel ID. Defaults to None.
+
+        Returns:
+            TokenBucket: The token bucket.
+        """
+        bucket = self._buckets.get((route, key))
+        if bucket is None:
+            bucket = self._buckets[(route, key)] = TokenBucket(self.limit, self.period)
+        return bucket
+
+    async def acquire(self, route: str, key: Hashable = None) -> float:
+        """Wait until a request can be made on a route.
+
+        Args:
+            route (str): The route of the request.
+            key (Hashable, optional): Identifies the bucket within the route. Defaults
+                to None.
+
+        Returns:
+            float: The seconds spent waiting.
+        """
+        waited = await self.bucket(route, key).acquire()
+        while (delay := max(self._global.blocked_until - time.monotonic(), 0.0)) > 0:
+            await asyncio.sleep(delay)
+            waited += delay
+        return waited
+
+    def retry_after(
+        self,
+        route: str,
+        key: Hashable,
+        retry_after: float,
+        is_global: bool = False,
+        limit: Optional[int] = None,
+        period: Optional[float] = None,
+    ) -> None:
+        """Handle a 429 response. The bucket takes on the limit Discord reported for
+        the route, so that later requests are paced to it.
+
+        Args:
+            route (str): The route of the request.
+            key (Hashable): Identifies the bucket within the route.
+            retry_after (float): The seconds Discord asked to wait.
+            is_global (bool, optional): Whether the global rate limit was hit.
+                Defaults to False.
+            limit (Optional[int], optional): Requests allowed per period, from the
+                `X-RateLimit-Limit` header. Defaults to None.
+            period (Optional[float], optional): The length of the period in seconds.
+                Defaults to None.
+        """
+        if is_global:
+            self._global.block(retry_after)
+        else:
+            self.bucket(route, key).update(limit, 0, retry_after, period)
@@ -0,0 +1,196 @@
+"""
+dayong.schema
+~~~~~~~~~~~~~
+
+Schema bootstrapping, versioning, and migrations for the table models in
+`dayong.models`.
+"""
+import hashlib
+from datetime import datetime
+
+from loguru import logger
+from sqlalchemy import MetaData, desc, insert, inspect, select, text
+from sqlalchemy.engine import Connection
+from sqlmodel import SQLModel
+
+from dayong.models import SCHEMA_VERSION, SchemaVersion
+
+# Databases created before schema versions were recorded.
+BASELINE_VERSION = 1
+
+# Key of the PostgreSQL advisory lock held while the schema is bootstrapped, so that
+# processes starting at the same time, e.g. the old and new dynos of a deploy, take
+# turns.
+SCHEMA_LOCK_KEY = 0x6461796F6E67  # "dayong"
+
+# Statements that upgrade a database from version `n - 1` to version `n`. Tables
+# that didn't exist yet are created from the current table models before these run,
+# so every statement must be idempotent.
+MIGRATIONS: dict[int, tuple[str, ...]] = {
+    2: (
+        # SQLModel 0.0.4 indexes every column by default. Drop the indexes that no
+        # query uses and make `message_id` unique.
+        "DROP INDEX IF EXISTS ix_anon_messages_id",
+        "DROP INDEX IF EXISTS ix_anon_messages_user_id",
+        "DROP INDEX IF EXISTS ix_anon_messages_username",
+        "DROP INDEX IF EXISTS ix_anon_messages_nickname",
+        "DROP INDEX IF EXISTS ix_anon_messages_message",
+        "DROP INDEX IF EXISTS ix_anon_messages_message_id",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_anon_messages_message_id "
+        "ON anon_messages (message_id)",
+        "DROP INDEX IF EXISTS ix_scheduledtask_id",
+        "DROP INDEX IF EXISTS ix_scheduledtask_task_name",
+        "DROP INDEX IF EXISTS ix_scheduledtask_channel_name",
+        "DROP INDEX IF EXISTS ix_scheduledtask_run",
+        # Keep the oldest of the duplicate tasks before enforcing uniqueness.
+        "DELETE FROM scheduledtask WHERE id NOT IN "
+        "(SELECT MIN(id) FROM scheduledtask GROUP BY task_name, channel_name)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_scheduledtask_task_name_channel_name "
+        "ON scheduledtask (task_name, channel_name)",
+        "DROP INDEX IF EXISTS ix_schema_version_version",
+        "DROP INDEX IF EXISTS ix_schema_version_checksum",
+        "DROP INDEX IF EXISTS ix_schema_version_applied_at",
+    ),
+    3: (
+        # Tasks store the IDs of their guild and channel, so the delivery worker can
+        # find the channel in any guild. Tasks added before this are still resolved
+        # by channel name.
+        "ALTER TABLE scheduledtask ADD COLUMN IF NOT EXISTS guild_id VARCHAR",
+        "ALTER TABLE scheduledtask ADD COLUMN IF NOT EXISTS channel_id VARCHAR",
+    ),
+    4: (
+        # How the content of a task is packed into messages. Existing tasks switch
+        # from one message per item to digests.
+        "ALTER TABLE scheduledtask ADD COLUMN IF NOT EXISTS delivery VARCHAR "
+        "NOT NULL DEFAULT 'digest'",
+    ),
+    # The `deliveredcontent` table is created from its table model.
+    5: (),
+    # The `mailboxstate` table is created from its table model.
+    6: (),
+    # The `jobschedule` table is created from its table model.
+    7: (),
+    8: (
+        # Tasks are unique per channel ID instead of channel name, so that channels
+        # with the same name in different guilds can subscribe to the same provider.
+        # Tasks without a channel ID are still resolved by channel name. Of the tasks
+        # of a renamed channel, keep the running one, or else the newest.
+        "DELETE FROM scheduledtask WHERE channel_id IS NOT NULL AND id NOT IN "
+        "(SELECT DISTINCT ON (task_name, channel_id) id FROM scheduledtask "
+        "WHERE channel_id IS NOT NULL "
+        "ORDER BY task_name, channel_id, COALESCE(run, FALSE) DESC, id DESC)",
+        "DROP INDEX IF EXISTS ix_scheduledtask_task_name_channel_name",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_scheduledtask_task_name_channel_id "
+        "ON scheduledtask (task_name, channel_id)",
+    ),
+}
+
+
+class SchemaMismatchError(RuntimeError):
+    """Raised if the schema recorded in the database doesn't match the table
+    models.
+    """
+
+
+def schema_checksum(metadata: MetaData) -> str:
+    """Compute a checksum of every table, column, index, and constraint.
+
+    Args:
+        metadata (MetaData): The collection of tables to checksum.
+
+    Returns:
+        str: A hex digest that changes whenever a table model changes.
+    """
+    parts: list[str] = []
+
+    for table in sorted(metadata.tables.values(), key=lambda table: table.name):
+        parts.append(f"table:{table.name}")
+        for column in table.columns:
+            parts.append(
+                f"column:{column.name}:{column.type!r}:{column.nullable}:"
+                f"{column.primary_key}:{column.unique}:{column.index}"
+            )
+        for index in sorted(table.indexes, key=lambda index: str(index.name)):
+            columns = ",".join(column.name for column in index.columns)
+            parts.append(f"index:{index.name}:{columns}:{index.unique}")
+        for constraint in sorted(
+            table.constraints, key=lambda constraint: type(constraint).__name__
+        ):
+            columns = ",".join(
+                sorted(column.name for column in getattr(constraint, "columns", ()))
+            )
+            parts.append(f"constraint:{type(constraint).__name__}:{columns}")
+
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def run_migrations(connection: Connection, from_version: int) -> None:
+    """Apply the migrations that come after the specified schema version.
+
+    Args:
+        connection (Connection): A connection with a transaction in progress.
+        from_version (int): The schema version the database is at.
+    """
+    for version in range(from_version + 1, SCHEMA_VERSION + 1):
+        logger.info(f"migrating database schema to version {version}")
+        for statement in MIGRATIONS.get(version, ()):
+            connection.exec_driver_sql(statement)
+
+
+def ensure_schema(connection: Connection) -> None:
+    """Create missing tables, apply pending migrations, and verify the recorded
+    schema version.
+
+    This is meant to be run once per engine, through `AsyncConnection.run_sync`. On
+    PostgreSQL, concurrent runs from other processes are serialized.
+
+    Args:
+        connection (Connection): A connection with a transaction in progress.
+
+    Raises:
+        SchemaMismatchError: Raised if the recorded schema version or checksum
+            doesn't match the table models.
+    """
+    if connection.dialect.name == "postgresql":
+        # Released when the transaction ends. Whoever waited finds the schema
+        # bootstrapped and the version recorded.
+        connection.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY}
+        )
+
+    table = SchemaVersion.__table__  # type: ignore
+    existing = set(inspect(connection).get_table_names())
+    SQLModel.metadata.create_all(connection)
+    checksum = schema_checksum(SQLModel.metadata)
+    recorded = connection.execute(
+        select(table).order_by(desc(table.c.version)).limit(1)
+    ).first()
+
+    if recorded is not None:
+        version = recorded.version
+    elif existing - {table.name}:
+        version = BASELINE_VERSION
+    else:
+        version = SCHEMA_VERSION
+
+    if version > SCHEMA_VERSION:
+        raise SchemaMismatchError(
+            f"database schema is at version {version}, "
+            f"expected version {SCHEMA_VERSION} or older"
+        )
+
+    if version < SCHEMA_VERSION or recorded is None:
+        run_migrations(connection, version)
+        connection.execute(
+            insert(table).values(
+                version=SCHEMA_VERSION, checksum=checksum, applied_at=datetime.utcnow()
+            )
+        )
+        return
+
+    if recorded.checksum != checksum:
+        raise SchemaMismatchError(
+            f"schema version {SCHEMA_VERSION} checksum mismatch: "
+            f"recorded {recorded.checksum}, computed {checksum}. "
+            "Did a table model change without a schema version bump?"
+        )
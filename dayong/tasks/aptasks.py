@@ -1,180 +1,572 @@
-# type: ignore
-# pylint: skip-file
+"""
+dayong.tasks.aptasks
+~~~~~~~~~~~~~~~~~~~~
+
+Scheduled content delivery. The jobs run on an APScheduler scheduler in the bot's
+event loop and share its REST client, database pool and caches. Their schedules are
+kept in the database, see `dayong.tasks.jobs`.
+"""
 import asyncio
-import time
+from functools import partial
+from typing import Any, AsyncIterable, AsyncIterator, Optional
 
-import discord
+import hikari
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from discord import TextChannel
 from loguru import logger
-from pragmail.exceptions import IMAP4Error
-from sqlalchemy.exc import NoResultFound
 
-from dayong.core.configs import DayongDynamicLoader
+from dayong.abc import ContentProvider, Database
+from dayong.channels import ChannelIndex
+from dayong.core.configs import DayongConfig
+from dayong.delivery import Batch, DeliveryMode, pack_stream
 from dayong.exts.apis import RESTClient
-from dayong.exts.emails import EmailClient
+from dayong.exts.httpcache import ResponseCache
+from dayong.exts.providers import ProviderContext, load_providers
+from dayong.ledger import DeliveryLedger
 from dayong.models import ScheduledTask
-from dayong.operations import DatabaseImpl
+from dayong.pipeline import Broadcast, Pipeline, Stage, Subscription
+from dayong.ratelimit import RateLimiter
+from dayong.tasks.jobs import JobStore
 from dayong.tasks.manager import AioTaskManager
 
-CONFIG = DayongDynamicLoader.load()
-CLIENT = discord.Client()
-
-db = DatabaseImpl()
-rest = RESTClient()
-tm = AioTaskManager()
-email = None
-info = ""
-job_ran = False
-
-
-async def signal_run() -> None:
-    global job_ran
-
-    job_ran = True
-
-
-async def check_rate() -> None:
-    global job_ran
-
-    if job_ran is True:
-        # Intentionally blocking
-        time.sleep(5)
-        job_ran = False
-
+CREATE_MESSAGE = "POST /channels/{channel_id}/messages"
+MAX_SEND_ATTEMPTS = 3
+DELIVERY_GROUP = "delivery"
+
+
+class ContentScheduler:
+    """Fetch content from third-party providers on a schedule and deliver it to the
+    channels subscribed to them. Each provider is fetched once per run, however many
+    channels it is delivered to. The providers are the ones registered in
+    `dayong.exts.providers`.
+
+    Args:
+        config (DayongConfig): An instance of `dayong.core.configs.DayongConfig`.
+        database (Database): The database shared with the bot's components.
+    """
+
+    def __init__(self, config: DayongConfig, database: Database) -> None:
+        self.config = config
+        self.database = database
+        self.ledger = DeliveryLedger(database, config.ledger.retention_days)
+        self.api = RESTClient(
+            ResponseCache(
+                config.http_cache.path,
+                config.http_cache.size,
+                config.http_cache.max_body_size,
+            ),
+            config.providers.concurrency,
+            config.providers.timeout,
+        )
+        self.limiter = RateLimiter()
+        self.manager = AioTaskManager(
+            config.tasks.concurrency, config.tasks.group_limits, config.tasks.timeout
+        )
+        self.scheduler = AsyncIOScheduler(timezone=config.schedule.timezone)
+        self.jobs = JobStore(
+            database,
+            self.scheduler,
+            config.schedule.misfire_grace_time,
+            config.schedule.catch_up_interval,
+        )
+        context = ProviderContext(config, database, self.api, self.run)
+        self.providers: dict[str, ContentProvider] = {
+            alias: provider(context)  # type: ignore
+            for alias, provider in load_providers(config.providers.extra).items()
+        }
+        self._rest: Optional[hikari.api.RESTClient] = None
+        self._cache: Optional[hikari.api.Cache] = None
+        self._channels: ChannelIndex[hikari.TextableGuildChannel] = ChannelIndex()
+        # The delivery tasks by the alias of their provider, `None` while a task is
+        # being started, and the aliases of the providers to run again once their
+        # delivery ends.
+        self._delivering: dict[str, Optional["asyncio.Task[Any]"]] = {}
+        self._rerun: set[str] = set()
+
+    @property
+    def rest(self) -> hikari.api.RESTClient:
+        """The REST client messages are sent with.
+
+        Raises:
+            RuntimeError: Raised if the scheduler wasn't started.
+        """
+        if self._rest is None:
+            raise RuntimeError("the content scheduler isn't started")
+
+        return self._rest
+
+    async def start(
+        self,
+        rest: hikari.api.RESTClient,
+        cache: Optional[hikari.api.Cache],
+        channels: ChannelIndex[hikari.TextableGuildChannel],
+    ) -> None:
+        """Load the delivery ledger, open the providers and schedule their jobs.
+
+        Args:
+            rest (hikari.api.RESTClient): The bot's REST client.
+            cache (Optional[hikari.api.Cache]): The bot's cache, if it has one. It is
+                used to find channels of tasks that were scheduled by name.
+            channels (ChannelIndex[hikari.TextableGuildChannel]): The channel index
+                kept up to date by the bot's event listeners.
+        """
+        if self.scheduler.running:
+            return
+
+        self._rest = rest
+        self._cache = cache
+        self._channels = channels
+
+        await self.ledger.load()
+        results = await asyncio.gather(
+            *(provider.open() for provider in self.providers.values()),
+            return_exceptions=True,
+        )
+        for alias, result in zip(self.providers, results):
+            if isinstance(result, Exception):
+                logger.opt(exception=result).error(f"can't open provider {alias}")
+
+        for alias in self.config.schedule.jobs.keys() - self.providers.keys():
+            logger.warning(f"no content provider to schedule for {alias}")
+
+        await self.jobs.load()
+        for alias, provider in self.providers.items():
+            cron = self.config.schedule.jobs.get(alias, provider.schedule)
+            try:
+                await self.jobs.add_job(
+                    alias, partial(self.run, alias), cron, self.config.schedule.timezone
+                )
+            except ValueError as err:
+                logger.error(f"can't schedule {alias} at {cron!r}: {err}")
+
+        self.scheduler.start()
+
+    async def stop(self) -> None:
+        """Stop the jobs and close the connections opened by the scheduler."""
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+
+        await asyncio.gather(
+            *(provider.close() for provider in self.providers.values()),
+            return_exceptions=True,
+        )
+        await self.manager.close()
+        await self.api.close()
+
+    async def get_subscribers(self, task_name: str) -> list[ScheduledTask]:
+        """Get the running tasks of a content provider, one per subscribed channel.
+
+        Args:
+            task_name (str): Alias of the third-party content provider.
+
+        Returns:
+            list[ScheduledTask]: The running tasks.
+        """
+        table_model = ScheduledTask(channel_name="", task_name=task_name)
+        rows = (await self.database.get_row(table_model, "task_name")).all()
+        return [row for row in rows if row.run]
+
+    def get_channel_id(self, task: ScheduledTask) -> Optional[hikari.Snowflake]:
+        """Get the ID of the channel a task delivers content to.
+
+        Args:
+            task (ScheduledTask): The scheduled task.
+
+        Returns:
+            Optional[hikari.Snowflake]: The ID of the channel, if it was found. `None`
+                if the channel was deleted.
+        """
+        if task.channel_id:
+            channel_id = hikari.Snowflake(task.channel_id)
+            # The index has every channel of the guilds it has seen, so a channel
+            # missing from an indexed guild was deleted.
+            if (
+                task.guild_id
+                and int(task.guild_id) in self._channels
+                and self._channels.get(channel_id) is None
+            ):
+                return None
+            return channel_id
+
+        # Tasks scheduled before channel IDs were stored only have a channel name,
+        # and maybe no guild ID, to go by.
+        if task.guild_id:
+            guild_ids = [int(task.guild_id)]
+        elif self._cache is not None:
+            guild_ids = list(self._cache.get_guilds_view())
+        else:
+            guild_ids = []
+
+        for guild_id in guild_ids:
+            channel = self._channels.get_by_name(guild_id, task.channel_name)
+            if channel is not None:
+                return channel.id
 
-@logger.catch
-async def get_scheduled(table_model):
-    await db.connect(CONFIG)
-    await db.create_table()
-    try:
-        return (await db.get_row(table_model, "task_name")).one()
-    except NoResultFound:
         return None
 
-
-@logger.catch
-async def get_guild_channel(target_channel):
-    for channel in CLIENT.guilds[0].channels:
-        if target_channel == str(channel).strip():
-            return channel
-
-
-@logger.catch
-async def del_schedule(table_model):
-    try:
-        await db.connect(CONFIG)
-        await db.remove_row(table_model, "task_name")
-    except NoResultFound:
-        logger.info(f"{repr(table_model)} not found")
-
-
-@logger.catch
-async def check_email_cred():
-    global email, info
-
-    email_host = CONFIG.imap_domain_name
-    email_addr = CONFIG.email
-    email_pass = CONFIG.email_password
-
-    if email_addr is None or email_pass is None:
-        info = (
-            "Can't retrieve content on email subscription. To do so, please "
-            "provide your email credentials and redeploy the bot."
+    async def del_schedule(self, task_name: str) -> None:
+        """Stop the task of a content provider in every channel.
+
+        Args:
+            task_name (str): Alias of the third-party content provider.
+        """
+        if not await self.database.update_returning(
+            ScheduledTask, {"run": False}, {"task_name": task_name}
+        ):
+            logger.info(f"{task_name} task not found")
+
+    async def disable_task(self, task_name: str, channel_id: hikari.Snowflake) -> None:
+        """Stop the task of a content provider in a channel that was deleted or that
+        the bot can't send messages to.
+
+        Args:
+            task_name (str): Alias of the third-party content provider.
+            channel_id (hikari.Snowflake): The ID of the channel.
+        """
+        await self.database.update_returning(
+            ScheduledTask,
+            {"run": False},
+            {"task_name": task_name, "channel_id": str(channel_id)},
         )
-        logger.info(info)
-        return
-
-    email = EmailClient(email_host, email_addr, email_pass)
-
-
-@logger.catch
-async def send_content(channel, content):
-    for content in content.content:
-        await check_rate()
-        await channel.send(content)
-        await signal_run()
-        await asyncio.sleep(60)
-
-
-@logger.catch
-async def get_devto_article():
-    task = get_devto_article.__name__
-
-    result = await get_scheduled(ScheduledTask(channel_name="", task_name="dev"))
-
-    if not result or bool(result.run) is False:
-        logger.info(f"{task} is not scheduled to run")
-        return
-
-    content = await rest.get_devto_article()
-    channel = await get_guild_channel(result.channel_name)
-
-    if not isinstance(channel, TextChannel):
-        raise TypeError(f"channel is not a TextChannel: {channel}")
-
-    logger.info(
-        f"{get_devto_article.__name__} delivering content to: {result.channel_name}"
-    )
-
-    await tm.stop_task(task)
-    await tm.start_task(send_content, task, 0, channel, content)
-
-
-@logger.catch
-async def get_medium_daily_digest():
-    global email
-
-    task = get_medium_daily_digest.__name__
-    notsched = f"{task} is not scheduled to run"
-    xsession = f"{task} cannot run. reason: no session started.\n```{info}```"
-    table_model = ScheduledTask(channel_name="", task_name="medium")
-
-    result = await get_scheduled(table_model)
-
-    if not result:
-        logger.info(f"{task} is not scheduled to run")
-        return
-
-    if bool(result.run) is False:
-        logger.info(notsched)
-        return
-
-    channel = await get_guild_channel(result.channel_name)
-
-    if not isinstance(channel, TextChannel):
-        raise TypeError(f"channel is not a TextChannel: {channel}")
-
-    if email is None:
-        await channel.send(xsession)
-        await del_schedule(table_model)
-        return
-
-    try:
-        content = await email.get_medium_daily_digest()
-    except IMAP4Error:
-        email = EmailClient(
-            CONFIG.imap_domain_name, CONFIG.email, CONFIG.email_password
+        logger.warning(f"{task_name} task stopped in unavailable channel {channel_id}")
+
+    async def send_message(self, channel_id: hikari.Snowflake, batch: Batch) -> int:
+        """Send a batch of content in one message.
+
+        hikari retries rate limited requests itself. The shared limiter paces the
+        requests and takes over when hikari gives up on a long rate limit.
+
+        Args:
+            channel_id (hikari.Snowflake): The ID of the channel.
+            batch (Batch): The content of the message.
+
+        Raises:
+            hikari.RateLimitTooLongError: Raised if the message still couldn't be
+                sent after `MAX_SEND_ATTEMPTS` attempts.
+
+        Returns:
+            int: The number of attempts it took.
+        """
+        embeds = []
+        for fields in batch.embeds:
+            embed = hikari.Embed()
+            for name, value in fields:
+                embed.add_field(name, value)
+            embeds.append(embed)
+
+        content = hikari.UNDEFINED if batch.content is None else batch.content
+        for attempt in range(1, MAX_SEND_ATTEMPTS + 1):
+            await self.limiter.acquire(CREATE_MESSAGE, channel_id)
+            try:
+                await self.rest.create_message(
+                    channel_id, content, embeds=embeds or hikari.UNDEFINED
+                )
+                return attempt
+            except hikari.RateLimitTooLongError as err:
+                if attempt == MAX_SEND_ATTEMPTS:
+                    raise
+
+                # hikari reports the limit and period of the route's bucket, as read
+                # from the `X-RateLimit-*` headers.
+                self.limiter.retry_after(
+                    CREATE_MESSAGE,
+                    channel_id,
+                    err.retry_after,
+                    err.is_global,
+                    err.limit,
+                    err.period,
+                )
+
+        return MAX_SEND_ATTEMPTS
+
+    async def send_batches(
+        self, channel_id: hikari.Snowflake, batches: AsyncIterable[Batch]
+    ) -> AsyncIterator[tuple[Batch, int]]:
+        """Send batches of content and record their items as delivered.
+
+        Args:
+            channel_id (hikari.Snowflake): The ID of the channel.
+            batches (AsyncIterable[Batch]): The batches to send.
+
+        Yields:
+            AsyncIterator[tuple[Batch, int]]: Each sent batch and the number of
+                attempts it took.
+        """
+        async for batch in batches:
+            attempts = await self.send_message(channel_id, batch)
+            await self.ledger.record(channel_id, batch.items)
+            yield batch, attempts
+
+    async def stream_to(
+        self,
+        task_name: str,
+        channel_id: hikari.Snowflake,
+        mode: DeliveryMode,
+        items: Subscription[str],
+    ) -> bool:
+        """Deliver the items that weren't delivered to a channel before.
+
+        The items are deduplicated, packed and sent in stages connected by bounded
+        queues, so the first message goes out as soon as it is packed and a slow
+        stage holds back the stages in front of it.
+
+        The task is stopped if the channel was deleted or the bot can't send
+        messages to it.
+
+        Args:
+            task_name (str): Alias of the third-party content provider.
+            channel_id (hikari.Snowflake): The ID of the channel.
+            mode (DeliveryMode): How items are packed into messages.
+            items (Subscription[str]): The fetched items.
+
+        Returns:
+            bool: True if every item was delivered, or if the task was stopped,
+                otherwise False.
+        """
+        options = self.config.pipeline
+        pipeline = Pipeline(options.queue_size)
+        fresh = pipeline.stage(
+            f"dedupe {channel_id}", self.ledger.filter(channel_id, items)
+        )
+        batches = pipeline.stage(
+            f"pack {channel_id}", pack_stream(fresh, mode, options.linger)
+        )
+        sent = pipeline.stage(
+            f"deliver {channel_id}", self.send_batches(channel_id, batches)
+        )
+        delivered = calls = 0
+        complete = False
+
+        try:
+            async for batch, attempts in sent:
+                delivered += batch.size
+                calls += attempts
+            complete = True
+        except (hikari.NotFoundError, hikari.ForbiddenError):
+            # The remaining items have nowhere to go, so they don't hold up
+            # committing the content delivered to the other channels.
+            await self.disable_task(task_name, channel_id)
+            complete = True
+        except Exception as err:  # pylint: disable=W0703
+            # Errors of the fetch are logged once, by `stream_content`.
+            if err is not items.error:
+                logger.exception(f"failed to deliver content to {channel_id}")
+        finally:
+            await items.aclose()
+            await pipeline.close()
+            pipeline.report()
+
+        logger.info(
+            f"delivered {delivered} items to {channel_id} in {calls} API "
+            f"calls ({mode.value}, {items.items - fresh.stats.items} already "
+            "delivered)"
+        )
+        return complete
+
+    async def stream_content(
+        self, provider: ContentProvider, targets: dict[hikari.Snowflake, DeliveryMode]
+    ) -> None:
+        """Fetch the content of a provider once and deliver it to every subscribed
+        channel concurrently.
+
+        The fetched items are broadcast to a delivery per channel. The fetch runs
+        ahead of the slowest delivery by at most the size of the queues, and a
+        delivery that fails doesn't hold up the others. Messages are paced by the
+        shared rate limiter. The provider commits the content once it was delivered
+        to every channel.
+
+        Args:
+            provider (ContentProvider): The content provider.
+            targets (dict[hikari.Snowflake, DeliveryMode]): How items are packed into
+                messages, by the ID of the channel they are delivered to.
+        """
+        await self.ledger.prune()
+        options = self.config.pipeline
+        fetch = Stage("fetch", provider.stream(), options.queue_size, provider.timeout)
+        broadcast = Broadcast(fetch, options.queue_size)
+        subscriptions = {channel_id: broadcast.subscribe() for channel_id in targets}
+
+        try:
+            complete = await asyncio.gather(
+                *(
+                    self.stream_to(
+                        provider.alias, channel_id, mode, subscriptions[channel_id]
+                    )
+                    for channel_id, mode in targets.items()
+                )
+            )
+        finally:
+            await broadcast.aclose()
+            logger.info(f"{provider.alias} {fetch.stats}")
+
+        if isinstance(broadcast.error, asyncio.TimeoutError):
+            logger.error(f"{provider.alias} timed out after {provider.timeout}s")
+        elif broadcast.error is not None:
+            logger.opt(exception=broadcast.error).error(
+                f"{provider.alias} failed to fetch content"
+            )
+        elif all(complete):
+            # Content that wasn't delivered everywhere is fetched again on the next
+            # run. The ledger keeps it from being delivered twice to a channel.
+            await provider.commit()
+
+    async def deliver(
+        self, provider: ContentProvider, targets: dict[hikari.Snowflake, DeliveryMode]
+    ) -> None:
+        """Run the delivery of a provider in the background.
+
+        A delivery that is in progress isn't interrupted. The provider runs once more
+        after it instead, however many times it is asked to in the meantime.
+
+        Args:
+            provider (ContentProvider): The content provider.
+            targets (dict[hikari.Snowflake, DeliveryMode]): How items are packed into
+                messages, by the ID of the channel they are delivered to.
+        """
+        alias = provider.alias
+        if alias in self._delivering:
+            logger.info(f"{alias} is delivering, running again after it")
+            self._rerun.add(alias)
+            return
+
+        self._delivering[alias] = None
+        self._rerun.discard(alias)
+        try:
+            finishing = self.manager.tasks.get(alias)
+            if finishing is not None:
+                # The previous delivery has ended, but the manager hasn't let go of
+                # its task yet.
+                await asyncio.wait([finishing])
+
+            logger.info(f"{alias} delivering content to {len(targets)} channels")
+            _, task = await self.manager.start_task(
+                self.stream_runs,
+                alias,
+                0,
+                provider,
+                targets,
+                group=DELIVERY_GROUP,
+            )
+        except BaseException:
+            del self._delivering[alias]
+            raise
+
+        self._delivering[alias] = task
+        # A task that is cancelled before it starts never runs `stream_runs`.
+        task.add_done_callback(partial(self._end_delivery, alias))
+
+    def _end_delivery(self, alias: str, task: "asyncio.Task[Any]") -> None:
+        if self._delivering.get(alias) is task:
+            del self._delivering[alias]
+
+    async def stream_runs(
+        self, provider: ContentProvider, targets: dict[hikari.Snowflake, DeliveryMode]
+    ) -> None:
+        """Deliver the content of a provider, then again for as long as another run
+        was asked for in the meantime.
+
+        Args:
+            provider (ContentProvider): The content provider.
+            targets (dict[hikari.Snowflake, DeliveryMode]): How items are packed into
+                messages, by the ID of the channel they are delivered to.
+        """
+        alias = provider.alias
+        try:
+            while True:
+                if targets:
+                    await self.stream_content(provider, targets)
+
+                # Nothing is awaited between this check and the end of the delivery,
+                # so a run that is asked for before it ends is never lost.
+                if alias not in self._rerun:
+                    break
+
+                self._rerun.discard(alias)
+                # Channels may have subscribed or unsubscribed since.
+                targets = await self.get_targets(provider)
+        finally:
+            self._delivering.pop(alias, None)
+
+    async def get_targets(
+        self, provider: ContentProvider
+    ) -> dict[hikari.Snowflake, DeliveryMode]:
+        """Get the channels subscribed to a provider. A channel that can't be found
+        is skipped, and the task of a channel that was deleted is stopped.
+
+        Args:
+            provider (ContentProvider): The content provider.
+
+        Returns:
+            dict[hikari.Snowflake, DeliveryMode]: How items are packed into messages,
+                by the ID of the channel they are delivered to.
+        """
+        targets: dict[hikari.Snowflake, DeliveryMode] = {}
+
+        for task in await self.get_subscribers(provider.alias):
+            channel_id = self.get_channel_id(task)
+            if channel_id is None and task.channel_id:
+                await self.disable_task(
+                    provider.alias, hikari.Snowflake(task.channel_id)
+                )
+                continue
+            if channel_id is None:
+                logger.error(f"{provider.alias} channel not found: {task.channel_name}")
+                continue
+
+            try:
+                mode = DeliveryMode(task.delivery)
+            except ValueError:
+                mode = provider.delivery
+            targets.setdefault(channel_id, mode)
+
+        return targets
+
+    @logger.catch
+    async def collect(self, alias: str) -> None:
+        """Start delivering content from a provider to the channels subscribed to
+        it.
+
+        Args:
+            alias (str): Alias of the third-party content provider.
+        """
+        provider = self.providers[alias]
+        targets = await self.get_targets(provider)
+
+        if not targets:
+            logger.info(f"{alias} is not scheduled to run")
+            return
+
+        if provider.unavailable is not None:
+            notice = Batch(
+                f"{alias} cannot run. reason: no session started.\n"
+                f"```{provider.unavailable}```"
+            )
+            results = await asyncio.gather(
+                *(self.send_message(channel_id, notice) for channel_id in targets),
+                return_exceptions=True,
+            )
+            for channel_id, result in zip(targets, results):
+                if isinstance(result, Exception):
+                    logger.opt(exception=result).error(
+                        f"can't notify {channel_id} that {alias} cannot run"
+                    )
+
+            await self.del_schedule(alias)
+            return
+
+        await self.deliver(provider, targets)
+
+    async def run(self, *aliases: str) -> None:
+        """Deliver content from providers concurrently. A provider that fails or
+        times out doesn't hold up the others.
+
+        Args:
+            *aliases (str): Aliases of the third-party content providers. Defaults
+                to every provider.
+        """
+        await asyncio.gather(
+            *(
+                self.collect(alias)
+                for alias in (aliases or self.providers)
+                if alias in self.providers
+            )
         )
-        content = await email.get_medium_daily_digest()
-
-    logger.info(
-        f"{get_medium_daily_digest.__name__} "
-        "delivering content to: {result.channel_name}"
-    )
-
-    await tm.stop_task(task)
-    await tm.start_task(send_content, task, 0, channel, content)
-
-
-@logger.catch
-@CLIENT.event
-async def on_ready():
-    await check_email_cred()
-    scheduler = AsyncIOScheduler()
-    scheduler.add_job(get_devto_article, "interval", hours=24)
-    scheduler.add_job(get_medium_daily_digest, "interval", hours=24)
-    scheduler.start()
-
-
-CLIENT.run(CONFIG.bot_token)
@@ -0,0 +1,197 @@
+"""
+dayong.tasks.jobs
+~~~~~~~~~~~~~~~~~
+
+Cron jobs whose next run is stored in the database, so that restarts don't shift or
+skip them.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Coroutine, Optional
+
+from apscheduler.job import Job
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from loguru import logger
+
+from dayong.abc import Database
+from dayong.models import JobSchedule
+
+
+def to_utc(value: datetime) -> datetime:
+    """Convert an aware datetime to the naive UTC datetime stored in the database.
+
+    Args:
+        value (datetime): An aware datetime.
+
+    Returns:
+        datetime: The naive datetime in UTC.
+    """
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def from_utc(value: datetime) -> datetime:
+    """Convert a naive UTC datetime stored in the database to an aware datetime.
+
+    Args:
+        value (datetime): A naive datetime in UTC.
+
+    Returns:
+        datetime: The aware datetime.
+    """
+    return value.replace(tzinfo=timezone.utc)
+
+
+class JobStore:
+    """Schedule cron jobs on an APScheduler scheduler and keep their next run in the
+    `JobSchedule` table.
+
+    When a job is added, a run that was missed while the bot was down runs right
+    away if it is within the misfire grace time, otherwise it is skipped. Missed
+    runs are coalesced into one, and the catch-up runs of different jobs are spread
+    apart.
+
+    Args:
+        database (Database): The database the schedules are stored in.
+        scheduler (AsyncIOScheduler): The scheduler the jobs run on.
+        misfire_grace_time (float, optional): Seconds a run may be late by and still
+            run. Defaults to 21600.0.
+        catch_up_interval (float, optional): Seconds between the catch-up runs of
+            different jobs. Defaults to 30.0.
+    """
+
+    def __init__(
+        self,
+        database: Database,
+        scheduler: AsyncIOScheduler,
+        misfire_grace_time: float = 21600.0,
+        catch_up_interval: float = 30.0,
+    ) -> None:
+        self.database = database
+        self.scheduler = scheduler
+        self.misfire_grace_time = misfire_grace_time
+        self.catch_up_interval = catch_up_interval
+        self._schedules: dict[str, JobSchedule] = {}
+        self._catch_ups = 0
+
+    async def load(self) -> None:
+        """Load the stored schedules."""
+        self._schedules = {
+            row.name: row
+            for row in (await self.database.get_all_row(JobSchedule)).all()
+        }
+
+    def first_run(self, name: str, trigger: CronTrigger, cron: str) -> datetime:
+        """Get the time a job runs first after the bot starts.
+
+        Args:
+            name (str): The name of the job.
+            trigger (CronTrigger): The trigger of the job.
+            cron (str): The crontab expression of the trigger.
+
+        Returns:
+            datetime: An aware datetime.
+        """
+        now = datetime.now(timezone.utc)
+        upcoming = trigger.get_next_fire_time(None, now)
+        stored = self._schedules.get(name)
+
+        # A new or changed schedule starts from its next fire time.
+        if stored is None or stored.cron != cron:
+            return upcoming
+
+        next_run = from_utc(stored.next_run_at)
+        if next_run > now:
+            return next_run
+
+        late = (now - next_run).total_seconds()
+        if late > self.misfire_grace_time:
+            logger.warning(f"job {name} missed its run at {next_run} and is skipped")
+            return upcoming
+
+        delay = self._catch_ups * self.catch_up_interval
+        self._catch_ups += 1
+        logger.info(f"job {name} missed its run at {next_run} and is caught up on")
+        return now + timedelta(seconds=delay)
+
+    async def add_job(
+        self,
+        name: str,
+        func: Callable[[], Coroutine[Any, Any, Any]],
+        cron: str,
+        tz: Any = "UTC",
+    ) -> Job:
+        """Schedule a job, or reschedule it if it exists.
+
+        Args:
+            name (str): The name of the job. Schedules are stored by name.
+            func (Callable[[], Coroutine[Any, Any, Any]]): The coroutine function to
+                run.
+            cron (str): A crontab expression, e.g. "0 0 * * *".
+            tz (Any, optional): The time zone of the crontab expression. Defaults to
+                "UTC".
+
+        Raises:
+            ValueError: Raised if the crontab expression is invalid.
+
+        Returns:
+            Job: The scheduled job.
+        """
+        trigger = CronTrigger.from_crontab(cron, timezone=tz)
+        next_run = self.first_run(name, trigger, cron)
+        await self.save(name, cron, next_run)
+
+        async def run() -> None:
+            # The scheduler has moved the job to its next run by the time it runs.
+            job = self.scheduler.get_job(name)
+            await self.save(
+                name,
+                cron,
+                job.next_run_time if job is not None else None,
+                datetime.now(timezone.utc),
+            )
+            await func()
+
+        return self.scheduler.add_job(
+            run,
+            trigger,
+            id=name,
+            name=name,
+            next_run_time=next_run,
+            misfire_grace_time=int(self.misfire_grace_time),
+            coalesce=True,
+            max_instances=1,
+            replace_existing=True,
+        )
+
+    async def save(
+        self,
+        name: str,
+        cron: str,
+        next_run: Optional[datetime],
+        last_run: Optional[datetime] = None,
+    ) -> None:
+        """Store the schedule of a job.
+
+        Args:
+            name (str): The name of the job.
+            cron (str): The crontab expression of the job.
+            next_run (Optional[datetime]): The next run of the job. Nothing is stored
+                if the job doesn't run again.
+            last_run (Optional[datetime], optional): The last run of the job.
+                Defaults to None, which keeps the stored one.
+        """
+        if next_run is None:
+            return
+
+        stored = self._schedules.get(name)
+        if last_run is None and stored is not None and stored.last_run_at is not None:
+            last_run = from_utc(stored.last_run_at)
+
+        schedule = JobSchedule(
+            name=name,
+            cron=cron,
+            next_run_at=to_utc(next_run),
+            last_run_at=to_utc(last_run) if last_run is not None else None,
+        )
+        await self.database.upsert_row(schedule, ("name",))
+        self._schedules[name] = schedule
@@ -6,19 +6,137 @@ Custom, built-in implementation of background task managers.
 """
 import asyncio
 from asyncio.tasks import Task
-from typing import Any, Callable, Coroutine
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Callable, Coroutine, Optional
+
+from loguru import logger
+
+DEFAULT_GROUP = "default"
+
+
+class Outcome(str, Enum):
+    """How a task ended."""
+
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    TIMED_OUT = "timed_out"
+
+
+@dataclass
+class TaskRecord:
+    """Timings of a task, in seconds of the event loop's clock."""
+
+    name: str
+    group: str
+    created_at: float
+    queued_at: Optional[float] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    outcome: Optional[Outcome] = None
+
+    @property
+    def queue_wait(self) -> float:
+        """Time spent waiting for a free slot after the execution delay."""
+        if self.queued_at is None:
+            return 0.0
+
+        end = self.started_at if self.started_at is not None else self.finished_at
+        return (end or self.queued_at) - self.queued_at
+
+    @property
+    def run_time(self) -> float:
+        """Time spent running."""
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+
+        return self.finished_at - self.started_at
+
+
+@dataclass
+class TaskStats:
+    """Totals of the tasks that ended in a group."""
+
+    outcomes: Counter[Outcome] = field(default_factory=Counter)
+    queue_wait: float = 0.0
+    max_queue_wait: float = 0.0
+    run_time: float = 0.0
+    max_run_time: float = 0.0
+
+    @property
+    def count(self) -> int:
+        """The number of tasks that ended."""
+        return sum(self.outcomes.values())
+
+    def add(self, record: TaskRecord) -> None:
+        """Add a task that ended to the totals.
+
+        Args:
+            record (TaskRecord): The record of the task.
+        """
+        if record.outcome is not None:
+            self.outcomes[record.outcome] += 1
+
+        self.queue_wait += record.queue_wait
+        self.max_queue_wait = max(self.max_queue_wait, record.queue_wait)
+        self.run_time += record.run_time
+        self.max_run_time = max(self.max_run_time, record.run_time)
 
 
 class AioTaskManager:
-    """Task manager and scheduler that manages tasks in the same event loop."""
+    """Task manager and scheduler that manages tasks in the same event loop.
+
+    Tasks wait for a free slot under the global limit and the limit of their group
+    before they run. Stats are kept per group, along with the records of the most
+    recent tasks.
+
+    Args:
+        concurrency (Optional[int], optional): Tasks running at once, across every
+            group. Defaults to None, which is unlimited.
+        group_limits (Optional[dict[str, int]], optional): Tasks running at once in
+            a group, by group name. Defaults to None.
+        timeout (Optional[float], optional): Seconds a task may run before it is
+            cancelled. Defaults to None, which is no timeout.
+        history (int, optional): Records of ended tasks to keep. Defaults to 100.
+    """
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        group_limits: Optional[dict[str, int]] = None,
+        timeout: Optional[float] = None,
+        history: int = 100,
+    ) -> None:
+        self.concurrency = concurrency
+        self.group_limits = dict(group_limits or {})
+        self.timeout = timeout
+        self.tasks: dict[str, Task[Any]] = {}
+        self.records: dict[str, TaskRecord] = {}
+        self.stats: dict[str, TaskStats] = {}
+        self.history: deque[TaskRecord] = deque(maxlen=history)
+        # Semaphores are created on first use, inside the running event loop.
+        self._semaphores: dict[Optional[str], Optional[asyncio.Semaphore]] = {}
 
-    tasks: dict[str, Task[Any]] = {}
+    @property
+    def running(self) -> int:
+        """The number of tasks that are running."""
+        return sum(record.started_at is not None for record in self.records.values())
+
+    def _semaphore(self, group: Optional[str]) -> Optional[asyncio.Semaphore]:
+        # `None` is the key of the global limit.
+        if group not in self._semaphores:
+            limit = self.concurrency if group is None else self.group_limits.get(group)
+            self._semaphores[group] = asyncio.Semaphore(limit) if limit else None
+
+        return self._semaphores[group]
 
     async def get_task(self, task_name: str) -> Task[Any]:
         """Fetch the task object for a specified task.
 
         Args:
-            task_id (int): The name assigned to the task object to retrieve.
+            task_name (str): The name assigned to the task object to retrieve.
 
         Returns:
             Task[Any]: A coroutine wrapped in a Future.
@@ -31,6 +149,8 @@ class AioTaskManager:
         task_name: str,
         execute_in: float,
         *coro_args: Any,
+        group: str = DEFAULT_GROUP,
+        timeout: Optional[float] = None,
     ) -> tuple[str, Task[Any]]:
         """Schedule the execution of a coroutine.
 
@@ -38,6 +158,13 @@ class AioTaskManager:
             coro_fn (Callable[..., Coroutine[Any, Any, Any]]): The coroutine to execute.
             task_name (str): The name of the task to execute.
             execute_in (float): The execution time delay.
+            group (str, optional): The group whose limit applies to the task.
+                Defaults to DEFAULT_GROUP.
+            timeout (Optional[float], optional): Seconds the task may run before it
+                is cancelled. Defaults to None, which uses the manager's timeout.
+
+        Raises:
+            PermissionError: Raised if a task with the same name is scheduled.
 
         Returns:
             tuple[str, Task[Any]]: The task name and `asyncio.Task` object.
@@ -45,29 +172,102 @@ class AioTaskManager:
         if task_name in self.tasks:
             raise PermissionError
 
-        async def wrapped_coro():
-            try:
+        loop = asyncio.get_running_loop()
+        record = TaskRecord(task_name, group, loop.time())
+        limit = self.timeout if timeout is None else timeout
+
+        async def wrapped_coro() -> Any:
+            if execute_in > 0:
                 await asyncio.sleep(execute_in)
-                return await coro_fn(*coro_args)
-            finally:
-                del self.tasks[task_name]
 
-        loop = asyncio.get_running_loop()
+            record.queued_at = loop.time()
+            async with _Slot(self._semaphore(None)), _Slot(self._semaphore(group)):
+                record.started_at = loop.time()
+                if limit is None:
+                    return await coro_fn(*coro_args)
+
+                inner = loop.create_task(coro_fn(*coro_args))
+                try:
+                    return await asyncio.wait_for(inner, limit)
+                except asyncio.TimeoutError:
+                    # The coroutine may raise `asyncio.TimeoutError` itself, and the
+                    # loop may fire the timeout a little early, so it only timed out
+                    # if `wait_for` cancelled it.
+                    if inner.cancelled():
+                        record.outcome = Outcome.TIMED_OUT
+                    raise
+
         task = loop.create_task(wrapped_coro(), name=task_name)
         self.tasks[task_name] = task
+        self.records[task_name] = record
+        # The callback also runs for tasks that are cancelled before they start, in
+        # which case the coroutine never runs.
+        task.add_done_callback(lambda task: self._finish(task, record))
         return task_name, task
 
+    def _finish(self, task: Task[Any], record: TaskRecord) -> None:
+        record.finished_at = asyncio.get_running_loop().time()
+
+        if task.cancelled():
+            record.outcome = Outcome.CANCELLED
+        elif task.exception() is not None:
+            if record.outcome is None:
+                record.outcome = Outcome.FAILED
+            logger.opt(exception=task.exception()).error(
+                f"task {record.name} {record.outcome.value}"
+            )
+        else:
+            record.outcome = Outcome.DONE
+
+        # The name may already belong to a task that replaced this one.
+        if self.tasks.get(record.name) is task:
+            del self.tasks[record.name]
+            del self.records[record.name]
+
+        self.stats.setdefault(record.group, TaskStats()).add(record)
+        self.history.append(record)
+
     async def stop_task(self, task_name: str) -> bool:
         """Stop a task running in the background.
 
+        The name is free to be used again as soon as this returns.
+
         Args:
-            task_id (int): Integer associated with a task object.
+            task_name (str): The name assigned to the task object to stop.
+
+        Returns:
+            bool: True if the task was scheduled, otherwise False.
         """
-        try:
-            task = self.tasks[task_name]
-            task.cancel()
-            del self.tasks[task_name]
-        except KeyError:
+        task = self.tasks.pop(task_name, None)
+
+        if task is None:
             return False
 
+        del self.records[task_name]
+        task.cancel()
         return True
+
+    async def close(self) -> None:
+        """Stop every task and wait for them to end."""
+        tasks = list(self.tasks.values())
+        for task_name in list(self.tasks):
+            await self.stop_task(task_name)
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class _Slot:
+    """Hold a semaphore, if there is one, for the duration of a block."""
+
+    __slots__ = ("_semaphore",)
+
+    def __init__(self, semaphore: Optional[asyncio.Semaphore]) -> None:
+        self._semaphore = semaphore
+
+    async def __aenter__(self) -> None:
+        if self._semaphore is not None:
+            await self._semaphore.acquire()
+
+    async def __aexit__(self, *_: Any) -> None:
+        if self._semaphore is not None:
+            self._semaphore.release()
@@ -7,10 +7,28 @@ operations.
 """
 import asyncio
 import functools
-from typing import Any, Awaitable, Callable
+from typing import Any, Awaitable, Callable, Iterator, Sequence, TypeVar
 
 SUPPORTED_DB = ("postgres://",)
 
+_T = TypeVar("_T")
+
+
+def chunked(items: Sequence[_T], size: int) -> Iterator[Sequence[_T]]:
+    """Split a sequence into consecutive slices.
+
+    Args:
+        items (Sequence[_T]): The sequence to split.
+        size (int): The maximum length of each slice.
+
+    Yields:
+        Iterator[Sequence[_T]]: Slices of the sequence, in order.
+    """
+    size = max(size, 1)
+    for start in range(0, len(items), size):
+        end = start + size
+        yield items[start:end]
+
 
 def format_db_url(database_url: str) -> str:
     """Format the default database URL to support async requests/transactions.
@@ -0,0 +1,104 @@
+"""Tests for `dayong.exts.apis`."""
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from aiohttp import web
+
+from dayong.exts.apis import RESTClient
+from dayong.exts.httpcache import ResponseCache
+
+BODY = (
+    b"["
+    + b",".join(b'{"canonical_url": "https://dev.to/%d"}' % i for i in range(2000))
+    + b"]"
+)
+
+
+async def serve(
+    handler: Callable[[web.Request], Awaitable[web.StreamResponse]],
+    test: Callable[[str], Awaitable[Any]],
+) -> Any:
+    app = web.Application()
+    app.router.add_get("/articles", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore
+    try:
+        return await test(f"http://127.0.0.1:{port}/articles")
+    finally:
+        await runner.cleanup()
+
+
+def test_stream_fills_cache_on_miss_and_revalidates():
+    requests: list[dict[str, str]] = []
+
+    async def handler(request: web.Request) -> web.StreamResponse:
+        requests.append(dict(request.headers))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304, headers={"ETag": '"v1"'})
+
+        response = web.StreamResponse(headers={"ETag": '"v1"'})
+        await response.prepare(request)
+        for start in range(0, len(BODY), 1000):
+            await response.write(BODY[start:][:1000])
+        return response
+
+    async def test(url: str) -> list[bytes]:
+        client = RESTClient(ResponseCache(":memory:"))
+        try:
+            bodies = []
+            for _ in range(2):
+                bodies.append(b"".join([chunk async for chunk in client.stream(url)]))
+            fields = await client.get_fields(url, "canonical_url")
+            assert fields[-1] == "https://dev.to/1999"
+            return bodies
+        finally:
+            await client.close()
+
+    bodies = asyncio.run(serve(handler, test))
+
+    assert bodies == [BODY, BODY]
+    assert "If-None-Match" not in requests[0]
+    assert [headers.get("If-None-Match") for headers in requests[1:]] == ['"v1"'] * 2
+
+
+def test_stream_serves_fresh_response_from_cache():
+    calls = 0
+
+    async def handler(request: web.Request) -> web.StreamResponse:
+        nonlocal calls
+        calls += 1
+        return web.Response(body=BODY, headers={"Cache-Control": "max-age=60"})
+
+    async def test(url: str) -> list[bytes]:
+        client = RESTClient(ResponseCache(":memory:"))
+        try:
+            return [
+                b"".join([chunk async for chunk in client.stream(url)])
+                for _ in range(3)
+            ]
+        finally:
+            await client.close()
+
+    assert asyncio.run(serve(handler, test)) == [BODY] * 3
+    assert calls == 1
+
+
+def test_stream_does_not_cache_unfinished_body():
+    async def handler(request: web.Request) -> web.StreamResponse:
+        return web.Response(body=BODY)
+
+    async def test(url: str) -> None:
+        cache = ResponseCache(":memory:")
+        client = RESTClient(cache)
+        try:
+            chunks = client.stream(url)
+            await chunks.__anext__()
+            await chunks.aclose()
+            assert await cache.get(url) is None
+        finally:
+            await client.close()
+
+    asyncio.run(serve(handler, test))
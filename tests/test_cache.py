@@ -0,0 +1,170 @@
+"""Tests for `dayong.cache`."""
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable
+
+import pytest
+
+from dayong import cache
+from dayong.cache import CachedDatabase, LRUCache
+from dayong.core.configs import DatabaseOptions
+from dayong.models import AnonMessage, ScheduledTask
+from dayong.operations import DatabaseImpl
+
+
+@pytest.fixture()
+def clock(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_lru_evicts_least_recently_used():
+    lru: LRUCache[int] = LRUCache(maxsize=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+
+    assert lru.get("a") == 1
+    lru.set("c", 3)
+
+    assert lru.get("b") is None
+    assert (lru.get("a"), lru.get("c")) == (1, 3)
+    assert (lru.stats.hits, lru.stats.misses, lru.stats.evictions) == (3, 1, 1)
+    assert lru.stats.size == len(lru) == 2
+
+
+def test_lru_entries_expire(clock: list[float]):
+    lru: LRUCache[int] = LRUCache()
+    lru.set("short", 1, ttl=10)
+    lru.set("forever", 2)
+
+    clock[0] += 10
+    assert lru.get("short") == 1
+
+    clock[0] += 0.1
+    assert lru.get("short") is None
+    assert lru.get("forever") == 2
+    assert lru.stats.size == 1
+
+
+def test_lru_invalidates_by_prefix():
+    lru: LRUCache[int] = LRUCache()
+    lru.set(("a", 1), 1)
+    lru.set(("a", 2), 2)
+    lru.set(("b", 1), 3)
+
+    lru.invalidate(("a",))
+    assert len(lru) == 1
+    assert lru.get(("b", 1)) == 3
+
+    lru.invalidate()
+    assert lru.stats.size == 0
+
+
+def task(channel_id: str = "1", name: str = "medium") -> ScheduledTask:
+    return ScheduledTask(
+        guild_id="1", channel_id=channel_id, channel_name="news", task_name=name
+    )
+
+
+def message(message_id: str) -> AnonMessage:
+    return AnonMessage(
+        message_id=message_id,
+        user_id="1",
+        username="user",
+        nickname="nick",
+        message="hello",
+    )
+
+
+def with_database(
+    tmp_path: Path, test: Callable[[CachedDatabase, DatabaseImpl], Awaitable[None]]
+) -> None:
+    config: Any = SimpleNamespace(
+        database_uri=f"sqlite+aiosqlite:///{tmp_path / 'dayong.db'}",
+        database=DatabaseOptions(),
+    )
+
+    async def run() -> None:
+        database = DatabaseImpl()
+        cached = CachedDatabase(database, {"scheduledtask": 60, "anon_messages": None})
+        await cached.connect(config)
+        try:
+            await test(cached, database)
+        finally:
+            await cached.disconnect()
+
+    asyncio.run(run())
+
+
+def test_reads_are_cached_until_a_write(tmp_path: Path):
+    async def test(cached: CachedDatabase, _: DatabaseImpl) -> None:
+        await cached.add_row(task())
+        assert (await cached.get_row(task(), "task_name")).one().channel_id == "1"
+        await cached.get_row(task(), "task_name")
+        assert cached.stats.hits == 1
+
+        await cached.add_row(task("2"))
+        rows = (await cached.get_row(task(), "task_name")).all()
+
+        assert sorted(row.channel_id for row in rows) == ["1", "2"]
+        assert cached.stats.hits == 1
+
+    with_database(tmp_path, test)
+
+
+def test_immutable_rows_outlive_adds(tmp_path: Path):
+    async def test(cached: CachedDatabase, _: DatabaseImpl) -> None:
+        # An empty result isn't cached, since the row may be added later.
+        assert not (await cached.get_row(message("1"), "message_id")).all()
+        await cached.add_row(message("1"))
+        assert (await cached.get_row(message("1"), "message_id")).one()
+
+        await cached.add_row(message("2"))
+        assert (await cached.get_row(message("1"), "message_id")).one()
+        assert cached.stats.hits == 1
+
+    with_database(tmp_path, test)
+
+
+def test_cached_rows_are_copies(tmp_path: Path):
+    async def test(cached: CachedDatabase, _: DatabaseImpl) -> None:
+        await cached.add_row(task())
+        row = (await cached.get_row(task(), "task_name")).one()
+        row.channel_name = "changed"
+
+        assert (await cached.get_row(task(), "task_name")).one().channel_name == "news"
+
+    with_database(tmp_path, test)
+
+
+def test_read_that_raced_a_write_isnt_cached(tmp_path: Path):
+    async def test(cached: CachedDatabase, database: DatabaseImpl) -> None:
+        await cached.add_row(task())
+        read_done, write_done = asyncio.Event(), asyncio.Event()
+        get_row = database.get_row
+
+        async def slow_get_row(table_model: Any, attribute: str) -> Any:
+            result = await get_row(table_model, attribute)
+            read_done.set()
+            await write_done.wait()
+            return result
+
+        database.get_row = slow_get_row  # type: ignore
+
+        async def write() -> None:
+            await read_done.wait()
+            await cached.update_rows(
+                ScheduledTask, "task_name", ["medium"], {"channel_name": "renamed"}
+            )
+            write_done.set()
+
+        stale, _ = await asyncio.gather(cached.get_row(task(), "task_name"), write())
+        database.get_row = get_row  # type: ignore
+
+        assert stale.one().channel_name == "news"
+        row = (await cached.get_row(task(), "task_name")).one()
+        assert row.channel_name == "renamed"
+
+    with_database(tmp_path, test)
@@ -0,0 +1,70 @@
+"""Tests for `dayong.channels`."""
+from dayong.channels import ChannelIndex
+
+
+def test_lookups():
+    index: ChannelIndex[str] = ChannelIndex()
+    index.put(1, 10, "general", "a")
+    index.put(1, 11, "news", "b")
+
+    assert len(index) == 2
+    assert 1 in index and 2 not in index
+    assert index.get(11) == "b"
+    assert index.get_by_name(1, "general") == "a"
+    assert index.get_by_name(2, "general") is None
+    assert index.search(1, "ew") == "b"
+    assert index.search(1, "nothing") is None
+
+
+def test_remove_falls_back_to_channel_with_same_name():
+    index: ChannelIndex[str] = ChannelIndex()
+    index.put(1, 10, "general", "a")
+    index.put(1, 11, "general", "b")
+    index.put(1, 12, "general", "c")
+    assert index.get_by_name(1, "general") == "a"
+
+    index.remove(11)
+    assert index.get_by_name(1, "general") == "a"
+    index.remove(10)
+    assert index.get_by_name(1, "general") == "c"
+    index.remove(12)
+    assert index.get_by_name(1, "general") is None
+    assert index.get(12) is None
+
+    index.remove(12)
+    assert len(index) == 0
+
+
+def test_rename():
+    index: ChannelIndex[str] = ChannelIndex()
+    index.put(1, 10, "general", "a")
+    index.put(1, 10, "lobby", "a")
+
+    assert index.get_by_name(1, "general") is None
+    assert index.get_by_name(1, "lobby") == "a"
+    assert len(index) == 1
+
+
+def test_remove_guild():
+    index: ChannelIndex[str] = ChannelIndex()
+    index.put(1, 10, "general", "a")
+    index.put(1, 11, "general", "b")
+    index.put(2, 20, "general", "c")
+
+    index.remove_guild(1)
+
+    assert 1 not in index
+    assert index.get(10) is None and index.get(11) is None
+    assert index.get_by_name(2, "general") == "c"
+    assert len(index) == 1
+
+
+def test_searches_are_forgotten_on_change():
+    index: ChannelIndex[str] = ChannelIndex()
+    assert index.search(1, "gen") is None
+
+    index.put(1, 10, "general", "a")
+    assert index.search(1, "gen") == "a"
+
+    index.remove(10)
+    assert index.search(1, "gen") is None
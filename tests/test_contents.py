@@ -0,0 +1,55 @@
+"""Tests for `dayong.exts.contents`."""
+import asyncio
+import json
+from typing import Any, AsyncIterator
+
+import pytest
+
+from dayong.exts.contents import iter_json_array
+
+DOCUMENT = [
+    {"canonical_url": "https://dev.to/a", "tags": ["python", "]"]},
+    'a string with "quotes", commas, and ] brackets',
+    "non-ascii ✓ text",
+    -0.5,
+    12,
+    1e-3,
+    True,
+    None,
+    [1, [2, []]],
+    {},
+]
+
+
+async def chunked(data: bytes, size: int) -> AsyncIterator[bytes]:
+    for start in range(0, len(data), size):
+        yield data[start:][:size]
+
+
+def decode(data: bytes, size: int) -> list[Any]:
+    async def run() -> list[Any]:
+        return [item async for item in iter_json_array(chunked(data, size))]
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 4096])
+def test_items_split_across_chunks(size: int):
+    data = json.dumps(DOCUMENT, ensure_ascii=False, indent=1).encode()
+
+    assert decode(data, size) == DOCUMENT
+
+
+@pytest.mark.parametrize("size", [1, 4096])
+def test_empty_array(size: int):
+    assert decode(b" [ ] ", size) == []
+
+
+def test_rejects_other_documents():
+    with pytest.raises(ValueError):
+        decode(b'{"items": []}', 4096)
+
+
+def test_rejects_unterminated_array():
+    with pytest.raises(ValueError):
+        decode(b"[1, 2", 1)
@@ -0,0 +1,132 @@
+"""Tests for `dayong.delivery`."""
+import asyncio
+from typing import AsyncIterator, Iterable
+
+import pytest
+
+from dayong.delivery import (
+    MAX_CONTENT_LENGTH,
+    MAX_EMBED_FIELDS,
+    MAX_EMBEDS,
+    MAX_EMBEDS_LENGTH,
+    Batch,
+    DeliveryMode,
+    pack,
+    pack_embeds,
+    pack_stream,
+    pack_text,
+)
+
+URLS = [f"https://example.com/articles/{number}" for number in range(500)]
+
+
+def delivered(batches: Iterable[Batch]) -> list[str]:
+    return [item for batch in batches for item in batch.items]
+
+
+def test_pack_text_fills_messages():
+    batches = list(pack_text(URLS))
+
+    assert delivered(batches) == URLS
+    assert all(
+        batch.content and len(batch.content) <= MAX_CONTENT_LENGTH for batch in batches
+    )
+    # Every message but the last is too full for the next item.
+    for batch, following in zip(batches, batches[1:]):
+        assert batch.content is not None
+        assert len(batch.content) + 1 + len(following.items[0]) > MAX_CONTENT_LENGTH
+
+
+def test_pack_text_splits_long_items():
+    item = "x" * 25
+
+    batches = list(pack_text(["a", item], limit=10))
+
+    assert [batch.content for batch in batches] == ["a", "x" * 10, "x" * 10, "x" * 5]
+    assert delivered(batches) == ["a", item]
+
+
+def test_pack_drip_sends_one_item_per_message():
+    batches = list(pack(URLS[:3], DeliveryMode.DRIP))
+
+    assert [batch.content for batch in batches] == URLS[:3]
+    assert [batch.items for batch in batches] == [[url] for url in URLS[:3]]
+
+
+def test_pack_embeds_respects_limits():
+    items = URLS + ["y" * 3000]
+
+    batches = list(pack_embeds(items))
+
+    assert delivered(batches) == items
+    for batch in batches:
+        assert len(batch.embeds) <= MAX_EMBEDS
+        assert all(len(fields) <= MAX_EMBED_FIELDS for fields in batch.embeds)
+        assert (
+            sum(
+                len(name) + len(value)
+                for fields in batch.embeds
+                for name, value in fields
+            )
+            <= MAX_EMBEDS_LENGTH
+        )
+
+
+def test_pack_empty():
+    for mode in DeliveryMode:
+        assert not list(pack([], mode))
+
+
+async def trickle(items: Iterable[str], delay: float) -> AsyncIterator[str]:
+    for item in items:
+        await asyncio.sleep(delay)
+        yield item
+
+
+async def collect(batches: AsyncIterator[Batch]) -> list[Batch]:
+    return [batch async for batch in batches]
+
+
+@pytest.mark.parametrize("mode", list(DeliveryMode))
+def test_pack_stream_matches_pack(mode: DeliveryMode):
+    async def source() -> AsyncIterator[str]:
+        for url in URLS:
+            yield url
+
+    batches = asyncio.run(collect(pack_stream(source(), mode)))
+
+    assert batches == list(pack(URLS, mode))
+
+
+def test_pack_stream_sends_partial_message_after_linger():
+    async def run() -> list[tuple[float, list[str]]]:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        return [
+            (loop.time() - start, batch.items)
+            async for batch in pack_stream(
+                trickle(URLS[:2], 0.2), DeliveryMode.DIGEST, linger=0.05
+            )
+        ]
+
+    sent = asyncio.run(run())
+
+    assert [items for _, items in sent] == [URLS[:1], URLS[1:2]]
+    # The first item went out before the second one arrived.
+    assert sent[0][0] < 0.4
+
+
+def test_pack_stream_flushes_pending_items_on_error():
+    async def failing() -> AsyncIterator[str]:
+        for url in URLS[:150]:
+            yield url
+        raise RuntimeError("fetch failed")
+
+    async def run() -> list[Batch]:
+        batches: list[Batch] = []
+        with pytest.raises(RuntimeError):
+            async for batch in pack_stream(failing(), DeliveryMode.DIGEST, linger=10):
+                batches.append(batch)
+        return batches
+
+    assert delivered(asyncio.run(run())) == URLS[:150]
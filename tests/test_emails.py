@@ -0,0 +1,40 @@
+"""Tests for `dayong.exts.emails`."""
+import base64
+import quopri
+
+from dayong.exts.emails import EmailClient
+
+ARTICLE = "https://medium.com/@writer/a-story-about-parsing-1a2b3c"
+HTML = (
+    f'<a href="{ARTICLE}?source=email">A story</a> by '
+    '<a href="https://medium.com/@writer">writer</a> '
+    '<a href="https://medium.com/m/signin">Sign in</a> '
+    f'<a href="{ARTICLE}">Read more</a>'
+)
+
+
+def test_extract_mime_url_decodes_quoted_printable():
+    # The encoder breaks lines every 76 characters, splitting the links.
+    message = b"Subject: Medium Daily Digest\r\n\r\n" + quopri.encodestring(
+        HTML.encode()
+    )
+    assert b"=\n" in message
+
+    assert EmailClient.extract_mime_url(message) == [ARTICLE]
+
+
+def test_extract_urls_keeps_articles_in_order():
+    other = "https://medium.com/@someone/another-story-4d5e6f"
+    html = f'<a href="{other}">Another</a> {HTML}'.encode()
+
+    assert EmailClient.extract_urls(html) == [other, ARTICLE]
+
+
+def test_decode_part():
+    data = HTML.encode()
+
+    assert EmailClient.decode_part(base64.b64encode(data), "base64") == data
+    assert (
+        EmailClient.decode_part(quopri.encodestring(data), "quoted-printable") == data
+    )
+    assert EmailClient.decode_part(data, "7bit") == data
@@ -0,0 +1,131 @@
+"""Tests for `dayong.greetings`."""
+import asyncio
+from typing import Any
+
+import pytest
+
+from dayong.greetings import GreetingCoalescer, GreetingTemplate
+
+EMBEDDINGS: dict[str, Any] = {
+    "readme_channel_id": 42,
+    "description": "**Welcome to {}, <@!{}>!** Check the <#{}> channel.",
+    "color": 11828958,
+    "greetings_field": {
+        "0": {"name": "Website", "value": "[example.com](https://example.com)"},
+        "1": {"name": "GitHub", "value": "[example](https://github.com/example)"},
+    },
+}
+
+
+def compile_description(description: str) -> GreetingTemplate:
+    return GreetingTemplate.compile({**EMBEDDINGS, "description": description})
+
+
+def test_compile_splits_description_into_slots():
+    template = GreetingTemplate.compile(EMBEDDINGS)
+
+    assert template.description == (
+        "**Welcome to ",
+        0,
+        ", ",
+        1,
+        "!** Check the <#42> channel.",
+    )
+    assert template.mention_members
+    assert template.fields == (
+        ("Website", "[example.com](https://example.com)"),
+        ("GitHub", "[example](https://github.com/example)"),
+    )
+
+
+def test_render_mentions_every_member():
+    embed = GreetingTemplate.compile(EMBEDDINGS).render("Guild", [1, 2])
+
+    assert embed.description == (
+        "**Welcome to Guild, <@!1>, <@!2>!** Check the <#42> channel."
+    )
+    assert embed.color == 11828958
+
+
+@pytest.mark.parametrize(
+    ("description", "rendered"),
+    [
+        # A mention without the nickname marker.
+        ("Hi <@{1}> in {0}", "Hi <@!1>, <@!2> in Guild"),
+        # Explicit positions in any order, and the readme channel twice.
+        ("{2} {1} {0} {2}", "42 1, 2 Guild 42"),
+        # Escaped braces aren't slots.
+        ("{{{}}} <@!{}>", "{Guild} <@!1>, <@!2>"),
+        # A mention prefix with nothing to close it.
+        ("<@!{}>", "<@!Guild>"),
+        ("No slots at all", "No slots at all"),
+    ],
+)
+def test_render_edge_cases(description: str, rendered: str):
+    template = compile_description(description)
+
+    assert template.render("Guild", [1, 2]).description == rendered
+
+
+def test_member_slot_without_mention():
+    template = compile_description("Say hi to {1} in {0}")
+
+    assert not template.mention_members
+    assert template.render("Guild", [1, 2]).description == "Say hi to 1, 2 in Guild"
+
+
+def test_fields_may_be_a_list():
+    template = GreetingTemplate.compile(
+        {**EMBEDDINGS, "greetings_field": [{"name": "a", "value": "b"}]}
+    )
+
+    assert template.fields == (("a", "b"),)
+
+
+def test_coalescer_batches_joins_within_window():
+    sent: list[tuple[str, list[int]]] = []
+
+    def sender(key: str) -> Any:
+        async def send(batch: list[int]) -> None:
+            sent.append((key, batch))
+
+        return send
+
+    async def run() -> None:
+        coalescer = GreetingCoalescer(window=0.05, max_batch_size=3)
+        for member_id in range(1, 5):
+            coalescer.add("a", member_id, sender("a"))
+        coalescer.add("b", 10, sender("b"))
+        await asyncio.sleep(0)
+        # The full batch goes out right away.
+        assert sent == [("a", [1, 2, 3])]
+
+        await asyncio.sleep(0.1)
+        coalescer.add("a", 5, sender("a"))
+        await coalescer.close()
+
+    asyncio.run(run())
+
+    assert sent == [("a", [1, 2, 3]), ("a", [4]), ("b", [10]), ("a", [5])]
+
+
+def test_coalescer_survives_failed_sends():
+    sent: list[list[int]] = []
+
+    async def fail(batch: list[int]) -> None:
+        raise RuntimeError("unexpected")
+
+    async def send(batch: list[int]) -> None:
+        sent.append(batch)
+
+    async def run() -> None:
+        coalescer = GreetingCoalescer(window=0.01, max_batch_size=10)
+        coalescer.add("a", 1, fail)
+        await asyncio.sleep(0.05)
+        coalescer.add("a", 2, send)
+        coalescer.add("a", 3, send)
+        await coalescer.close()
+
+    asyncio.run(run())
+
+    assert sent == [[2, 3]]
@@ -0,0 +1,25 @@
+"""Tests for `dayong.exts.httpcache`."""
+import asyncio
+
+from dayong.exts.httpcache import CachedResponse, ResponseCache
+
+
+def test_large_bodies_are_only_stored_on_disk():
+    async def run() -> None:
+        cache = ResponseCache(":memory:", max_body_size=4)
+        try:
+            await cache.set(CachedResponse("small", b"1234"))
+            await cache.set(CachedResponse("large", b"12345"))
+            assert cache.stats.size == 1
+
+            assert (await cache.get("large")).body == b"12345"  # type: ignore
+            assert cache.stats.size == 1
+
+            # A body that outgrows the limit replaces the one kept in memory.
+            await cache.set(CachedResponse("small", b"123456"))
+            assert cache.stats.size == 0
+            assert (await cache.get("small")).body == b"123456"  # type: ignore
+        finally:
+            cache.close()
+
+    asyncio.run(run())
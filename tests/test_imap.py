@@ -0,0 +1,53 @@
+"""Tests for `dayong.exts.imap`."""
+from dayong.exts.imap import Response, find_part, parse_fetch, parse_list, quote
+
+# A multipart/alternative message with a plain text and an HTML part, followed by
+# an attachment.
+STRUCTURE = (
+    b'(("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "QUOTED-PRINTABLE" 120 4 NIL NIL '
+    b'NIL)("TEXT" "HTML" ("CHARSET" "utf-8") NIL NIL "BASE64" 2048 26 NIL NIL NIL) '
+    b'"ALTERNATIVE" ("BOUNDARY" "b1") NIL NIL)'
+)
+
+
+def test_parse_list():
+    assert parse_list(b'(FLAGS (\\Seen) UID 7 X NIL "a \\"b\\"")') == [
+        [b"FLAGS", [b"\\Seen"], b"UID", b"7", b"X", None, b'a "b"']
+    ]
+
+
+def test_parse_list_keeps_section_specifiers():
+    assert parse_list(b"(BODY[HEADER.FIELDS (SUBJECT)] {5})", [b"hello"]) == [
+        [b"BODY[HEADER.FIELDS (SUBJECT)]", b"hello"]
+    ]
+
+
+def test_parse_fetch():
+    response = Response(b"* 3 FETCH (UID 12 BODY[1] {5})", [b"hello"])
+
+    assert parse_fetch(response) == {"UID": b"12", "BODY[1]": b"hello"}
+    assert parse_fetch(Response(b"* 3 EXISTS")) is None
+
+
+def test_find_part():
+    structure = parse_list(STRUCTURE)[0]
+
+    assert find_part(structure, "text/html") == ("2", "base64")
+    assert find_part(structure, "text/plain") == ("1", "quoted-printable")
+    assert find_part(structure, "image/png") is None
+
+
+def test_find_part_of_single_part_message():
+    structure = parse_list(b'("TEXT" "HTML" NIL NIL NIL "7BIT" 10 1 NIL NIL NIL)')[0]
+
+    assert find_part(structure, "text/html") == ("1", "7bit")
+
+
+def test_find_part_in_nested_multipart():
+    structure = parse_list(b"(" + STRUCTURE + b' "MIXED")')[0]
+
+    assert find_part(structure, "text/html") == ("1.2", "base64")
+
+
+def test_quote():
+    assert quote('Medium "Daily" \\ Digest') == '"Medium \\"Daily\\" \\\\ Digest"'
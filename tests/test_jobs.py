@@ -0,0 +1,74 @@
+"""Tests for `dayong.tasks.jobs`."""
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import pytest
+from apscheduler.triggers.cron import CronTrigger
+
+from dayong.models import JobSchedule
+from dayong.tasks.jobs import JobStore, to_utc
+
+CRON = "0 0 * * *"
+GRACE = 3600.0
+
+
+@pytest.fixture()
+def store() -> JobStore:
+    database: Any = None
+    scheduler: Any = None
+    return JobStore(database, scheduler, misfire_grace_time=GRACE, catch_up_interval=30)
+
+
+def stored(store: JobStore, name: str, next_run: datetime, cron: str = CRON) -> None:
+    store._schedules[name] = JobSchedule(
+        name=name, cron=cron, next_run_at=to_utc(next_run)
+    )
+
+
+def first_run(store: JobStore, name: str) -> datetime:
+    return store.first_run(name, CronTrigger.from_crontab(CRON, timezone="UTC"), CRON)
+
+
+def upcoming() -> datetime:
+    now = datetime.now(timezone.utc)
+    return CronTrigger.from_crontab(CRON, timezone="UTC").get_next_fire_time(None, now)
+
+
+def test_new_job_starts_at_next_fire_time(store: JobStore):
+    assert first_run(store, "digest") == upcoming()
+
+
+def test_stored_future_run_is_kept(store: JobStore):
+    next_run = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(hours=2)
+    stored(store, "digest", next_run)
+
+    assert first_run(store, "digest") == next_run
+
+
+def test_missed_runs_are_caught_up_on_and_spread_apart(store: JobStore):
+    missed = datetime.now(timezone.utc) - timedelta(minutes=10)
+    for name in ("a", "b", "c"):
+        stored(store, name, missed)
+
+    start = datetime.now(timezone.utc)
+    runs = [first_run(store, name) - start for name in ("a", "b", "c")]
+
+    for number, delay in enumerate(runs):
+        assert delay.total_seconds() == pytest.approx(number * 30, abs=1)
+
+
+def test_run_missed_beyond_grace_time_is_skipped(store: JobStore):
+    stored(store, "digest", datetime.now(timezone.utc) - timedelta(seconds=GRACE * 2))
+
+    assert first_run(store, "digest") == upcoming()
+
+
+def test_changed_schedule_starts_at_next_fire_time(store: JobStore):
+    stored(
+        store,
+        "digest",
+        datetime.now(timezone.utc) + timedelta(minutes=10),
+        cron="*/5 * * * *",
+    )
+
+    assert first_run(store, "digest") == upcoming()
@@ -0,0 +1,34 @@
+"""Tests for `dayong.ledger`."""
+import pytest
+
+from dayong.ledger import content_key, normalize_url
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://medium.com/@user/post-123",
+        "HTTPS://Medium.com:443/@user/post-123/",
+        "https://medium.com/@user/post-123?source=email&sk=abc#comments",
+        "https://medium.com/@user/post-123?utm_source=digest&utm_medium=email",
+        "  https://medium.com/@user/post-123  ",
+    ],
+)
+def test_normalize_url_drops_noise(url: str):
+    assert normalize_url(url) == "https://medium.com/@user/post-123"
+
+
+def test_normalize_url_keeps_meaningful_parts():
+    assert (
+        normalize_url("http://example.com:8080/a?b=2&a=1&fbclid=x")
+        == "http://example.com:8080/a?a=1&b=2"
+    )
+    assert normalize_url("https://example.com") == "https://example.com/"
+
+
+def test_content_key():
+    key = content_key(1, "https://medium.com/@user/post-123?source=email")
+
+    assert key == content_key(1, "https://medium.com/@user/post-123/")
+    assert key != content_key(2, "https://medium.com/@user/post-123")
+    assert -(2 ** 63) <= key < 2 ** 63
@@ -0,0 +1,154 @@
+"""Tests for `dayong.tasks.manager`."""
+import asyncio
+import time
+
+import pytest
+
+from dayong.tasks.manager import AioTaskManager, Outcome, TaskRecord, TaskStats
+
+
+async def wait_for_tasks(manager: AioTaskManager) -> None:
+    while manager.tasks:
+        await asyncio.gather(*manager.tasks.values(), return_exceptions=True)
+    # Let the done callbacks run.
+    await asyncio.sleep(0)
+
+
+def test_concurrency_limits():
+    running = {"all": 0, "small": 0}
+    peak = {"all": 0, "small": 0}
+
+    async def work(group: str) -> None:
+        running["all"] += 1
+        running[group] = running.get(group, 0) + 1
+        peak["all"] = max(peak["all"], running["all"])
+        peak[group] = max(peak.get(group, 0), running[group])
+        await asyncio.sleep(0.01)
+        running["all"] -= 1
+        running[group] -= 1
+
+    async def run() -> AioTaskManager:
+        manager = AioTaskManager(concurrency=3, group_limits={"small": 1})
+        for number in range(10):
+            group = "small" if number % 2 else "default"
+            await manager.start_task(work, f"task {number}", 0, group, group=group)
+        await wait_for_tasks(manager)
+        return manager
+
+    manager = asyncio.run(run())
+
+    assert peak == {"all": 3, "small": 1, "default": 2}
+    assert manager.stats["small"].count == manager.stats["default"].count == 5
+    assert manager.stats["small"].max_queue_wait > 0
+
+
+def test_outcomes_are_recorded_and_tasks_cleaned_up():
+    async def fail(error: type[Exception]) -> None:
+        raise error("failed")
+
+    async def run() -> AioTaskManager:
+        manager = AioTaskManager()
+        await manager.start_task(asyncio.sleep, "done", 0, 0)
+        await manager.start_task(fail, "failed", 0, RuntimeError)
+        await manager.start_task(
+            fail, "raised timeout", 0, asyncio.TimeoutError, timeout=1
+        )
+        await manager.start_task(asyncio.sleep, "timed out", 0, 1, timeout=0.01)
+        _, cancelled = await manager.start_task(asyncio.sleep, "cancelled", 0, 1)
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await wait_for_tasks(manager)
+        return manager
+
+    manager = asyncio.run(run())
+
+    assert not manager.tasks and not manager.records and manager.running == 0
+    assert {record.name: record.outcome for record in manager.history} == {
+        "done": Outcome.DONE,
+        "failed": Outcome.FAILED,
+        "raised timeout": Outcome.FAILED,
+        "timed out": Outcome.TIMED_OUT,
+        "cancelled": Outcome.CANCELLED,
+    }
+    assert manager.stats["default"].count == 5
+
+
+def test_duplicate_names_are_rejected():
+    async def run() -> None:
+        manager = AioTaskManager()
+        await manager.start_task(asyncio.sleep, "task", 0, 1)
+        with pytest.raises(PermissionError):
+            await manager.start_task(asyncio.sleep, "task", 0, 1)
+        await manager.close()
+
+    asyncio.run(run())
+
+
+def test_stopped_name_can_be_reused_before_callback_runs():
+    async def run() -> None:
+        manager = AioTaskManager()
+        _, old = await manager.start_task(asyncio.sleep, "task", 0, 1)
+        await asyncio.sleep(0)
+
+        assert await manager.stop_task("task")
+        _, new = await manager.start_task(asyncio.sleep, "task", 0, 1)
+        # The stopped task's done callback runs now.
+        await asyncio.gather(old, return_exceptions=True)
+        await asyncio.sleep(0)
+
+        assert old.cancelled()
+        assert manager.tasks == {"task": new}
+        assert "task" in manager.records
+        assert not await manager.stop_task("missing")
+        await manager.close()
+        assert new.cancelled()
+
+    asyncio.run(run())
+
+
+def test_execution_delay_isnt_queue_wait():
+    async def run() -> TaskRecord:
+        manager = AioTaskManager()
+        await manager.start_task(asyncio.sleep, "task", 0.05, 0)
+        await wait_for_tasks(manager)
+        return manager.history[-1]
+
+    record = asyncio.run(run())
+
+    assert record.queued_at is not None
+    # The event loop may run a timer up to one clock tick early.
+    assert record.queued_at - record.created_at >= 0.05 - 0.01
+    assert record.queue_wait < 0.05
+
+
+def test_task_stats():
+    stats = TaskStats()
+    stats.add(TaskRecord("a", "g", 0, 1, 3, 7, Outcome.DONE))
+    stats.add(TaskRecord("b", "g", 0, 1, 2, 3, Outcome.FAILED))
+    # Cancelled before it started.
+    stats.add(TaskRecord("c", "g", 0, 1, None, 5, Outcome.CANCELLED))
+
+    assert stats.count == 3
+    assert stats.outcomes[Outcome.DONE] == 1
+    assert (stats.queue_wait, stats.max_queue_wait) == (7, 4)
+    assert (stats.run_time, stats.max_run_time) == (5, 4)
+
+
+def test_thousands_of_short_tasks():
+    async def run(manager: AioTaskManager, count: int) -> float:
+        start = time.perf_counter()
+        for number in range(count):
+            await manager.start_task(asyncio.sleep, str(number), 0, 0)
+        await wait_for_tasks(manager)
+        return (time.perf_counter() - start) / count
+
+    few = asyncio.run(run(AioTaskManager(concurrency=50), 1000))
+    manager = AioTaskManager(concurrency=50, history=100)
+    many = asyncio.run(run(manager, 8000))
+
+    assert manager.stats["default"].outcomes[Outcome.DONE] == 8000
+    assert not manager.tasks and not manager.records
+    assert len(manager.history) == 100
+    # Bookkeeping is constant time per task, so the time per task doesn't grow with
+    # the number of tasks.
+    assert many < few * 3
@@ -0,0 +1,148 @@
+"""Tests for `dayong.operations`."""
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Iterator
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, SQLModel
+
+from dayong.cache import CachedDatabase
+from dayong.core.configs import DatabaseOptions
+from dayong.models import AnonMessage
+from dayong.operations import DatabaseImpl, WriteBehindQueue
+
+
+@pytest.fixture()
+def engine() -> Iterator[Engine]:
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine, tables=[AnonMessage.__table__])  # type: ignore
+    yield engine
+    engine.dispose()
+
+
+def message(message_id: str) -> AnonMessage:
+    return AnonMessage(
+        message_id=message_id,
+        user_id="1",
+        username="user",
+        nickname="nick",
+        message="hello",
+    )
+
+
+def stored_ids(engine: Engine) -> list[str]:
+    with engine.connect() as conn:
+        return list(conn.execute(select(AnonMessage.message_id)).scalars())
+
+
+class Inserter:
+    """Insert rows into the SQLite database, failing the first `failures` calls."""
+
+    def __init__(self, engine: Engine, failures: int = 0) -> None:
+        self.engine = engine
+        self.failures = failures
+        self.calls = 0
+
+    async def __call__(self, rows: list[SQLModel]) -> None:
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database is down")
+
+        with Session(self.engine) as session:
+            session.add_all(rows)
+            session.commit()
+
+
+def test_flush_inserts_in_batches(engine: Engine):
+    insert_rows = Inserter(engine)
+    queue = WriteBehindQueue(insert_rows, batch_size=2, interval=60)
+
+    async def run() -> None:
+        for number in range(5):
+            await queue.put(message(str(number)))
+        assert [row.message_id for row in queue.find_all()] == list("01234")
+        assert queue.find("message_id", "3")[0].message_id == "3"
+        await queue.flush()
+
+    asyncio.run(run())
+
+    assert len(queue) == 0
+    assert insert_rows.calls == 3
+    assert stored_ids(engine) == list("01234")
+
+
+def test_failed_batch_is_kept(engine: Engine):
+    queue = WriteBehindQueue(Inserter(engine, failures=1), batch_size=10, interval=60)
+
+    async def run() -> None:
+        await queue.put(message("1"))
+        with pytest.raises(ConnectionError):
+            await queue.flush()
+        assert len(queue) == 1
+        await queue.flush()
+
+    asyncio.run(run())
+
+    assert stored_ids(engine) == ["1"]
+
+
+def test_rows_violating_constraints_are_dropped(engine: Engine):
+    queue = WriteBehindQueue(Inserter(engine), batch_size=10, interval=60)
+
+    async def run() -> None:
+        for message_id in ("1", "2", "1", "3"):
+            await queue.put(message(message_id))
+        await queue.flush()
+
+    asyncio.run(run())
+
+    assert len(queue) == 0
+    assert sorted(stored_ids(engine)) == ["1", "2", "3"]
+
+
+def test_full_buffer_is_flushed_in_background(engine: Engine):
+    queue = WriteBehindQueue(Inserter(engine), batch_size=3, interval=60)
+
+    async def run() -> None:
+        queue.start()
+        for number in range(3):
+            await queue.put(message(str(number)))
+        await asyncio.sleep(0.05)
+        assert len(queue) == 0
+        await queue.put(message("3"))
+        await queue.close()
+
+    asyncio.run(run())
+
+    assert stored_ids(engine) == list("0123")
+
+
+def test_shared_engine_outlives_other_holders(tmp_path: Path):
+    config: Any = SimpleNamespace(
+        database_uri=f"sqlite+aiosqlite:///{tmp_path / 'dayong.db'}",
+        database=DatabaseOptions(),
+    )
+
+    async def run() -> None:
+        first, second = DatabaseImpl(), DatabaseImpl()
+        await first.connect(config)
+        await second.connect(config)
+        engine = first._conn
+        assert second._conn is engine
+
+        await first.disconnect()
+        assert DatabaseImpl._engines[config.database_uri] is engine
+        await second.add_row(message("1"))
+        assert await second.count_rows(AnonMessage) == 1
+        assert second.pool_stats.acquired > 0
+        assert CachedDatabase(second, {}).pool_stats == second.pool_stats
+
+        await second.disconnect()
+        assert config.database_uri not in DatabaseImpl._engines
+        assert engine not in DatabaseImpl._holders
+
+    asyncio.run(run())
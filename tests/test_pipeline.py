@@ -0,0 +1,180 @@
+"""Tests for `dayong.pipeline`."""
+import asyncio
+from typing import AsyncIterator
+
+import pytest
+
+from dayong.pipeline import Broadcast, Pipeline, Stage
+
+
+async def numbers(count: int, fail: bool = False) -> AsyncIterator[int]:
+    for number in range(count):
+        await asyncio.sleep(0)
+        yield number
+    if fail:
+        raise RuntimeError("source failed")
+
+
+def test_stage_yields_source_items():
+    async def run() -> list[int]:
+        stage = Stage("numbers", numbers(100), maxsize=4)
+        items = [item async for item in stage]
+        assert stage.stats.items == 100
+        return items
+
+    assert asyncio.run(run()) == list(range(100))
+
+
+def test_stage_runs_ahead_by_its_queue_size():
+    async def run() -> int:
+        produced = 0
+
+        async def source() -> AsyncIterator[int]:
+            nonlocal produced
+            for number in range(100):
+                produced += 1
+                yield number
+
+        stage = Stage("numbers", source(), maxsize=4)
+        await stage.__anext__()
+        await asyncio.sleep(0.05)
+        await stage.aclose()
+        return produced
+
+    # The consumed item, a full queue and the item waiting for room.
+    assert asyncio.run(run()) <= 6
+
+
+def test_stage_raises_source_error_after_items():
+    async def run() -> list[int]:
+        items: list[int] = []
+        with pytest.raises(RuntimeError):
+            async for item in Stage("numbers", numbers(3, fail=True)):
+                items.append(item)
+        return items
+
+    assert asyncio.run(run()) == [0, 1, 2]
+
+
+def test_stage_timeout():
+    async def slow() -> AsyncIterator[int]:
+        await asyncio.sleep(1)
+        yield 0
+
+    async def run() -> None:
+        with pytest.raises(asyncio.TimeoutError):
+            await Stage("slow", slow(), timeout=0.05).__anext__()
+
+    asyncio.run(run())
+
+
+def test_stage_timeout_covers_every_item():
+    async def trickle() -> AsyncIterator[int]:
+        for number in range(10):
+            await asyncio.sleep(0.05)
+            yield number
+
+    async def run() -> list[int]:
+        items: list[int] = []
+        with pytest.raises(asyncio.TimeoutError):
+            async for item in Stage("trickle", trickle(), timeout=0.125):
+                items.append(item)
+        return items
+
+    # Each item comes well within the timeout, but not all of them.
+    assert asyncio.run(run()) == [0, 1]
+
+
+def test_stage_timeout_excludes_time_blocked_on_consumer():
+    async def run() -> list[int]:
+        items: list[int] = []
+        async for item in Stage("numbers", numbers(5), maxsize=1, timeout=0.1):
+            items.append(item)
+            await asyncio.sleep(0.05)
+        return items
+
+    assert asyncio.run(run()) == list(range(5))
+
+
+def test_pipeline_chains_stages():
+    async def run() -> list[int]:
+        pipeline = Pipeline(maxsize=2)
+        source = pipeline.stage("numbers", numbers(10))
+
+        async def doubled() -> AsyncIterator[int]:
+            async for number in source:
+                yield number * 2
+
+        items = [item async for item in pipeline.stage("doubled", doubled())]
+        await pipeline.close()
+        assert [stats.items for stats in pipeline.stats] == [10, 10]
+        return items
+
+    assert asyncio.run(run()) == [number * 2 for number in range(10)]
+
+
+def test_broadcast_feeds_every_subscription():
+    async def run() -> list[list[int]]:
+        broadcast = Broadcast(numbers(50), maxsize=2)
+        first, second = broadcast.subscribe(), broadcast.subscribe()
+
+        async def consume(subscription: AsyncIterator[int]) -> list[int]:
+            return [item async for item in subscription]
+
+        return await asyncio.gather(consume(first), consume(second))
+
+    assert asyncio.run(run()) == [list(range(50)), list(range(50))]
+
+
+def test_broadcast_carries_on_without_closed_subscription():
+    async def run() -> list[int]:
+        broadcast = Broadcast(numbers(50), maxsize=2)
+        first, second = broadcast.subscribe(), broadcast.subscribe()
+
+        async def stop_early() -> None:
+            async for item in first:
+                if item == 3:
+                    await first.aclose()
+
+        async def consume() -> list[int]:
+            return [item async for item in second]
+
+        _, items = await asyncio.gather(stop_early(), consume())
+        assert first.items == 4
+        return items
+
+    assert asyncio.run(run()) == list(range(50))
+
+
+def test_broadcast_raises_source_error_to_every_subscription():
+    async def run() -> None:
+        broadcast = Broadcast(numbers(3, fail=True))
+        subscriptions = [broadcast.subscribe(), broadcast.subscribe()]
+
+        async def consume(subscription: AsyncIterator[int]) -> list[int]:
+            items: list[int] = []
+            with pytest.raises(RuntimeError):
+                async for item in subscription:
+                    items.append(item)
+            return items
+
+        results = await asyncio.gather(*map(consume, subscriptions))
+        assert results == [[0, 1, 2], [0, 1, 2]]
+        assert all(
+            isinstance(subscription.error, RuntimeError)
+            for subscription in subscriptions
+        )
+
+    asyncio.run(run())
+
+
+def test_broadcast_rejects_late_subscriptions():
+    async def run() -> None:
+        broadcast = Broadcast(numbers(3))
+        subscription = broadcast.subscribe()
+        await subscription.__anext__()
+        with pytest.raises(RuntimeError):
+            broadcast.subscribe()
+        await broadcast.aclose()
+
+    asyncio.run(run())
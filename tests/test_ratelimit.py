@@ -0,0 +1,62 @@
+"""Tests for `dayong.ratelimit`."""
+import asyncio
+
+import pytest
+
+from dayong.ratelimit import RateLimiter, TokenBucket
+
+
+def test_bucket_starts_full():
+    bucket = TokenBucket(limit=2, period=1.0)
+
+    assert bucket.delay() == 0
+    bucket.tokens -= 2
+    assert bucket.delay() == pytest.approx(0.5, abs=0.05)
+
+
+def test_acquire_waits_for_tokens():
+    async def run() -> float:
+        bucket = TokenBucket(limit=2, period=0.2)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(4):
+            await bucket.acquire()
+        return loop.time() - start
+
+    # Two tokens right away, then one every 0.1 seconds.
+    assert asyncio.run(run()) == pytest.approx(0.2, abs=0.08)
+
+
+def test_block():
+    bucket = TokenBucket()
+
+    bucket.block(0.5)
+
+    assert bucket.delay() == pytest.approx(0.5, abs=0.05)
+
+
+def test_update_from_server_state():
+    bucket = TokenBucket(limit=5, period=5.0)
+
+    bucket.update(limit=3, remaining=0, reset_after=0.5, period=2.0)
+
+    assert (bucket.limit, bucket.period, bucket.tokens) == (3, 2.0, 0)
+    assert bucket.delay() == pytest.approx(2 / 3, abs=0.05)
+
+
+def test_limiter_buckets_are_per_key():
+    limiter = RateLimiter(limit=1, period=10.0)
+
+    limiter.retry_after("route", 1, 0.5)
+
+    assert limiter.bucket("route", 1).delay() > 0
+    assert limiter.bucket("route", 2).delay() == 0
+
+
+def test_limiter_global_block():
+    async def run() -> float:
+        limiter = RateLimiter()
+        limiter.retry_after("route", 1, 0.1, is_global=True)
+        return await limiter.acquire("route", 2)
+
+    assert asyncio.run(run()) == pytest.approx(0.1, abs=0.05)
@@ -0,0 +1,160 @@
+"""Tests for `dayong.schema`.
+
+The upgrade from the baseline schema runs the PostgreSQL migrations, so it only runs
+if `DAYONG_TEST_DATABASE_URL` is set to the URI of a PostgreSQL database, e.g.
+"postgresql+asyncpg://postgres@localhost/postgres". It works in a schema of its own,
+which it drops afterwards.
+"""
+import asyncio
+import os
+from pathlib import Path
+from typing import Any, Optional
+
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+
+from dayong import schema
+from dayong.models import SCHEMA_VERSION
+from dayong.schema import SchemaMismatchError, ensure_schema, schema_checksum
+
+POSTGRES_URL = os.environ.get("DAYONG_TEST_DATABASE_URL")
+TEST_SCHEMA = "dayong_test"
+
+BASELINE_TABLES = (
+    "CREATE TABLE anon_messages (id SERIAL PRIMARY KEY, message_id VARCHAR NOT NULL, "
+    "user_id VARCHAR NOT NULL, username VARCHAR NOT NULL, nickname VARCHAR NOT NULL, "
+    "message VARCHAR NOT NULL)",
+    "CREATE INDEX ix_anon_messages_message_id ON anon_messages (message_id)",
+    "CREATE TABLE scheduledtask (id SERIAL PRIMARY KEY, "
+    "channel_name VARCHAR NOT NULL, task_name VARCHAR NOT NULL, run BOOLEAN)",
+    "CREATE INDEX ix_scheduledtask_task_name ON scheduledtask (task_name)",
+    "INSERT INTO scheduledtask (channel_name, task_name, run) VALUES "
+    "('news', 'medium', TRUE), ('news', 'medium', FALSE), ('dev', 'medium', TRUE)",
+)
+
+
+def bootstrap(
+    url: str, *statements: str, connect_args: Optional[dict[str, Any]] = None
+) -> Any:
+    """Run statements, then bootstrap the schema and describe the database."""
+
+    def describe(connection: Any) -> Any:
+        inspector = inspect(connection)
+        return {
+            "tables": set(inspector.get_table_names()),
+            "indexes": {
+                index["name"]: index["unique"]
+                for index in inspector.get_indexes("scheduledtask")
+            },
+            "tasks": connection.execute(
+                text(
+                    "SELECT channel_name, run, delivery FROM scheduledtask "
+                    "ORDER BY channel_name"
+                )
+            ).all(),
+            "versions": connection.execute(
+                text("SELECT version, checksum FROM schema_version ORDER BY version")
+            ).all(),
+        }
+
+    async def run() -> Any:
+        engine = create_async_engine(url, connect_args=connect_args or {})
+        try:
+            async with engine.begin() as conn:
+                for statement in statements:
+                    await conn.exec_driver_sql(statement)
+                await conn.run_sync(ensure_schema)
+            async with engine.connect() as conn:
+                return await conn.run_sync(describe)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+@pytest.fixture()
+def sqlite_url(tmp_path: Path) -> str:
+    return f"sqlite+aiosqlite:///{tmp_path / 'dayong.db'}"
+
+
+def test_fresh_database(sqlite_url: str):
+    database = bootstrap(sqlite_url)
+
+    assert database["tables"] == set(SQLModel.metadata.tables)
+    assert database["versions"] == [
+        (SCHEMA_VERSION, schema_checksum(SQLModel.metadata))
+    ]
+    # Bootstrapping again changes nothing.
+    assert bootstrap(sqlite_url)["versions"] == database["versions"]
+
+
+def test_pending_migrations_run_in_order(
+    sqlite_url: str, monkeypatch: pytest.MonkeyPatch
+):
+    bootstrap(sqlite_url)
+    monkeypatch.setitem(
+        schema.MIGRATIONS, SCHEMA_VERSION, ("CREATE TABLE migrated (id INTEGER)",)
+    )
+
+    database = bootstrap(
+        sqlite_url,
+        f"UPDATE schema_version SET version = {SCHEMA_VERSION - 1}",
+    )
+
+    assert "migrated" in database["tables"]
+    assert [version for version, _ in database["versions"]] == [
+        SCHEMA_VERSION - 1,
+        SCHEMA_VERSION,
+    ]
+
+
+def test_checksum_mismatch(sqlite_url: str):
+    bootstrap(sqlite_url)
+
+    with pytest.raises(SchemaMismatchError, match="checksum mismatch"):
+        bootstrap(sqlite_url, "UPDATE schema_version SET checksum = 'changed'")
+
+
+def test_newer_schema_version(sqlite_url: str):
+    bootstrap(sqlite_url)
+
+    with pytest.raises(SchemaMismatchError, match="or older"):
+        bootstrap(
+            sqlite_url,
+            "INSERT INTO schema_version (version, checksum, applied_at) "
+            f"VALUES ({SCHEMA_VERSION + 1}, 'newer', CURRENT_TIMESTAMP)",
+        )
+
+
+@pytest.mark.skipif(POSTGRES_URL is None, reason="DAYONG_TEST_DATABASE_URL not set")
+def test_upgrade_from_baseline():
+    assert POSTGRES_URL is not None
+
+    async def run(statement: str) -> None:
+        engine = create_async_engine(POSTGRES_URL)
+        try:
+            async with engine.begin() as conn:
+                await conn.exec_driver_sql(statement)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run(f"DROP SCHEMA IF EXISTS {TEST_SCHEMA} CASCADE"))
+    asyncio.run(run(f"CREATE SCHEMA {TEST_SCHEMA}"))
+    try:
+        database = bootstrap(
+            POSTGRES_URL,
+            *BASELINE_TABLES,
+            connect_args={"server_settings": {"search_path": TEST_SCHEMA}},
+        )
+    finally:
+        asyncio.run(run(f"DROP SCHEMA IF EXISTS {TEST_SCHEMA} CASCADE"))
+
+    assert database["tables"] == set(SQLModel.metadata.tables)
+    assert database["versions"] == [
+        (SCHEMA_VERSION, schema_checksum(SQLModel.metadata))
+    ]
+    # The oldest of the duplicate tasks is kept, and tasks switch to digests.
+    assert database["tasks"] == [("dev", True, "digest"), ("news", True, "digest")]
+    assert database["indexes"] == {"ix_scheduledtask_task_name_channel_id": True}